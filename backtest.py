@@ -0,0 +1,517 @@
+import argparse, heapq, os, glob, time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import strategy
+from utils import ichimoku_arrays, span_b_signal_batch, ICHIMOKU_SHIFT
+
+# ==========================================================
+# 백테스트 엔진 (Span B 평행 매수 + 분할익절/스탑 매도)
+# 저장된 5분봉을 실매매와 같은 코드(span_b_signal_batch / strategy.exit_signal / ladder_steps)로 재생.
+#
+# 1. 시그널: 종목마다 일목을 전체 기간에 한 번 계산하고, 봉마다 실매매가 보는 창(n+26봉)을
+#    sliding_window_view 로 만들어 span_b_signal_batch 에 통째로 넘김 (봉 루프 없음)
+# 2. 매수: 시그널 봉의 Span B 가격에 지정가 -> 이후 ORDER_LIFETIME_LIMIT 안에 저가가 닿으면 체결
+# 3. 매도: 체결 후 종가 기준 수익률 / 최고수익률(cummax) / stage(= 최고수익률이 넘은 트리거 수)를
+#    배열로 계산해서 첫 정리 봉을 찾고, stage 가 오른 봉에서만 ladder_steps 로 분할익절 수량 계산
+# 4. 포트폴리오: 전 종목 이벤트(시그널/체결/취소/매도)를 시간순 힙으로 처리 (MAX_SLOTS, 현금 배분은 실매매와 동일)
+#
+# 가정: 가격 판단은 5분봉 종가 (실매매는 틱 단위), 매도는 판단 봉 종가에 체결, 수수료/환율 없음.
+# ==========================================================
+
+BAR_SEC = 5 * 60
+MIN_BARS = 60           # 실매매와 동일: 60봉 미만이면 판단 안 함
+EXIT_CHUNK = 2048       # 매도 조건을 한 번에 계산할 봉 수 (정리 봉을 찾을 때까지 반복)
+KST = "Asia/Seoul"
+EXCHANGE_TZ = "America/New_York"   # 오프셋이 붙은 봉 시각(yfinance CSV 등)은 거래소 시간대로 맞춤
+
+# 이벤트 처리 순서 (같은 시각): 체결 확인 -> 오래된 주문 취소 -> 매수 -> 매도 (실매매 루프 순서)
+EV_FILL, EV_CANCEL, EV_SIGNAL, EV_SELL = 0, 1, 2, 3
+
+def default_params():
+    """strategy.py 현재 설정 (스윕할 때 이 dict 를 바꿔서 넘김)"""
+    return {
+        "n": strategy.SIGNAL_N,
+        "k": strategy.SIGNAL_K,
+        "loss_ratio": strategy.LOSS_RATIO,
+        "profit_steps": strategy.PROFIT_STEPS,
+        "trailing_dd": strategy.TRAILING_DD,
+        "breakeven_trigger": strategy.BREAKEVEN_TRIGGER,
+        "breakeven_floor": strategy.BREAKEVEN_FLOOR,
+        "max_slots": strategy.MAX_SLOTS,
+        "order_lifetime_bars": strategy.ORDER_LIFETIME_LIMIT // BAR_SEC,
+        "session": True,    # 매매 시간(KST) 외에는 매수/매도 안 함 + 정리 시간에 전량 정리
+    }
+
+# ==========================================================
+# 데이터
+# ==========================================================
+def _parse_index(index):
+    """봉 시각 -> DatetimeIndex
+    오프셋이 붙은 문자열은 서머타임을 넘으면(-05:00 / -04:00) 한 번에 못 읽으므로 UTC 로 읽고 거래소 시간대로 바꿈.
+    오프셋 없는 시각은 그대로 (KIS 처럼 KST 로 간주), 이미 tz 가 있는 인덱스도 그대로."""
+    if isinstance(index, pd.DatetimeIndex):
+        return index
+    try:
+        parsed = pd.to_datetime(index)
+    except ValueError:      # Mixed timezones detected
+        parsed = None
+    if isinstance(parsed, pd.DatetimeIndex) and parsed.tz is None:
+        return parsed
+    return pd.to_datetime(index, utc=True).tz_convert(EXCHANGE_TZ)
+
+def _normalize(df):
+    """OHLCV DataFrame 정리: 인덱스 이름 Datetime, 정렬/중복 제거, 빈 봉 제거"""
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    if 'Datetime' in df.columns:
+        df = df.set_index('Datetime')
+    df.index = _parse_index(df.index)
+    df.index.name = 'Datetime'
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df[['Open', 'High', 'Low', 'Close', 'Volume']].astype(np.float64).dropna(subset=['Close'])
+
+def load_dir(path):
+    """폴더의 종목별 파일({TICKER}.csv / .parquet) -> {ticker: DataFrame}"""
+    frames = {}
+    for file in sorted(glob.glob(os.path.join(path, "*.csv")) + glob.glob(os.path.join(path, "*.parquet"))):
+        ticker = os.path.splitext(os.path.basename(file))[0].upper()
+        if file.endswith(".csv"):
+            df = pd.read_csv(file, index_col=0, parse_dates=True)
+        else:
+            df = pd.read_parquet(file)
+        frames[ticker] = _normalize(df)
+    return frames
+
+def download(tickers, period="60d", archive=None):
+    """yfinance 5분봉 (최대 60일) -> {ticker: DataFrame} (archive 가 있으면 받은 봉 보관)"""
+    import yfinance as yf
+    from signal_scanner import _split_download
+
+    df = yf.download(list(tickers), interval="5m", period=period, group_by="ticker",
+                     threads=True, prepost=True, progress=False)
+    frames = {t: _normalize(sub) for t, sub in _split_download(df, list(tickers)).items()}
+    if archive is not None:
+        for ticker, sub in frames.items():
+            archive.append(ticker, sub, source="yf")
+        archive.flush()
+    return frames
+
+def load_archive(source="yf", tickers=None, start=None, end=None, archive=None):
+    """캔들 아카이브(candle_archive) -> {ticker: DataFrame} (tickers 없으면 저장된 전 종목)"""
+    from candle_archive import CandleArchive
+
+    archive = archive or CandleArchive()
+    frames = {}
+    for ticker in tickers or archive.tickers(source):
+        df = archive.load_frame(ticker, source, start, end)
+        if df is not None and len(df):
+            frames[ticker.upper()] = df
+    return frames
+
+def add_data_args(parser):
+    """백테스트/스윕 공용 데이터 옵션"""
+    parser.add_argument("--data", help="종목별 5분봉 파일 폴더 ({TICKER}.csv / .parquet)")
+    parser.add_argument("--archive", nargs="?", const="yf", help="캔들 아카이브에서 읽기 (source: yf / kis, 기본 yf)")
+    parser.add_argument("--start", help="--archive 시작 날짜 (YYYY-MM-DD, UTC)")
+    parser.add_argument("--end", help="--archive 끝 날짜 (YYYY-MM-DD, UTC)")
+    parser.add_argument("--tickers", nargs="*", help="yfinance 로 받을 종목 (최대 60일, 받은 봉은 아카이브에 보관) / --archive 종목 제한")
+    parser.add_argument("--period", default="60d")
+
+def load_frames(args, parser):
+    if args.data:
+        return load_dir(args.data)
+    if args.archive:
+        return load_archive(args.archive, args.tickers, args.start, args.end)
+    if args.tickers:
+        from candle_archive import CandleArchive
+        return download(args.tickers, args.period, CandleArchive())
+    parser.error("--data / --archive / --tickers 중 하나 필요")
+
+# ==========================================================
+# 종목별 계산 (벡터화)
+# ==========================================================
+def epoch_ns(dates):
+    """DatetimeIndex -> int64 ns (tz 있으면 UTC 기준). pandas 해상도(us/ns)와 무관하게 같은 단위로 맞춤"""
+    return dates.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+def _session_masks(dates):
+    """봉 시각(KST) -> (매매 시간 여부, 정리 시간 여부). strategy.is_trading_time / is_close_out_time 과 같은 구간"""
+    kst = dates.tz_convert(KST) if dates.tz is not None else dates  # tz 없으면 KIS 처럼 KST 로 간주
+    sod = kst.hour * 3600 + kst.minute * 60 + kst.second
+    sod = np.asarray(sod)
+
+    def seconds(hms):
+        h, m, s = map(int, hms.split(":"))
+        return h * 3600 + m * 60 + s
+
+    active = np.zeros(len(sod), dtype=bool)
+    for start, end in strategy.TRADING_WINDOWS:
+        active |= (sod >= seconds(start)) & (sod <= seconds(end))
+
+    start, end = strategy.CLOSE_OUT_WINDOW
+    close_out = (sod >= seconds(start)) & (sod <= seconds(end))
+    return active, close_out
+
+def compute_signals(arrays, n, k):
+    """
+    봉 t 마다 실매매가 그 시점에 봤을 span_b_signal 결과.
+    실매매 창의 끝은 선행스팬 t+26 -> 봉마다 길이 n+26 창을 만들어 한 번에 판단.
+    return: (signals bool[L], flat_price float[L])
+    """
+    bars = len(arrays['dates'])
+    width = n + ICHIMOKU_SHIFT
+    signals = np.zeros(bars, dtype=bool)
+    prices = np.full(bars, np.nan)
+    if bars < max(n, MIN_BARS):
+        return signals, prices
+
+    # 창 r 은 [r, r+width) -> 마지막 선행스팬 위치 r+width-1 = t+26 -> t = r+n-1
+    win_a = sliding_window_view(arrays['span_a'], width)
+    win_b = sliding_window_view(arrays['span_b'], width)
+    win_c = sliding_window_view(arrays['close'], width)
+
+    sig, val = span_b_signal_batch(win_a, win_b, win_c, n, k)
+    signals[n - 1:n - 1 + len(sig)] = sig
+    prices[n - 1:n - 1 + len(val)] = val
+
+    signals[:MIN_BARS - 1] = False  # 실매매는 60봉 미만이면 판단 안 함
+    return signals, prices
+
+class TickerData:
+    def __init__(self, ticker, df, params, arrays=None):
+        self.ticker = ticker
+        arrays = arrays or ichimoku_arrays(df)
+        bars = len(arrays['dates'])
+
+        self.dates = arrays['dates']
+        self.ts = epoch_ns(self.dates)
+        self.open = arrays['open'][:bars]
+        self.low = arrays['low'][:bars]
+        self.close = arrays['close'][:bars]
+
+        if params["session"]:
+            self.active, self.close_out = _session_masks(self.dates)
+        else:
+            self.active = np.ones(bars, dtype=bool)
+            self.close_out = np.zeros(bars, dtype=bool)
+
+        signals, prices = compute_signals(arrays, params["n"], params["k"])
+        self.signal_bars = np.flatnonzero(signals & self.active)
+        self.signal_prices = np.round(prices[self.signal_bars], 2)
+        self.fill_bars, self.fill_prices = self._fills(params["order_lifetime_bars"])
+
+    def _fills(self, lifetime):
+        """시그널 지정가 주문이 언제 체결되는지 (저가가 주문가 이하인 첫 봉, 없으면 -1)"""
+        if not len(self.signal_bars):
+            return np.array([], dtype=np.int64), np.array([])
+
+        lifetime = max(1, int(lifetime))
+        bars = len(self.low)
+        low = np.concatenate([self.low, np.full(lifetime + 1, np.inf)])
+        windows = sliding_window_view(low, lifetime)[self.signal_bars + 1]   # 다음 봉부터 lifetime 봉
+
+        hit = windows <= self.signal_prices[:, None]
+        first = hit.argmax(axis=1)
+        filled = hit[np.arange(len(first)), first]
+
+        fill_bars = np.where(filled, self.signal_bars + 1 + first, -1)
+        fill_bars[fill_bars >= bars] = -1
+        fill_prices = np.where(fill_bars >= 0,
+                               np.minimum(self.open[np.maximum(fill_bars, 0)], self.signal_prices),
+                               np.nan)
+        return fill_bars, fill_prices
+
+    def exit_path(self, fill_bar, entry, qty, params, triggers, dd_by_stage, remaining):
+        """
+        체결 후 매도 경로 -> [(bar, sell_qty, price, kind, stage)] (마지막이 전량 정리)
+        stage 는 "최고수익률이 넘은 트리거 개수" 라서 봉마다 cummax 로 계산 가능.
+        """
+        sells = []
+        bars = len(self.close)
+        stage = 0
+        max_profit = -999.0
+        cur_qty = qty
+
+        start = fill_bar
+        while start < bars:
+            end = min(bars, start + EXIT_CHUNK)
+            close = self.close[start:end]
+            active = self.active[start:end]
+            close_out = self.close_out[start:end]
+
+            profit = (close - entry) / entry * 100
+            # 매매 시간 외에는 가격을 안 보므로 최고수익률도 그대로
+            running_max = np.maximum.accumulate(np.where(active, profit, -np.inf))
+            running_max = np.maximum(running_max, max_profit)
+            prev_max = np.concatenate([[max_profit], running_max[:-1]])
+
+            stage_before = np.maximum(np.searchsorted(triggers, prev_max, side="right"), stage)
+            stage_after = np.maximum(np.searchsorted(triggers, running_max, side="right"), stage)
+
+            # strategy.exit_signal 의 배열 버전
+            dd = dd_by_stage[np.minimum(stage_before, len(dd_by_stage) - 1)]
+            exit_now = active & (
+                (profit <= -params["loss_ratio"]) |
+                ((stage_before == 0) & (running_max >= params["breakeven_trigger"]) & (profit <= params["breakeven_floor"])) |
+                ((stage_before >= 1) & ((running_max - profit) >= dd))
+            )
+            exit_now |= close_out
+
+            exit_idx = int(exit_now.argmax()) if exit_now.any() else len(close)
+
+            # 정리 전까지 stage 가 오른 봉에서 분할익절
+            for i in np.flatnonzero((stage_after[:exit_idx] > stage_before[:exit_idx]) & active[:exit_idx]):
+                steps = strategy.ladder_steps(cur_qty, int(stage_before[i]), float(profit[i]),
+                                              params["profit_steps"], remaining)
+                for target_stage, _, sell_qty in steps:
+                    if sell_qty > 0:
+                        sells.append((start + i, sell_qty, float(close[i]), "take_profit", target_stage))
+                        cur_qty -= sell_qty
+                    stage = target_stage
+                if cur_qty <= 0:
+                    return sells # 졸업
+
+            if exit_idx < len(close):
+                i = exit_idx
+                if close_out[i] and not active[i]:
+                    kind = "close_out"
+                else:
+                    kind = strategy.exit_signal(float(profit[i]), float(running_max[i]), int(stage_before[i]),
+                                                params["loss_ratio"], params["trailing_dd"],
+                                                params["breakeven_trigger"], params["breakeven_floor"]) or "close_out"
+                sells.append((start + i, cur_qty, float(close[i]), kind, int(stage_before[i])))
+                return sells
+
+            stage = int(stage_after[-1])
+            max_profit = float(running_max[-1])
+            start = end
+
+        # 데이터 끝까지 보유 -> 마지막 종가로 평가 정리
+        sells.append((bars - 1, cur_qty, float(self.close[-1]), "end_of_data", stage))
+        return sells
+
+# ==========================================================
+# 포트폴리오 시뮬레이션
+# ==========================================================
+def run_backtest(frames, params=None, initial_cash=10_000.0, tickers_order=None, verbose=True, arrays=None):
+    """
+    frames: {ticker: 5분봉 DataFrame}
+    arrays: {ticker: ichimoku_arrays 결과} (파라미터와 무관하니 스윕에서는 미리 계산해서 재사용)
+    return: {"summary": dict, "trades": DataFrame, "equity": Series}
+    """
+    params = dict(default_params(), **(params or {}))
+    started = time.perf_counter()
+
+    triggers = np.array([trigger for _, trigger, _ in params["profit_steps"]], dtype=np.float64)
+    max_stage = max([stage for stage, _, _ in params["profit_steps"]] + list(params["trailing_dd"]) + [0])
+    dd_by_stage = np.array([params["trailing_dd"].get(s, np.inf) for s in range(max_stage + 1)], dtype=np.float64)
+    remaining = strategy.remaining_ratio(params["profit_steps"])
+
+    order = tickers_order or list(frames)
+    rank = {t: i for i, t in enumerate(order)}
+    data = {}
+    for ticker in order:
+        df = frames.get(ticker)
+        if df is None or len(df) < MIN_BARS:
+            continue
+        data[ticker] = TickerData(ticker, df, params, (arrays or {}).get(ticker))
+
+    # 모든 시그널을 시간순 힙에 (같은 시각이면 랭킹 순서)
+    events = []
+    seq = 0
+    for ticker, td in data.items():
+        for j, bar in enumerate(td.signal_bars):
+            events.append((int(td.ts[bar]), EV_SIGNAL, rank[ticker], seq, ticker, j))
+            seq += 1
+    heapq.heapify(events)
+
+    cash = float(initial_cash)
+    reserved = 0.0
+    pending = {}      # ticker -> (qty, order_price)
+    holding = {}      # ticker -> trade dict
+    trades = []
+    cash_log = []     # (ts, cash)
+    counts = {"signals": 0, "orders": 0, "fills": 0, "cancelled": 0, "skipped_slots": 0, "skipped_cash": 0}
+
+    while events:
+        ts, kind, _, _, ticker, payload = heapq.heappop(events)
+        td = data[ticker]
+
+        if kind == EV_SIGNAL:
+            counts["signals"] += 1
+            if ticker in pending or ticker in holding:
+                continue
+
+            used_slots = len(pending) + len(holding)
+            if used_slots >= params["max_slots"]:
+                counts["skipped_slots"] += 1
+                continue
+
+            # 실매매 place_buy_order 와 같은 배분
+            price = float(td.signal_prices[payload])
+            orderable = cash - reserved
+            target_amount = (orderable / (params["max_slots"] - used_slots)) * 0.98
+            qty = int(np.floor(target_amount / price)) if price > 0 else 0
+            qty = min(qty, int(np.floor(orderable / price)) if price > 0 else 0)
+            if qty < 1:
+                counts["skipped_cash"] += 1
+                continue
+
+            counts["orders"] += 1
+            pending[ticker] = (qty, price)
+            reserved += qty * price
+
+            fill_bar = int(td.fill_bars[payload])
+            if fill_bar >= 0:
+                heapq.heappush(events, (int(td.ts[fill_bar]), EV_FILL, rank[ticker], seq, ticker, payload)); seq += 1
+            else:
+                cancel_bar = min(len(td.ts) - 1, int(td.signal_bars[payload]) + params["order_lifetime_bars"])
+                heapq.heappush(events, (int(td.ts[cancel_bar]), EV_CANCEL, rank[ticker], seq, ticker, payload)); seq += 1
+
+        elif kind == EV_CANCEL:
+            qty, price = pending.pop(ticker)
+            reserved -= qty * price
+            counts["cancelled"] += 1
+
+        elif kind == EV_FILL:
+            qty, price = pending.pop(ticker)
+            reserved -= qty * price
+            counts["fills"] += 1
+
+            fill_bar = int(td.fill_bars[payload])
+            entry = float(td.fill_prices[payload])
+            cash -= qty * entry
+            cash_log.append((ts, cash))
+
+            sells = td.exit_path(fill_bar, entry, qty, params, triggers, dd_by_stage, remaining)
+            trade = {
+                "ticker": ticker,
+                "signal_time": td.dates[td.signal_bars[payload]],
+                "order_price": price,
+                "fill_time": td.dates[fill_bar],
+                "fill_bar": fill_bar,
+                "entry": entry,
+                "qty": qty,
+                "sells": sells,
+                "proceeds": 0.0,
+            }
+            holding[ticker] = trade
+            for idx, (bar, _, _, _, _) in enumerate(sells):
+                heapq.heappush(events, (int(td.ts[bar]), EV_SELL, rank[ticker], seq, ticker, idx)); seq += 1
+
+        elif kind == EV_SELL:
+            trade = holding[ticker]
+            bar, sell_qty, sell_price, sell_kind, stage = trade["sells"][payload]
+            cash += sell_qty * sell_price
+            trade["proceeds"] += sell_qty * sell_price
+            cash_log.append((ts, cash))
+
+            if payload == len(trade["sells"]) - 1:
+                del holding[ticker]
+                cost = trade["qty"] * trade["entry"]
+                trades.append({
+                    "ticker": ticker,
+                    "signal_time": trade["signal_time"],
+                    "fill_time": trade["fill_time"],
+                    "exit_time": td.dates[bar],
+                    "order_price": trade["order_price"],
+                    "entry": trade["entry"],
+                    "qty": trade["qty"],
+                    "exit_kind": sell_kind,
+                    "max_stage": max([s[4] for s in trade["sells"]] + [0]),
+                    "partial_sells": len(trade["sells"]) - 1,
+                    "pnl": round(trade["proceeds"] - cost, 4),
+                    "pnl_pct": round((trade["proceeds"] - cost) / cost * 100, 2),
+                    "bars_held": bar - trade["fill_bar"],
+                    "_fill_bar": trade["fill_bar"],
+                    "_sells": trade["sells"],
+                })
+
+    trades_df = pd.DataFrame(trades)
+    equity = _equity_curve(data, trades, cash_log, initial_cash)
+    summary = _summary(trades_df, equity, initial_cash, counts, time.perf_counter() - started, len(data))
+
+    if verbose:
+        _print_summary(summary)
+    return {"summary": summary, "trades": trades_df.drop(columns=["_fill_bar", "_sells"], errors="ignore"), "equity": equity}
+
+def _equity_curve(data, trades, cash_log, initial_cash):
+    """현금(이벤트 시점 계단) + 보유 평가액(종목별 보유수량 x 종가) 을 전 종목 봉 시각 격자에 합침"""
+    if not data:
+        return pd.Series(dtype=np.float64)
+
+    grid = np.unique(np.concatenate([td.ts for td in data.values()]))
+    equity = np.zeros(len(grid))
+
+    # 종목별 보유 수량: 체결 봉 +qty, 매도 봉 -sell_qty 의 누적합
+    by_ticker = {}
+    for trade in trades:
+        by_ticker.setdefault(trade["ticker"], []).append(trade)
+    for ticker, ticker_trades in by_ticker.items():
+        td = data[ticker]
+        delta = np.zeros(len(td.close) + 1)
+        for trade in ticker_trades:
+            delta[trade["_fill_bar"]] += trade["qty"]
+            for bar, sell_qty, _, _, _ in trade["_sells"]:
+                delta[bar] -= sell_qty
+        held = np.cumsum(delta[:-1])
+        value = held * td.close
+
+        # 종목 봉이 없는 격자 시각은 직전 봉 값 유지
+        pos = np.searchsorted(td.ts, grid, side="right") - 1
+        equity += np.where(pos >= 0, value[np.maximum(pos, 0)], 0.0)
+
+    if cash_log:
+        log_ts = np.array([t for t, _ in cash_log], dtype=np.int64)
+        log_cash = np.array([c for _, c in cash_log])
+        pos = np.searchsorted(log_ts, grid, side="right") - 1
+        equity += np.where(pos >= 0, log_cash[np.maximum(pos, 0)], initial_cash)
+    else:
+        equity += initial_cash
+
+    return pd.Series(equity, index=pd.to_datetime(grid, utc=True), name="equity")
+
+def _summary(trades_df, equity, initial_cash, counts, elapsed, tickers):
+    final = float(equity.iloc[-1]) if len(equity) else float(initial_cash)
+    peak = equity.cummax() if len(equity) else equity
+    drawdown = float(((equity - peak) / peak).min() * 100) if len(equity) else 0.0
+
+    summary = {
+        "tickers": tickers,
+        "initial_cash": initial_cash,
+        "final_equity": round(final, 2),
+        "total_return_pct": round((final - initial_cash) / initial_cash * 100, 2),
+        "max_drawdown_pct": round(drawdown, 2),
+        "trades": len(trades_df),
+        "win_rate_pct": round(float((trades_df["pnl"] > 0).mean() * 100), 2) if len(trades_df) else 0.0,
+        "avg_pnl_pct": round(float(trades_df["pnl_pct"].mean()), 2) if len(trades_df) else 0.0,
+        "elapsed_sec": round(elapsed, 3),
+    }
+    summary.update(counts)
+    if len(trades_df):
+        summary["exit_kinds"] = trades_df["exit_kind"].value_counts().to_dict()
+    return summary
+
+def _print_summary(summary):
+    print("📊 [Backtest] 결과")
+    for key, value in summary.items():
+        print(f"   {key}: {value}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Span B 평행 전략 백테스트")
+    add_data_args(parser)
+    parser.add_argument("--cash", type=float, default=10_000.0)
+    parser.add_argument("--no-session", action="store_true", help="매매 시간 제한/장 마감 정리 끄기")
+    parser.add_argument("--out", help="결과 저장 폴더 (trades.csv, equity.csv)")
+    args = parser.parse_args()
+
+    frames = load_frames(args, parser)
+    result = run_backtest(frames, {"session": not args.no_session}, initial_cash=args.cash)
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        result["trades"].to_csv(os.path.join(args.out, "trades.csv"), index=False)
+        result["equity"].to_csv(os.path.join(args.out, "equity.csv"))
+        print(f"💾 [Backtest] {args.out} 에 저장")
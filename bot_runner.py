@@ -2,7 +2,7 @@
 import asyncio
 import traceback
 
-from main import trading_bot_loop, crawler_loop
+from main import trading_bot_loop, crawler_loop, realtime_quote_loop
 
 import dotenv
 dotenv.load_dotenv()
@@ -12,30 +12,37 @@ async def run_forever():
     """
     crawler_loop / trading_bot_loop 중 하나라도 예외로 죽으면
     에러 로그 찍고 둘 다 취소 후 잠깐 쉬었다가 다시 시작.
+    realtime_quote_loop 는 보조 기능이라 이 묶음에 넣지 않고 따로 돌림
+    (에러가 나도 스스로 로그 찍고 다시 접속, 매매 루프 재시작에 영향 없음).
     """
-    while True:
-        print("🟢 [Runner] 봇 프로세스 시작")
-        tasks = [
-            asyncio.create_task(crawler_loop(), name="crawler_loop"),
-            asyncio.create_task(trading_bot_loop(True), name="trading_bot_loop"),
-        ]
-
-        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
-
-        # 어떤 태스크가 죽었는지/왜 죽었는지 출력
-        for t in done:
-            exc = t.exception()
-            if exc:
-                print(f"🔴 [Runner] Task crashed: {t.get_name()}")
-                traceback.print_exception(type(exc), exc, exc.__traceback__)
-
-        # 나머지 태스크 취소
-        for t in pending:
-            t.cancel()
-        await asyncio.gather(*pending, return_exceptions=True)
-
-        print("🟡 [Runner] 5초 후 재시작...")
-        await asyncio.sleep(5)
+    realtime = asyncio.create_task(realtime_quote_loop(True), name="realtime_quote_loop")
+    try:
+        while True:
+            print("🟢 [Runner] 봇 프로세스 시작")
+            tasks = [
+                asyncio.create_task(crawler_loop(), name="crawler_loop"),
+                asyncio.create_task(trading_bot_loop(True), name="trading_bot_loop"),
+            ]
+
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+
+            # 어떤 태스크가 죽었는지/왜 죽었는지 출력
+            for t in done:
+                exc = t.exception()
+                if exc:
+                    print(f"🔴 [Runner] Task crashed: {t.get_name()}")
+                    traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+            # 나머지 태스크 취소
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            print("🟡 [Runner] 5초 후 재시작...")
+            await asyncio.sleep(5)
+    finally:
+        realtime.cancel()
+        await asyncio.gather(realtime, return_exceptions=True)
 
 if __name__ == "__main__":
     asyncio.run(run_forever())
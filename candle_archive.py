@@ -0,0 +1,221 @@
+import os, glob, tempfile, threading, queue
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# ==========================================================
+# 캔들 아카이브 (종목별 / 날짜별 컬럼 파일)
+# 봇(KIS 5분봉)과 스캐너/백테스트(yfinance)가 받은 봉을 전부 디스크에 쌓아 둠
+# -> 재시작/백테스트/리플레이 때 다시 받지 않고 바로 읽음
+#
+# 저장 형태: {root}/{source}/{interval}/{TICKER}/{YYYY-MM-DD}.npy  (날짜는 UTC 기준)
+#   파일 하나 = float64 2-D 배열 (컬럼 6개 x 봉 수), 컬럼 순서 COLUMNS
+#   -> 행 하나가 컬럼 하나라서 np.load(mmap_mode="r") 후 arr[4] 가 그대로 종가 배열 (파싱/객체 생성 없음)
+#   ts 는 UTC epoch 초 (float64 로 정확히 표현됨)
+# - 같은 시각 봉은 새 값으로 교체 (진행 중이던 마지막 봉 갱신), 시각 순 정렬 유지
+# - append() 는 큐에 넣기만 하고 백그라운드 스레드가 FLUSH_INTERVAL_SEC 마다 모아서 저장 (매매 루프 안 막음)
+# - 파일 교체는 임시 파일 + os.replace (읽는 쪽은 항상 완성된 파일만 봄)
+# ==========================================================
+
+CANDLE_ARCHIVE_DIR = os.environ.get("CANDLE_ARCHIVE_DIR", "./candle_archive")
+
+FLUSH_INTERVAL_SEC = 30.0
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+OHLCV = ("Open", "High", "Low", "Close", "Volume")
+
+# tz 없는 봉 시각을 어느 시간대로 볼지 (KIS 해외 분봉 kymd/khms 는 한국 시간)
+SOURCE_TZ = {"kis": "Asia/Seoul"}
+
+def _to_columns(df, source):
+    """OHLCV DataFrame -> (6 x 봉 수) float64 배열 (ts 오름차순, 같은 시각은 마지막 값)"""
+    if df is None or df is False or len(df) == 0:
+        return None
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize(SOURCE_TZ.get(source, "UTC"))
+    ts = index.tz_convert("UTC").to_numpy(dtype="datetime64[s]").astype(np.int64).astype(np.float64)
+
+    block = np.empty((len(COLUMNS), len(df)), dtype=np.float64)
+    block[0] = ts
+    for i, col in enumerate(OHLCV, 1):
+        block[i] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64) if col in df else np.nan
+
+    block = block[:, ~np.isnan(block[4])]  # 종가 없는 봉 제외
+    return _dedupe(block)
+
+def _dedupe(block):
+    """ts 기준 정렬 + 중복 제거 (같은 ts 면 뒤에 있는 값 사용)"""
+    if block.shape[1] == 0:
+        return block
+    order = np.argsort(block[0], kind="stable")
+    block = block[:, order]
+    keep = np.append(block[0, 1:] != block[0, :-1], True)  # 같은 ts 묶음의 마지막
+    return block[:, keep]
+
+def _day_of(ts_sec):
+    return datetime.fromtimestamp(ts_sec, tz=timezone.utc).strftime("%Y-%m-%d")
+
+class CandleArchive:
+    def __init__(self, root: str = CANDLE_ARCHIVE_DIR, interval: str = "5m", flush_interval: float = FLUSH_INTERVAL_SEC):
+        self.root = root            # None 이면 기록 안 함 (리플레이 등)
+        self.interval = interval
+        self.flush_interval = flush_interval
+
+        self.pending = {}           # (source, ticker) -> 아직 안 쓴 (6 x n) 배열
+        self.pending_lock = threading.Lock()
+        self.write_lock = threading.Lock()  # 파티션 읽고-합치고-쓰기는 한 번에 하나
+
+        self.wakeup = queue.Queue()
+        self.writer = None
+        self.thread_lock = threading.Lock()
+
+        # 통계
+        self.appended = 0
+        self.written_bars = 0
+        self.files_written = 0
+
+    # ------------------------------------------------------
+    # 경로
+    # ------------------------------------------------------
+    def ticker_dir(self, ticker, source):
+        return os.path.join(self.root, source, self.interval, ticker.upper())
+
+    def partition_path(self, ticker, source, day):
+        return os.path.join(self.ticker_dir(ticker, source), f"{day}.npy")
+
+    # ------------------------------------------------------
+    # 쓰기
+    # ------------------------------------------------------
+    def append(self, ticker, df, source="kis"):
+        """받은 봉 기록 요청 (즉시 반환, 실제 저장은 백그라운드에서 묶어서)"""
+        if self.root is None:
+            return
+        try:
+            block = _to_columns(df, source)
+        except Exception as e:
+            print(f"⚠️ [CandleArchive] {ticker} 변환 실패: {e}")
+            return
+        if block is None or block.shape[1] == 0:
+            return
+
+        key = (source, ticker.upper())
+        with self.pending_lock:
+            old = self.pending.get(key)
+            self.pending[key] = block if old is None else _dedupe(np.concatenate([old, block], axis=1))
+            self.appended += block.shape[1]
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        if self.writer is not None and self.writer.is_alive():
+            return
+        with self.thread_lock:
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(target=self._writer_loop, name="candle-archive-writer", daemon=True)
+                self.writer.start()
+
+    def _writer_loop(self):
+        while True:
+            try:
+                done = self.wakeup.get(timeout=self.flush_interval)
+            except queue.Empty:
+                done = None
+            try:
+                self._write_pending()
+            except Exception as e:
+                print(f"❌ [CandleArchive] 저장 실패: {e}")
+            if done is not None:
+                done.set()
+
+    def flush(self):
+        """지금까지 append 한 봉을 바로 저장 (writer 스레드가 없으면 현재 스레드에서)"""
+        if self.writer is not None and self.writer.is_alive():
+            done = threading.Event()
+            self.wakeup.put(done)
+            done.wait()
+        else:
+            self._write_pending()
+
+    def _write_pending(self):
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+
+        with self.write_lock:
+            for (source, ticker), block in pending.items():
+                day_no = (block[0] // 86400).astype(np.int64)   # UTC 날짜 번호
+                for day in np.unique(day_no):
+                    self._merge_partition(ticker, source, _day_of(day * 86400), block[:, day_no == day])
+
+    def _merge_partition(self, ticker, source, day, block):
+        path = self.partition_path(ticker, source, day)
+        try:
+            old = np.load(path)
+            merged = _dedupe(np.concatenate([old, block], axis=1))
+            if merged.shape == old.shape and np.array_equal(merged, old, equal_nan=True):
+                return # 바뀐 게 없으면 안 씀
+        except FileNotFoundError:
+            merged = block
+
+        dirpath = os.path.dirname(path)
+        os.makedirs(dirpath, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{day}_", suffix=".npy", dir=dirpath)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(merged))
+            os.replace(tmp_path, path)  # atomic replace
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+            raise
+
+        self.written_bars += merged.shape[1]
+        self.files_written += 1
+
+    # ------------------------------------------------------
+    # 읽기
+    # ------------------------------------------------------
+    def tickers(self, source="kis"):
+        base = os.path.join(self.root, source, self.interval)
+        return sorted(os.listdir(base)) if os.path.isdir(base) else []
+
+    def days(self, ticker, source="kis", start=None, end=None):
+        """저장된 날짜 목록 (YYYY-MM-DD, start/end 포함 범위)"""
+        files = glob.glob(os.path.join(self.ticker_dir(ticker, source), "*.npy"))
+        days = sorted(os.path.basename(f)[:-4] for f in files if not os.path.basename(f).startswith("."))
+        return [d for d in days if (start is None or d >= str(start)[:10]) and (end is None or d <= str(end)[:10])]
+
+    def load_day(self, ticker, day, source="kis"):
+        """날짜 파티션 하나 -> (6 x 봉 수) 메모리맵 배열 (복사 없음, 없으면 None)"""
+        try:
+            return np.load(self.partition_path(ticker, source, day), mmap_mode="r")
+        except FileNotFoundError:
+            return None
+
+    def load(self, ticker, source="kis", start=None, end=None):
+        """기간 내 봉 -> {컬럼: 배열} (파티션이 하나면 메모리맵 뷰, 여러 개면 이어 붙인 배열)"""
+        blocks = [b for b in (self.load_day(ticker, d, source) for d in self.days(ticker, source, start, end))
+                  if b is not None and b.shape[1]]
+        if not blocks:
+            return None
+        block = blocks[0] if len(blocks) == 1 else np.concatenate(blocks, axis=1)
+        return dict(zip(COLUMNS, block))
+
+    def load_frame(self, ticker, source="kis", start=None, end=None):
+        """기간 내 봉 -> DataFrame (인덱스 Datetime(UTC), 컬럼 Open/High/Low/Close/Volume)"""
+        cols = self.load(ticker, source, start, end)
+        if cols is None:
+            return None
+        index = pd.DatetimeIndex(pd.to_datetime(cols["ts"].astype(np.int64), unit="s", utc=True), name="Datetime")
+        return pd.DataFrame({name: np.asarray(cols[col]) for name, col in zip(OHLCV, COLUMNS[1:])}, index=index)
+
+    def stats(self):
+        with self.pending_lock:
+            pending = sum(block.shape[1] for block in self.pending.values())
+        return {"pending_bars": pending, "appended": self.appended,
+                "written_bars": self.written_bars, "files_written": self.files_written}
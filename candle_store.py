@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# ==========================================================
+# OHLCV 캔들 캐시
+# (종목, 거래소, 봉 간격) 별로 이미 받은 봉을 보관하고, 다음 조회 때는
+# 마지막 캐시 봉 이후 구간만 받아서 이어 붙임 (매번 120봉 전체를 받지 않음).
+# 마지막 봉은 아직 만들어지는 중이라 forming_ttl 초 동안만, 그리고 다음 봉 경계 전까지만 캐시 그대로 사용
+# (forming_ttl 은 매매 루프 주기보다 길어야 다음 루프에서 요청을 건너뜀 -> main 은 루프 주기 x2).
+# ==========================================================
+
+class CandleStore:
+    def __init__(self, max_keys: int = 256, max_bars: int = 500, forming_ttl: float = 10.0, now=datetime.now):
+        self.max_keys = max_keys        # LRU 로 보관할 최대 (종목, 거래소, 간격) 수
+        self.max_bars = max_bars        # 키당 보관할 최대 봉 수
+        self.forming_ttl = forming_ttl  # 마지막(진행 중) 봉 캐시 유효 시간 (초, 봉 경계를 넘으면 바로 만료)
+        self.now = now                  # 현재 시각 (로컬, 리플레이에서는 시뮬레이션 시계)
+
+        self.entries = OrderedDict()    # key -> {"df": DataFrame, "fetched_at": self.now() 시각}
+        self.lock = threading.Lock()
+
+        # 통계
+        self.hits = 0
+        self.top_ups = 0
+        self.full_fetches = 0
+
+    def get(self, key):
+        """캐시된 캔들 (없으면 None)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry["df"]
+
+    def _is_fresh(self, entry, interval):
+        now = self.now()
+        age = (now - entry["fetched_at"]).total_seconds()
+        if not 0 <= age < self.forming_ttl:
+            return False
+        if interval is None:
+            return True
+        # 받은 뒤 봉 경계를 넘었으면 새 봉이 생겼으므로 다시 받음
+        bar_sec = interval.total_seconds()
+        return now.timestamp() // bar_sec == entry["fetched_at"].timestamp() // bar_sec
+
+    def is_fresh(self, key, interval: timedelta = None):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and self._is_fresh(entry, interval)
+
+    def get_fresh(self, key, interval: timedelta = None):
+        """forming_ttl 안에 (같은 봉 구간에서) 받은 캐시면 반환 (요청 생략), 아니면 None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or not self._is_fresh(entry, interval):
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["df"]
+
+    def plan(self, key, interval: timedelta, max_rows: int):
+        """
+        다음 조회 계획 -> (받아야 할 봉 수, 마지막 캐시 봉 시각 or None)
+        마지막 캐시 봉(진행 중이던 봉)부터 다시 받도록 경과 봉 수 + 여유 1봉.
+        """
+        df = self.get(key)
+        if df is None or len(df) == 0:
+            return max_rows, None
+
+        last_ts = df.index[-1]
+        now = pd.Timestamp(self.now())
+        if last_ts.tz is not None:
+            # tz 없는 시계 값은 로컬 시간으로 보고 캔들 시간대로 변환
+            if now.tz is None:
+                now = now.tz_localize(datetime.now().astimezone().tzinfo)
+            now = now.tz_convert(last_ts.tz)
+        elapsed = max(now - last_ts, timedelta(0))
+        rows = int(elapsed // interval) + 2
+        return min(max_rows, rows), last_ts
+
+    def merge(self, key, new_df: pd.DataFrame):
+        """
+        새로 받은 봉을 캐시에 이어 붙임 (같은 시각 봉은 새 값으로 교체).
+        캐시 마지막 봉과 겹치지 않으면 중간 봉이 빠졌을 수 있으므로 None 반환 (전체 재조회 필요).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            old = entry["df"] if entry else None
+
+            if old is not None and len(old) and len(new_df) and new_df.index[0] > old.index[-1]:
+                return None
+
+            if old is None or len(old) == 0:
+                merged = new_df
+            else:
+                merged = pd.concat([old[old.index < new_df.index[0]], new_df])
+
+            merged = merged.iloc[-self.max_bars:]
+            self.entries[key] = {"df": merged, "fetched_at": self.now()}
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_keys:
+                self.entries.popitem(last=False)
+
+            return merged
+
+    def replace(self, key, df: pd.DataFrame):
+        with self.lock:
+            self.entries.pop(key, None)
+        return self.merge(key, df)
+
+    def get_or_fetch(self, key, fetch, interval: timedelta, max_rows: int):
+        """
+        fetch(rows, since) -> DataFrame (실패 시 False/None)
+        캐시가 신선하면 요청 없이 반환, 아니면 필요한 만큼만 받아 이어 붙임.
+        """
+        cached = self.get_fresh(key, interval)
+        if cached is not None:
+            return cached
+
+        rows, since = self.plan(key, interval, max_rows)
+        merged = self.apply(key, fetch(rows, since), since)
+        if merged is None:
+            # 캐시와 안 이어짐 -> 전체 재조회
+            merged = self.apply(key, fetch(max_rows, None), None)
+        return merged
+
+    async def aget_or_fetch(self, key, fetch, interval: timedelta, max_rows: int):
+        """get_or_fetch 의 비동기 버전 (fetch 는 코루틴 함수)"""
+        cached = self.get_fresh(key, interval)
+        if cached is not None:
+            return cached
+
+        rows, since = self.plan(key, interval, max_rows)
+        merged = self.apply(key, await fetch(rows, since), since)
+        if merged is None:
+            # 캐시와 안 이어짐 -> 전체 재조회
+            merged = self.apply(key, await fetch(max_rows, None), None)
+        return merged
+
+    def apply(self, key, df, since):
+        """조회 결과 반영 -> 합친 캔들 / 실패면 False / 캐시와 안 이어지면 None"""
+        if df is None or df is False or len(df) == 0:
+            return False
+
+        with self.lock:
+            if since is None:
+                self.full_fetches += 1
+            else:
+                self.top_ups += 1
+        return self.replace(key, df) if since is None else self.merge(key, df)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "keys": len(self.entries),
+                "hits": self.hits,
+                "top_ups": self.top_ups,
+                "full_fetches": self.full_fetches,
+            }
@@ -1,9 +1,16 @@
 import requests
-import json, os
+from requests.adapters import HTTPAdapter
+import json, os, threading, time, tempfile, hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import dotenv
 import pandas as pd
 
+try:
+    import fcntl # 프로세스 간 파일 락 (리눅스/도커)
+except ImportError:
+    fcntl = None
+
 dotenv.load_dotenv()
 
 # ==========================================================
@@ -11,8 +18,9 @@ dotenv.load_dotenv()
 # ==========================================================
 # 모의투자: https://openapivts.koreainvestment.com:29443
 # 실전투자: https://openapi.koreainvestment.com:9443
-KIS_BASE_URL = "https://openapivts.koreainvestment.com:29443"
-KIS_BASE_URL_REAL = "https://openapi.koreainvestment.com:9443"
+# (부하/지연 테스트 때는 kis_fake.py 주소로 바꿔서 실행, 예: KIS_BASE_URL_REAL=http://127.0.0.1:21100)
+KIS_BASE_URL = os.environ.get("KIS_BASE_URL", "https://openapivts.koreainvestment.com:29443")
+KIS_BASE_URL_REAL = os.environ.get("KIS_BASE_URL_REAL", "https://openapi.koreainvestment.com:9443")
 
 KIS_APP_KEY = os.environ.get("KIS_APP_KEY_MOCK")
 KIS_APP_SECRET = os.environ.get("KIS_APP_SECRET_MOCK")
@@ -24,46 +32,675 @@ KIS_APP_SECRET_REAL = os.environ.get("KIS_APP_SECRET_REAL")
 KIS_CANO_REAL = os.environ.get("KIS_CANO_REAL")
 KIS_ACNT_PRDT_CD_REAL = os.environ.get("KIS_ACNT_PRDT_CD_REAL")
 
-# 전역 변수 (토큰 캐싱용)
-ACCESS_TOKEN = None
-TOKEN_EXPIRY = None
-IS_REAL = False
+# ==========================================================
+# [설정] HTTP 커넥션 풀 (keep-alive)
+# ==========================================================
+KIS_POOL_SIZE = int(os.environ.get("KIS_POOL_SIZE", "10"))              # 호스트당 최대 커넥션 수
+KIS_CONNECT_TIMEOUT = float(os.environ.get("KIS_CONNECT_TIMEOUT", "3"))  # 연결 타임아웃 (초)
+KIS_READ_TIMEOUT = float(os.environ.get("KIS_READ_TIMEOUT", "10"))      # 응답 타임아웃 (초)
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
 
-def get_kis_token(real:bool=False):
-    """접근 토큰 발급/갱신 (싱글톤 패턴)"""
-    global ACCESS_TOKEN, TOKEN_EXPIRY, IS_REAL
-    
-    if IS_REAL == real and ACCESS_TOKEN and TOKEN_EXPIRY and datetime.now() < TOKEN_EXPIRY:
-        return ACCESS_TOKEN
+def get_http_session():
+    """
+    KIS 호출 공용 requests.Session (싱글톤)
+    모의/실전 호스트별로 keep-alive 커넥션을 풀에 보관해서 매 호출마다 TCP+TLS 핸드셰이크를 하지 않음.
+    """
+    global _SESSION
+
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                # pool_connections: 호스트(모의/실전) 수, pool_maxsize: 호스트당 동시 커넥션 수
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=KIS_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _SESSION = session
+    return _SESSION
+
+def configure_http_session(pool_size=None, connect_timeout=None, read_timeout=None):
+    """
+    커넥션 풀 크기/타임아웃 변경. 기존 세션은 닫고 다음 호출 때 새 설정으로 다시 생성.
+    """
+    global _SESSION, KIS_POOL_SIZE, KIS_CONNECT_TIMEOUT, KIS_READ_TIMEOUT
+
+    with _SESSION_LOCK:
+        if pool_size is not None:
+            KIS_POOL_SIZE = int(pool_size)
+        if connect_timeout is not None:
+            KIS_CONNECT_TIMEOUT = float(connect_timeout)
+        if read_timeout is not None:
+            KIS_READ_TIMEOUT = float(read_timeout)
+
+        if _SESSION is not None:
+            _SESSION.close()
+            _SESSION = None
+
+def _request(method, url, **kwargs):
+    """모든 KIS 호출이 거치는 공용 요청 함수 (커넥션 풀 + 기본 타임아웃)"""
+    kwargs.setdefault("timeout", (KIS_CONNECT_TIMEOUT, KIS_READ_TIMEOUT))
+    return get_http_session().request(method, url, **kwargs)
+
+# ==========================================================
+# [설정] 초당 호출 제한 (클라이언트 측 토큰 버킷)
+# KIS 는 앱키당 초당 거래건수를 제한함 -> 넘으면 EGW00201 에러.
+# 시세 TR / 주문·조회 TR / 모의투자 TR 예산을 따로 두고, 초과분은 실패시키지 않고 대기열에서 기다림.
+# ==========================================================
+KIS_QUOTE_RPS = float(os.environ.get("KIS_QUOTE_RPS", "10"))  # 시세 TR (실전)
+KIS_TRADE_RPS = float(os.environ.get("KIS_TRADE_RPS", "5"))   # 주문/잔고 TR (실전)
+KIS_MOCK_RPS = float(os.environ.get("KIS_MOCK_RPS", "2"))     # 모의투자 TR 전체
+KIS_THROTTLE_RETRIES = int(os.environ.get("KIS_THROTTLE_RETRIES", "3"))
+
+QUOTE_TR_IDS = {"HHDFS76950200", "HHDFS76200200"}
+THROTTLE_MSG_CD = "EGW00201" # 초당 거래건수를 초과하였습니다.
+
+class TokenBucket:
+    """
+    초당 rate 개씩 채워지고 최대 burst 개까지 쌓이는 토큰 버킷 (스레드 안전).
+    reserve() 가 토큰을 먼저 예약하고 기다려야 할 시간을 돌려주므로
+    동기(time.sleep)/비동기(asyncio.sleep) 호출이 같은 버킷을 공유하면서 도착 순서대로 줄을 섬.
+    """
+    def __init__(self, name, rate, burst=None):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+        # 대기 통계
+        self.calls = 0
+        self.waited_calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0 # 서버 측 EGW00201 응답 횟수
+
+    def reserve(self):
+        """토큰 1개 예약 -> 기다려야 할 시간(초) 반환"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # 음수가 되면 앞선 예약분만큼 뒤에서 대기
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+            self.calls += 1
+            if wait > 0:
+                self.waited_calls += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        with self.lock:
+            return {
+                "rate": self.rate,
+                "calls": self.calls,
+                "waited_calls": self.waited_calls,
+                "total_wait_sec": round(self.total_wait, 3),
+                "avg_wait_sec": round(self.total_wait / self.calls, 4) if self.calls else 0.0,
+                "max_wait_sec": round(self.max_wait, 3),
+                "throttled": self.throttled,
+            }
+
+RATE_LIMITERS = {
+    "quote": TokenBucket("quote", KIS_QUOTE_RPS),
+    "trade": TokenBucket("trade", KIS_TRADE_RPS),
+    "mock": TokenBucket("mock", KIS_MOCK_RPS),
+}
 
+def _rate_limiter(kwargs):
+    """요청 헤더의 tr_id 로 버킷 선택 (토큰 발급처럼 tr_id 가 없으면 None)"""
+    tr_id = kwargs.get("headers", {}).get("tr_id")
+    if not tr_id:
+        return None
+    if tr_id in QUOTE_TR_IDS:
+        return RATE_LIMITERS["quote"]
+    if tr_id.startswith("V"): # 모의투자 TR (VTTT..., VTTS..., VTRP...)
+        return RATE_LIMITERS["mock"]
+    return RATE_LIMITERS["trade"]
+
+def _is_throttled(data):
+    return isinstance(data, dict) and data.get("msg_cd") == THROTTLE_MSG_CD
+
+def get_rate_limit_stats():
+    """버킷별 호출/대기 시간 통계"""
+    return {name: bucket.stats() for name, bucket in RATE_LIMITERS.items()}
+
+# ==========================================================
+# [설정] 접근 토큰 캐시
+# 토큰은 파일에 저장해서 봇/대시보드 컨테이너와 재시작된 프로세스가 같이 씀.
+# (토큰 발급 API 는 1분당 1회 제한 -> 프로세스마다 새로 받으면 막힘)
+# ==========================================================
+KIS_TOKEN_CACHE_PATH = os.environ.get("KIS_TOKEN_CACHE_PATH", "./kis_token.json")
+TOKEN_EXPIRY_MARGIN_SEC = 10 * 60 # 만료 10분 전부터는 새로 발급
+
+# 전역 변수 (토큰 캐싱용) - {"real"/"mock": (token, 만료시각)}
+TOKEN_CACHE = {}
+_TOKEN_THREAD_LOCK = threading.Lock()
+
+EXCD_MAPPING = {
+    "NASD": "NAS",
+    "NYSE": "NYS",
+    "AMEX": "AMS"
+}
+
+# ==========================================================
+# [현재가 캐시] 같은 종목 현재가를 짧은 시간 안에 다시 묻으면 요청 없이 재사용
+# (매도 루프 / 정리 / 대시보드가 같은 프로세스에서 한 번 받은 시세를 공유)
+# ==========================================================
+QUOTE_CACHE_TTL_SEC = float(os.environ.get("KIS_QUOTE_CACHE_TTL", "0.5"))
+
+QUOTE_CACHE = {}  # (ticker, EXCD) -> (monotonic 시각, 시세 output)
+_QUOTE_CACHE_LOCK = threading.Lock()
+
+def _quote_key(ticker, exchange):
+    return ticker, EXCD_MAPPING.get(exchange, exchange)
+
+def _cached_quote(ticker, exchange):
+    with _QUOTE_CACHE_LOCK:
+        cached = QUOTE_CACHE.get(_quote_key(ticker, exchange))
+    if cached and time.monotonic() - cached[0] < QUOTE_CACHE_TTL_SEC:
+        return cached[1]
+    return None
+
+def _store_quote(ticker, exchange, quote):
+    if not quote:
+        return quote
+    now = time.monotonic()
+    with _QUOTE_CACHE_LOCK:
+        QUOTE_CACHE[_quote_key(ticker, exchange)] = (now, quote)
+        # 오래된 항목 정리
+        for key, (saved_at, _) in list(QUOTE_CACHE.items()):
+            if now - saved_at >= QUOTE_CACHE_TTL_SEC:
+                del QUOTE_CACHE[key]
+    return quote
+
+def _quote_targets(tickers):
+    """{ticker: exchange} 또는 [(ticker, exchange)] -> [(ticker, exchange)] (중복 제거)"""
+    items = tickers.items() if isinstance(tickers, dict) else tickers
+    return list(dict.fromkeys((ticker, exchange) for ticker, exchange in items))
+
+# ==========================================================
+# [공용] 요청 빌더 / 응답 파서
+# 동기(kis_api) / 비동기(kis_api_async) 모듈이 같이 사용.
+# 빌더는 (method, url, kwargs) 를 반환하고, 파서는 응답 JSON 을 각 함수의 반환값으로 변환.
+# ==========================================================
+def _kis_conf(real:bool=False):
+    """(base_url, app_key, app_secret, cano, acnt_prdt_cd)"""
     if real:
-        url = f"{KIS_BASE_URL_REAL}/oauth2/tokenP"
-    else:
-        url = f"{KIS_BASE_URL}/oauth2/tokenP"
+        return KIS_BASE_URL_REAL, KIS_APP_KEY_REAL, KIS_APP_SECRET_REAL, KIS_CANO_REAL, KIS_ACNT_PRDT_CD_REAL
+    return KIS_BASE_URL, KIS_APP_KEY, KIS_APP_SECRET, KIS_CANO, KIS_ACNT_PRDT_CD
+
+def _kis_headers(token, tr_id, real:bool=False):
+    _, app_key, app_secret, _, _ = _kis_conf(real)
+    return {
+        "Content-Type": "application/json",
+        "authorization": f"Bearer {token}",
+        "appKey": app_key,
+        "appSecret": app_secret,
+        "tr_id": tr_id
+    }
+
+def _send_with_headers(method, url, kwargs):
+    """
+    빌더가 만든 요청을 보내고 (응답 JSON, 응답 헤더) 반환.
+    호출 전 TR 종류별 버킷에서 대기하고, 서버가 초당 제한(EGW00201)을 돌려주면 잠깐 쉬고 재시도.
+    """
+    limiter = _rate_limiter(kwargs)
+
+    for attempt in range(KIS_THROTTLE_RETRIES + 1):
+        if limiter:
+            limiter.acquire()
+
+        res = _request(method, url, **kwargs)
+        data = res.json()
+        if limiter is None or not _is_throttled(data) or attempt == KIS_THROTTLE_RETRIES:
+            return data, res.headers
+
+        limiter.throttled += 1
+        time.sleep(1.0 / limiter.rate)
+    return data, res.headers
+
+def _send(method, url, kwargs):
+    """빌더가 만든 요청을 보내고 응답 JSON 반환"""
+    return _send_with_headers(method, url, kwargs)[0]
 
+# ==========================================================
+# [연속조회] 응답 헤더 tr_cont 가 M/F 면 다음 페이지가 있음
+# -> 요청 헤더 tr_cont=N + 응답의 ctx_area_fk200/nk200 을 그대로 넘겨서 이어서 조회
+# ==========================================================
+MAX_PAGES = 10  # 연속조회 최대 페이지 (무한 루프 방지)
+
+def _has_next_page(data, headers):
+    return data.get('rt_cd') == '0' and (headers or {}).get('tr_cont') in ("M", "F")
+
+def _next_page_request(request, data):
+    method, url, kwargs = request
+    params = dict(kwargs.get("params", {}),
+                  CTX_AREA_FK200=data.get('ctx_area_fk200', ""),
+                  CTX_AREA_NK200=data.get('ctx_area_nk200', ""))
+    headers = dict(kwargs.get("headers", {}), tr_cont="N")
+    return method, url, dict(kwargs, params=params, headers=headers)
+
+def _merge_page(merged, data, list_key):
+    """다음 페이지의 목록(list_key)을 첫 페이지 응답에 이어 붙임"""
+    if merged is None:
+        merged = dict(data)
+        merged[list_key] = list(data.get(list_key) or [])
+    elif data.get('rt_cd') == '0':
+        merged[list_key] += list(data.get(list_key) or [])
+    return merged
+
+def _send_paged(request, list_key):
+    """연속조회까지 전부 받아서 목록을 합친 응답 JSON 반환"""
+    merged = None
+    for _ in range(MAX_PAGES):
+        data, headers = _send_with_headers(*request)
+        merged = _merge_page(merged, data, list_key)
+        if not _has_next_page(data, headers):
+            break
+        request = _next_page_request(request, data)
+    return merged
+
+def _token_request(real:bool=False):
+    base_url, app_key, app_secret, _, _ = _kis_conf(real)
+    url = f"{base_url}/oauth2/tokenP"
     headers = {"content-type": "application/json"}
+    body = {
+        "grant_type": "client_credentials",
+        "appkey": app_key,
+        "appsecret": app_secret
+    }
+    return "POST", url, {"headers": headers, "data": json.dumps(body)}
+
+def _token_mode(real:bool=False):
+    return "real" if real else "mock"
+
+def _app_key_hash(real:bool=False):
+    """앱키가 바뀌면 캐시 토큰을 버리기 위한 지문 (앱키 원문은 파일에 안 남김)"""
+    _, app_key, _, _, _ = _kis_conf(real)
+    return hashlib.sha256((app_key or "").encode()).hexdigest()[:16]
+
+def _store_token(data, real:bool=False):
+    """토큰 발급 응답을 메모리 캐시에 반영. 만료시각은 응답의 expires_in(초) 기준."""
+    token = data['access_token']
+    expires_in = int(data.get('expires_in', 86400))
+    expiry = datetime.now() + timedelta(seconds=expires_in - TOKEN_EXPIRY_MARGIN_SEC)
+
+    TOKEN_CACHE[_token_mode(real)] = (token, expiry)
+    print(f"🔑 [KIS] 토큰 발급 완료")
+    return token
+
+def _cached_token(real:bool=False):
+    """유효한 메모리 캐시 토큰이 있으면 반환, 없으면 None"""
+    token, expiry = TOKEN_CACHE.get(_token_mode(real), (None, None))
+    if token and expiry and datetime.now() < expiry:
+        return token
+    return None
+
+class _TokenFileLock:
+    """토큰 캐시 파일 배타 락 (fcntl 없는 환경에서는 프로세스 내 락만)"""
+    def __enter__(self):
+        _TOKEN_THREAD_LOCK.acquire()
+        self.fd = None
+        if fcntl is not None:
+            dirpath = os.path.dirname(KIS_TOKEN_CACHE_PATH) or "."
+            os.makedirs(dirpath, exist_ok=True)
+            self.fd = os.open(KIS_TOKEN_CACHE_PATH + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+        _TOKEN_THREAD_LOCK.release()
+
+def _read_token_file():
+    try:
+        with open(KIS_TOKEN_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _load_file_token(real:bool=False):
+    """파일 캐시에 유효한 토큰이 있으면 메모리 캐시에 올리고 반환"""
+    entry = _read_token_file().get(_token_mode(real))
+    if not entry or entry.get("app_key_hash") != _app_key_hash(real):
+        return None
+
+    try:
+        expiry = datetime.fromisoformat(entry["expires_at"])
+    except Exception:
+        return None
+
+    if datetime.now() >= expiry:
+        return None
+
+    TOKEN_CACHE[_token_mode(real)] = (entry["access_token"], expiry)
+    return entry["access_token"]
+
+def _save_file_token(real:bool=False):
+    """메모리 캐시 토큰을 파일에 원자적으로 기록 (다른 모드 항목은 유지)"""
+    token, expiry = TOKEN_CACHE[_token_mode(real)]
+
+    cache = _read_token_file()
+    cache[_token_mode(real)] = {
+        "access_token": token,
+        "expires_at": expiry.isoformat(timespec="seconds"),
+        "app_key_hash": _app_key_hash(real),
+    }
+
+    dirpath = os.path.dirname(KIS_TOKEN_CACHE_PATH) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix="kis_token_", suffix=".json", dir=dirpath)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, KIS_TOKEN_CACHE_PATH)  # atomic replace
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+
+def _account_balance_request(token, real:bool=False):
+    # 체결기준현재잔고조회 모의 TR ID: VTRP6504R / 실전: CTRP6504R
+    base_url, _, _, cano, acnt_prdt_cd = _kis_conf(real)
+    tr_id = "CTRP6504R" if real else "VTRP6504R"
+    url = f"{base_url}/uapi/overseas-stock/v1/trading/inquire-present-balance"
+    params = {
+        "CANO": cano,
+        "ACNT_PRDT_CD": acnt_prdt_cd,
+        "WCRC_FRCR_DVSN_CD": "02", # 외화
+        "NATN_CD": "840", # 미국
+        "TR_MKET_CD": "00", 
+        "INQR_DVSN_CD": "00"
+    }
+    return "GET", url, {"headers": _kis_headers(token, tr_id, real), "params": params}
 
+def _parse_account_balance(data, real:bool=False):
+    if data['rt_cd'] != '0':
+        print(f"❌ [잔고조회 실패] {data['msg1']}")
+        return 0.0, 0.0
+        
+    # output2: 계좌 상세 자산 내역
+    output3 = data['output3']
+    
     if real:
-        body = {
-            "grant_type": "client_credentials",
-            "appkey": KIS_APP_KEY_REAL,
-            "appsecret": KIS_APP_SECRET_REAL
+        stock_val = float(output3.get('pchs_amt_smtl_amt', 0))
+        cash_val = float(output3.get('frcr_use_psbl_amt', 0))
+    else:
+        stock_val = float(output3.get('pchs_amt_smtl', 0))
+        cash_val = float(output3.get('frcr_evlu_tota', 0))
+    
+    total_asset = stock_val + cash_val # 총 자산
+
+    print(f"💰 [잔고조회 완료] {total_asset:.2f}원 | 주문가능 현금: {cash_val:.2f}원")
+    
+    return total_asset, cash_val
+
+def _order_request(token, tr_id, ticker, price, qty, exchange, real:bool=False):
+    base_url, _, _, cano, acnt_prdt_cd = _kis_conf(real)
+    url = f"{base_url}/uapi/overseas-stock/v1/trading/order"
+    body = {
+        "CANO": cano,
+        "ACNT_PRDT_CD": acnt_prdt_cd,
+        "OVRS_EXCG_CD": exchange,
+        "PDNO": ticker,
+        "ORD_QTY": str(int(qty)),  # 수량은 반드시 정수 문자열
+        "OVRS_ORD_UNPR": str(price),
+        "ORD_SVR_DVSN_CD": "0",
+        "ORD_DVSN": "00"           # 00: 지정가
+    }
+    return "POST", url, {"headers": _kis_headers(token, tr_id, real), "data": json.dumps(body)}
+
+def _buy_order_request(token, ticker, price, qty, exchange="NASD", real:bool=False):
+    # [중요] 모의투자 매수 TR ID: VTTT1002U / 실전: TTTT1002U
+    tr_id = "TTTT1002U" if real else "VTTT1002U"
+    return _order_request(token, tr_id, ticker, price, qty, exchange, real)
+
+def _parse_buy_order(data, ticker, price, qty):
+    if data['rt_cd'] == '0':
+        print(f"✅ [주문성공] {ticker} ${price} / {qty}주 (주문번호: {data['output']['ODNO']})")
+        return True, data['output']['ODNO']
+    else:
+        print(f"❌ [주문실패] {ticker}: {data['msg1']} (Code: {data['msg_cd']})")
+        return False, 0
+
+def sell_order_price(price):
+    """매도 주문에 실제로 넣는 가격 (현재가보다 2% 낮게 -> 바로 체결되게)"""
+    return round(price*0.98,2)
+
+def _sell_order_request(token, ticker, price, qty, exchange="NASD", real:bool=False):
+    # [중요] 모의투자 매도 TR ID: VTTT1001U (실전: TTTT1006U)
+    tr_id = "TTTT1006U" if real else "VTTT1001U"
+    return _order_request(token, tr_id, ticker, sell_order_price(price), qty, exchange, real)
+
+def _parse_sell_order(data, ticker, price, qty):
+    if data['rt_cd'] == '0':
+        print(f"📉 [매도주문 성공] {ticker} ${price} / {qty}주 (주문번호: {data['output']['ODNO']})")
+        return True
+    else:
+        print(f"❌ [매도주문 실패] {ticker}: {data['msg1']} (Code: {data['msg_cd']})")
+        return False
+
+def _stock_quantity_request(token, real:bool=False):
+    # 잔고 조회 TR 사용 (모의: VTTS3012R)
+    base_url, _, _, cano, acnt_prdt_cd = _kis_conf(real)
+    tr_id = "TTTS3012R" if real else "VTTS3012R"
+    url = f"{base_url}/uapi/overseas-stock/v1/trading/inquire-balance"
+    params = {
+        "CANO": cano,
+        "ACNT_PRDT_CD": acnt_prdt_cd,
+        "OVRS_EXCG_CD": "NASD", 
+        "TR_CRCY_CD": "USD",
+        "CTX_AREA_FK200": "",
+        "CTX_AREA_NK200": ""
+    }
+    return "GET", url, {"headers": _kis_headers(token, tr_id, real), "params": params}
+
+def _parse_stock_quantity(data):
+    if data['rt_cd'] == '0':
+        # output1: 보유 종목 리스트
+        holdings = data['output1']
+        return holdings
+    else:
+        return 0
+
+def _unfilled_request(token, real:bool=False):
+    base_url, _, _, cano, acnt_prdt_cd = _kis_conf(real)
+
+    ## 모의투자
+    if not real:
+        # 해외주식 주문체결내역 tr id : VTTS3035R
+        tr_id = "VTTS3035R"
+        url = f"{base_url}/uapi/overseas-stock/v1/trading/inquire-ccnl"
+
+        today = datetime.now().strftime("%Y%m%d")
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
+
+        params = {
+            "CANO": cano,
+            "ACNT_PRDT_CD": acnt_prdt_cd,
+            "PDNO": "%",
+            "ORD_STRT_DT": yesterday,
+            "ORD_END_DT": today,
+            "SLL_BUY_DVSN" : "00", # 00: 전체, 01: 매도, 02: 매수 ()
+            "CCLD_NCCS_DVSN": "00",
+            "OVRS_EXCG_CD": "%",
+            "SORT_SQN": "DS",
+            "ORD_DT": "",
+            "ODNO": "",
+            "CTX_AREA_FK200": "",
+            "CTX_AREA_NK200": ""
         }
+
+    ## 실전투자
+    else:
+        # 해외주식 미체결내역 tr id : TTTS3018R
+        tr_id = "TTTS3018R"
+        url = f"{base_url}/uapi/overseas-stock/v1/trading/inquire-nccs"
+
+        params = {
+            "CANO": cano,
+            "ACNT_PRDT_CD": acnt_prdt_cd,
+            "OVRS_EXCG_CD": "NASD",
+            "SORT_SQN": "DS",
+            "CTX_AREA_FK200": "",
+            "CTX_AREA_NK200": ""
+            }
+
+    return "GET", url, {"headers": _kis_headers(token, tr_id, real), "params": params}
+
+# 미체결/체결내역의 ord_dt/ord_tmd 는 한국 시간보다 하루 늦은 값으로 계산 (주문 경과시간 = 지금 - 주문시각 - 하루)
+ORDER_TIME_OFFSET = timedelta(days=1)
+
+def _parse_unfilled(data):
+    if data['rt_cd'] == '0':
+        output = data['output']
+
+        outputs = []
+        for ord in output:
+            if int(ord['nccs_qty']) > 0 and ord['sll_buy_dvsn_cd'] == "02":
+                outputs.append(ord)
+
+        return outputs
+    else:
+        return 0
+
+def _cancel_order_request(token, ticker, order_no, qty, real:bool=False):
+    # 모의: VTTT1004U / 실전: TTTT1004U
+    base_url, _, _, cano, acnt_prdt_cd = _kis_conf(real)
+    tr_id = "TTTT1004U" if real else "VTTT1004U"
+    url = f"{base_url}/uapi/overseas-stock/v1/trading/order-rvsecncl"
+    params = {
+        "CANO": cano,
+        "ACNT_PRDT_CD": acnt_prdt_cd,
+        "OVRS_EXCG_CD": "NASD",
+        "PDNO": ticker,
+        "ORGN_ODNO": order_no,
+        "RVSE_CNCL_DVSN_CD": "02", # 취소 02
+        "ORD_QTY": str(qty),
+        "OVRS_ORD_UNPR": "0"
+    }
+    return "POST", url, {"headers": _kis_headers(token, tr_id, real), "params": params}
+
+def _parse_cancel_order(data, ticker):
+    if data['rt_cd'] == '0':
+        print(f"✅ [주문취소 성공] {ticker} (주문번호: {data['output']['ODNO']})")
+        return True
+    else:
+        print(f"❌ [주문취소 실패] {ticker} ({data['msg1']})")
+        return False
+
+def _current_price_request(token, ticker, exchange):
+    # 시세 조회는 실전 도메인만 지원
+    tr_id = 'HHDFS76200200'
+    url = f"{KIS_BASE_URL_REAL}/uapi/overseas-price/v1/quotations/price-detail"
+    params = {
+        "AUTH":"",
+        "EXCD":EXCD_MAPPING.get(exchange, exchange),
+        "SYMB":ticker,
+    }
+    return "GET", url, {"headers": _kis_headers(token, tr_id, True), "params": params}
+
+def _parse_current_price(data, ticker):
+    if data['rt_cd'] == '0':
+        return data['output']
     else:
-        body = {
-            "grant_type": "client_credentials",
-            "appkey": KIS_APP_KEY,
-            "appsecret": KIS_APP_SECRET
+        print(f"❌ [현재가조회실패] {ticker}: {data['msg1']} (Code: {data['msg_cd']})")
+        return False
+
+def _5m_candles_request(token, ticker, exchange, nrec=120):
+    # 시세 조회는 실전 도메인만 지원
+    tr_id = "HHDFS76950200"
+    url = f"{KIS_BASE_URL_REAL}/uapi/overseas-price/v1/quotations/inquire-time-itemchartprice"
+    params = {
+        "AUTH":"",
+        "EXCD":EXCD_MAPPING.get(exchange, exchange),
+        "SYMB":ticker,
+        "NMIN":"5",
+        "PINC":"1",
+        "NEXT":"",
+        "NREC":str(int(nrec)), # 최대 120
+        "FILL":"",
+        "KEYB":""
         }
-    
+    return "GET", url, {"headers": _kis_headers(token, tr_id, True), "params": params}
+
+def _parse_5m_candles(data):
+    if data['rt_cd'] == '0':
+        df = pd.DataFrame(data['output2'])
+        df.rename({'open':'Open','high':'High','low':'Low','last':'Close','evol':'Volume'}, inplace=True, axis=1)
+        df["Datetime"] = pd.to_datetime(
+                df["kymd"].astype(str) + df["khms"].astype(str).str.zfill(6),
+                format="%Y%m%d%H%M%S"
+            )
+        df.set_index("Datetime", inplace=True)
+
+        # 순서 뒤집기
+        df = df.iloc[::-1]
+
+        return df
+    else:
+        print(f"❌ [현재가조회실패]")
+        return False
+
+def _approval_key_request(real:bool=False):
+    """실시간(웹소켓) 접속키 발급 요청"""
+    base_url, app_key, app_secret, _, _ = _kis_conf(real)
+    url = f"{base_url}/oauth2/Approval"
+    headers = {"content-type": "application/json"}
+    body = {
+        "grant_type": "client_credentials",
+        "appkey": app_key,
+        "secretkey": app_secret
+    }
+    return "POST", url, {"headers": headers, "data": json.dumps(body)}
+
+def _parse_approval_key(data):
+    key = data.get('approval_key')
+    if not key:
+        print(f"❌ [KIS] 실시간 접속키 발급 실패: {data}")
+        return None
+    return key
+
+# ==========================================================
+# [API] 동기 함수
+# ==========================================================
+def get_kis_token(real:bool=False):
+    """
+    접근 토큰 발급/갱신
+    메모리 캐시 -> 파일 캐시 -> 발급 순서. 발급은 파일 락을 잡은 채로 해서
+    여러 프로세스가 동시에 만료를 감지해도 한 곳만 발급하고 나머지는 파일에서 읽어감.
+    """
+    token = _cached_token(real)
+    if token:
+        return token
+
     try:
-        res = requests.post(url, headers=headers, data=json.dumps(body))
-        data = res.json()
-        ACCESS_TOKEN = data['access_token']
-        TOKEN_EXPIRY = datetime.now() + timedelta(hours=23) # 23시간 유효
-        IS_REAL = real
-        print(f"🔑 [KIS] 토큰 발급 완료")
-        return ACCESS_TOKEN
+        with _TokenFileLock():
+            token = _cached_token(real) or _load_file_token(real)
+            if token:
+                return token
+
+            data = _send(*_token_request(real))
+            token = _store_token(data, real)
+            _save_file_token(real)
+            return token
     except Exception as e:
         print(f"❌ [KIS] 토큰 발급 실패: {e}")
         return None
@@ -76,71 +713,9 @@ def get_account_balance(real:bool=False):
     token = get_kis_token(real)
     if not token: return 0.0, 0.0
 
-    # 체결기준현재잔고조회 모의 TR ID: VTRP6504R / 실전: CTRP6504R
-    if not real:
-        tr_id = "VTRP6504R"
-        url = f"{KIS_BASE_URL}/uapi/overseas-stock/v1/trading/inquire-present-balance"
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY,
-            "appSecret": KIS_APP_SECRET,
-            "tr_id": tr_id
-        }
-        
-        params = {
-            "CANO": KIS_CANO,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD,
-            "WCRC_FRCR_DVSN_CD": "02", # 외화
-            "NATN_CD": "840", # 미국
-            "TR_MKET_CD": "00", 
-            "INQR_DVSN_CD": "00"
-        }
-    else:
-        tr_id = "CTRP6504R"
-        url = f"{KIS_BASE_URL_REAL}/uapi/overseas-stock/v1/trading/inquire-present-balance"
-
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY_REAL,
-            "appSecret": KIS_APP_SECRET_REAL,
-            "tr_id": tr_id
-        }
-
-        params = {
-            "CANO": KIS_CANO_REAL,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD_REAL,
-            "WCRC_FRCR_DVSN_CD": "02", # 외화
-            "NATN_CD": "840", # 미국
-            "TR_MKET_CD": "00", 
-            "INQR_DVSN_CD": "00"
-        }
-
     try:
-        res = requests.get(url, headers=headers, params=params)
-        data = res.json()
-        
-        if data['rt_cd'] != '0':
-            print(f"❌ [잔고조회 실패] {data['msg1']}")
-            return 0.0, 0.0
-            
-        # output2: 계좌 상세 자산 내역
-        output3 = data['output3']
-        
-        if real:
-            stock_val = float(output3.get('pchs_amt_smtl_amt', 0))
-            cash_val = float(output3.get('frcr_use_psbl_amt', 0))
-        else:
-            stock_val = float(output3.get('pchs_amt_smtl', 0))
-            cash_val = float(output3.get('frcr_evlu_tota', 0))
-        
-        total_asset = stock_val + cash_val # 총 자산
-
-        print(f"💰 [잔고조회 완료] {total_asset:.2f}원 | 주문가능 현금: {cash_val:.2f}원")
-        
-        return total_asset, cash_val
-
+        data = _send(*_account_balance_request(token, real))
+        return _parse_account_balance(data, real)
     except Exception as e:
         print(f"❌ [잔고조회 에러] {e}")
         return 0.0, 0.0
@@ -149,59 +724,10 @@ def send_buy_order(ticker, price, qty, exchange="NASD", real:bool=False):
     """지정가 매수 주문"""
     token = get_kis_token(real)
     if not token: return False, 0
-    
-    # [중요] 모의투자 매수 TR ID: VTTT1002U / 실전: TTTT1002U
-    if real:
-        tr_id = "TTTT1002U"
-        url = f"{KIS_BASE_URL_REAL}/uapi/overseas-stock/v1/trading/order"
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY_REAL,
-            "appSecret": KIS_APP_SECRET_REAL,
-            "tr_id": tr_id,
-        }
-        body = {
-            "CANO": KIS_CANO_REAL,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD_REAL,
-            "OVRS_EXCG_CD": exchange,
-            "PDNO": ticker,
-            "ORD_QTY": str(int(qty)),
-            "OVRS_ORD_UNPR": str(price),
-            "ORD_SVR_DVSN_CD": "0",
-            "ORD_DVSN": "00"        # 00: 지정가
-        }
-    else:
-        tr_id = "VTTT1002U"
-        url = f"{KIS_BASE_URL}/uapi/overseas-stock/v1/trading/order"
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY,
-            "appSecret": KIS_APP_SECRET,
-            "tr_id": tr_id, 
-        }
-        
-        body = {
-            "CANO": KIS_CANO,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD,
-            "OVRS_EXCG_CD": exchange,  # 기본 나스닥 설정 (필요 시 로직 추가)
-            "PDNO": ticker,
-            "ORD_QTY": str(int(qty)),
-            "OVRS_ORD_UNPR": str(price),
-            "ORD_SVR_DVSN_CD": "0",
-            "ORD_DVSN": "00"        # 00: 지정가
-        }
 
     try:
-        res = requests.post(url, headers=headers, data=json.dumps(body))
-        data = res.json()
-        if data['rt_cd'] == '0':
-            print(f"✅ [주문성공] {ticker} ${price} / {qty}주 (주문번호: {data['output']['ODNO']})")
-            return True, data['output']['ODNO']
-        else:
-            print(f"❌ [주문실패] {ticker}: {data['msg1']} (Code: {data['msg_cd']})")
-            return False, 0
+        data = _send(*_buy_order_request(token, ticker, price, qty, exchange, real))
+        return _parse_buy_order(data, ticker, price, qty)
     except Exception as e:
         print(f"❌ [API오류] {e}")
         return False, 0
@@ -213,59 +739,9 @@ def send_sell_order(ticker, price, qty, exchange="NASD", real:bool=False):
     token = get_kis_token(real)
     if not token: return False
 
-    # [중요] 모의투자 매도 TR ID: VTTT1001U (실전: TTTT1006U)
-    if real:
-        tr_id = "TTTT1006U"
-        url = f"{KIS_BASE_URL_REAL}/uapi/overseas-stock/v1/trading/order"
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY_REAL,
-            "appSecret": KIS_APP_SECRET_REAL,
-            "tr_id": tr_id
-        }
-        body = {
-            "CANO": KIS_CANO_REAL,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD_REAL,
-            "OVRS_EXCG_CD": exchange,
-            "PDNO": ticker,
-            "ORD_QTY": str(int(qty)),
-            "OVRS_ORD_UNPR": str(round(price*0.98,2)), # 현재가보다 2% 낮게 주문
-            "ORD_SVR_DVSN_CD": "0",
-            "ORD_DVSN": "00"           # 00: 지정가
-        }
-    
-    else:
-        tr_id = "VTTT1001U"
-        url = f"{KIS_BASE_URL}/uapi/overseas-stock/v1/trading/order"
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY,
-            "appSecret": KIS_APP_SECRET,
-            "tr_id": tr_id  # <--- 매도용 ID 확인
-        }
-        body = {
-            "CANO": KIS_CANO,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD,
-            "OVRS_EXCG_CD": exchange,
-            "PDNO": ticker,
-            "ORD_QTY": str(int(qty)),  # 수량은 반드시 정수 문자열
-            "OVRS_ORD_UNPR": str(round(price*0.98,2)),
-            "ORD_SVR_DVSN_CD": "0",
-            "ORD_DVSN": "00"           # 00: 지정가
-        }
-
     try:
-        res = requests.post(url, headers=headers, data=json.dumps(body))
-        data = res.json()
-        
-        if data['rt_cd'] == '0':
-            print(f"📉 [매도주문 성공] {ticker} ${price} / {qty}주 (주문번호: {data['output']['ODNO']})")
-            return True
-        else:
-            print(f"❌ [매도주문 실패] {ticker}: {data['msg1']} (Code: {data['msg_cd']})")
-            return False
+        data = _send(*_sell_order_request(token, ticker, price, qty, exchange, real))
+        return _parse_sell_order(data, ticker, price, qty)
     except Exception as e:
         print(f"❌ [API오류] {e}")
         return False
@@ -278,55 +754,9 @@ def get_stock_quantity(real:bool=False):
     token = get_kis_token(real)
     if not token: return 0
 
-    # 잔고 조회 TR 사용 (모의: VTTS3012R)
-    if real:
-        tr_id = "TTTS3012R"
-        url = f"{KIS_BASE_URL_REAL}/uapi/overseas-stock/v1/trading/inquire-balance"
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY_REAL,
-            "appSecret": KIS_APP_SECRET_REAL,
-            "tr_id": tr_id
-        }
-        params = {
-            "CANO": KIS_CANO_REAL,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD_REAL,
-            "OVRS_EXCG_CD": "NASD", 
-            "TR_CRCY_CD": "USD",
-            "CTX_AREA_FK200": "",
-            "CTX_AREA_NK200": ""
-        }
-
-    else:
-        tr_id = "VTTS3012R"
-        url = f"{KIS_BASE_URL}/uapi/overseas-stock/v1/trading/inquire-balance"
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY,
-            "appSecret": KIS_APP_SECRET,
-            "tr_id": tr_id
-        }
-        params = {
-            "CANO": KIS_CANO,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD,
-            "OVRS_EXCG_CD": "NASD", 
-            "TR_CRCY_CD": "USD",
-            "CTX_AREA_FK200": "",
-            "CTX_AREA_NK200": ""
-        }
-
     try:
-        res = requests.get(url, headers=headers, params=params)
-        data = res.json()
-        
-        if data['rt_cd'] == '0':
-            # output1: 보유 종목 리스트
-            holdings = data['output1']
-            return holdings
-        else:
-            return 0
+        data = _send_paged(_stock_quantity_request(token, real), 'output1')
+        return _parse_stock_quantity(data)
     except Exception as e:
         print(f"❌ [수량조회 오류] {e}")
         return 0
@@ -336,161 +766,44 @@ def get_unfilled_quantity(real: bool = False):
     token = get_kis_token(real)
     if not token: return 0
 
-    ## 모의투자
-    if not real:
-        # 해외주식 주문체결내역 tr id : VTTS3035R
-        tr_id = "VTTS3035R"
-
-        url = f"{KIS_BASE_URL}/uapi/overseas-stock/v1/trading/inquire-ccnl"
-
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY,
-            "appSecret": KIS_APP_SECRET,
-            "tr_id": tr_id
-        }
-
-        today = datetime.now().strftime("%Y%m%d")
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
-
-        params = {
-            "CANO": KIS_CANO,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD,
-            "PDNO": "%",
-            "ORD_STRT_DT": yesterday,
-            "ORD_END_DT": today,
-            "SLL_BUY_DVSN" : "00", # 00: 전체, 01: 매도, 02: 매수 ()
-            "CCLD_NCCS_DVSN": "00",
-            "OVRS_EXCG_CD": "%",
-            "SORT_SQN": "DS",
-            "ORD_DT": "",
-            "ODNO": "",
-            "CTX_AREA_FK200": "",
-            "CTX_AREA_NK200": ""
-        }
-
-        try:
-            res = requests.get(url, headers=headers, params=params)
-            data = res.json()
-
-            if data['rt_cd'] == '0':
-                output = data['output']
-
-                outputs = []
-                for ord in output:
-                    if int(ord['nccs_qty']) > 0 and ord['sll_buy_dvsn_cd'] == "02":
-                        outputs.append(ord)
-
-                return outputs
-            else:
-                return 0
-        except Exception as e:
-            print(f"❌ [체결내역조회 오류] {e}")
-            return 0
+    try:
+        data = _send_paged(_unfilled_request(token, real), 'output')
+        return _parse_unfilled(data)
+    except Exception as e:
+        print(f"❌ [{'미체결내역조회' if real else '체결내역조회'} 오류] {e}")
+        return 0
 
-    ## 실전투자
-    else:
-        # 해외주식 미체결내역 tr id : TTTS3018R
-        tr_id = "TTTS3018R"
-        url = f"{KIS_BASE_URL_REAL}/uapi/overseas-stock/v1/trading/inquire-nccs"
-
-        headers = {
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY_REAL,
-            "appSecret": KIS_APP_SECRET_REAL,
-            "tr_id": tr_id
+def get_account_snapshot(real:bool=False):
+    """
+    잔고 / 보유종목 / 미체결을 한 번에 (세 TR 동시 조회)
+    return: {"total_asset", "orderable_cash", "holdings", "unfilled", "fetched_at"}
+            holdings/unfilled 는 각 조회 함수와 같은 값 (실패 시 0)
+    """
+    if not get_kis_token(real):
+        return {"total_asset": 0.0, "orderable_cash": 0.0, "holdings": 0, "unfilled": 0, "fetched_at": time.time()}
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        balance = pool.submit(get_account_balance, real)
+        holdings = pool.submit(get_stock_quantity, real)
+        unfilled = pool.submit(get_unfilled_quantity, real)
+        total_asset, orderable_cash = balance.result()
+
+        return {
+            "total_asset": total_asset,
+            "orderable_cash": orderable_cash,
+            "holdings": holdings.result(),
+            "unfilled": unfilled.result(),
+            "fetched_at": time.time(),
         }
 
-        params = {
-            "CANO": KIS_CANO_REAL,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD_REAL,
-            "OVRS_EXCG_CD": "NASD",
-            "SORT_SQN": "DS",
-            "CTX_AREA_FK200": "",
-            "CTX_AREA_NK200": ""
-            }
-        
-        try:
-            res = requests.get(url, headers=headers, params=params)
-            data = res.json()
-
-            if data['rt_cd'] == '0':
-                output = data['output']
-                outputs = []
-                for ord in output:
-                    if int(ord['nccs_qty']) > 0 and ord['sll_buy_dvsn_cd'] == "02":
-                        outputs.append(ord)
-
-                return outputs
-            else:
-                return 0
-        except Exception as e:
-            print(f"❌ [미체결내역조회 오류] {e}")
-            return 0
-
 # 주문 취소
 def cancel_order(ticker, order_no, qty, real:bool=False):
     token = get_kis_token(real)
     if not token: return False
 
-    ## 모의투자
-    if not real:
-        # tr_id: VTTT1004U
-        tr_id = "VTTT1004U"
-        url = f"{KIS_BASE_URL}/uapi/overseas-stock/v1/trading/order-rvsecncl"
-
-        headers = {
-                "Content-Type": "application/json",
-                "authorization": f"Bearer {token}",
-                "appKey": KIS_APP_KEY,
-                "appSecret": KIS_APP_SECRET,
-                "tr_id": tr_id
-            }
-
-        params = {
-            "CANO": KIS_CANO,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD,
-            "OVRS_EXCG_CD": "NASD",
-            "PDNO": ticker,
-            "ORGN_ODNO": order_no,
-            "RVSE_CNCL_DVSN_CD": "02", # 취소 02
-            "ORD_QTY": str(qty),
-            "OVRS_ORD_UNPR": "0"
-        }
-    else:
-        tr_id = "TTTT1004U"
-        url = f"{KIS_BASE_URL_REAL}/uapi/overseas-stock/v1/trading/order-rvsecncl"
-
-        headers = { 
-            "Content-Type": "application/json",
-            "authorization": f"Bearer {token}",
-            "appKey": KIS_APP_KEY_REAL,
-            "appSecret": KIS_APP_SECRET_REAL,
-            "tr_id": tr_id
-        }
-
-        params = {
-            "CANO": KIS_CANO_REAL,
-            "ACNT_PRDT_CD": KIS_ACNT_PRDT_CD_REAL,
-            "OVRS_EXCG_CD": "NASD",
-            "PDNO": ticker,
-            "ORGN_ODNO": order_no,
-            "RVSE_CNCL_DVSN_CD": "02", # 취소 02
-            "ORD_QTY": str(qty),
-            "OVRS_ORD_UNPR": "0"
-        }
-
     try:
-        res = requests.post(url, headers=headers, params=params)
-        data = res.json()
-        if data['rt_cd'] == '0':
-            print(f"✅ [주문취소 성공] {ticker} (주문번호: {data['output']['ODNO']})")
-            return True
-        else:
-            print(f"❌ [주문취소 실패] {ticker} ({data['msg1']})")
-            return False
+        data = _send(*_cancel_order_request(token, ticker, order_no, qty, real))
+        return _parse_cancel_order(data, ticker)
     except Exception as e:
         print(f"❌ [API오류] {e}")
         return False
@@ -502,108 +815,66 @@ def get_current_price(ticker,exchange, real:bool=False):
         print("❌ [KIS] 모의투자에서는 현재가 데이터를 직접 조회할 수 없습니다.")
         return False
 
+    quote = _cached_quote(ticker, exchange)
+    if quote:
+        return quote
+
     token = get_kis_token(real)
     if not token: return False
 
-    excd_mapping = {
-        "NASD": "NAS",
-        "NYSE": "NYS",
-        "AMEX": "AMS"
-    }
-
-    excg = excd_mapping.get(exchange, exchange)
-
-
-    tr_id = 'HHDFS76200200'
-    url = f"{KIS_BASE_URL_REAL}/uapi/overseas-price/v1/quotations/price-detail"
-    headers = { 
-        "Content-Type": "application/json",
-        "authorization": f"Bearer {token}",
-        "appKey": KIS_APP_KEY_REAL,
-        "appSecret": KIS_APP_SECRET_REAL,
-        "tr_id": tr_id
-    }
-    params = {
-        "AUTH":"",
-        "EXCD":excg,
-        "SYMB":ticker,
-    }
-
     try:
-        res = requests.get(url, headers=headers, params=params)
-        data = res.json()
-        if data['rt_cd'] == '0':
-            
-            return data['output']
-        else:
-            print(f"❌ [현재가조회실패] {ticker}: {data['msg1']} (Code: {data['msg_cd']})")
-            return False
-        
+        data = _send(*_current_price_request(token, ticker, exchange))
+        return _store_quote(ticker, exchange, _parse_current_price(data, ticker))
     except Exception as e:
         print(f"❌ [API오류] {e}")
         return False
 
-def get_5m_candles(ticker, exchange, real:bool=False):
+def get_current_prices(tickers, real:bool=False):
+    """
+    여러 종목 현재가 한 번에 조회 ({ticker: exchange} 또는 [(ticker, exchange)])
+    캐시에 없는 종목만 동시에 요청 (초당 제한은 시세 버킷이 맞춰줌).
+    return: {ticker: 시세 output} (실패한 종목은 빠짐)
+    """
     if not real:
         # 모의투자는 지원하지 않음
         print("❌ [KIS] 모의투자에서는 현재가 데이터를 직접 조회할 수 없습니다.")
-        return False
+        return {}
 
-    token = get_kis_token(real)
-    if not token: return False
+    targets = _quote_targets(tickers)
+    if not targets:
+        return {}
 
-    tr_id = "HHDFS76950200"
-    url = f"{KIS_BASE_URL_REAL}/uapi/overseas-price/v1/quotations/inquire-time-itemchartprice"
-    headers = { 
-        "Content-Type": "application/json",
-        "authorization": f"Bearer {token}",
-        "appKey": KIS_APP_KEY_REAL,
-        "appSecret": KIS_APP_SECRET_REAL,
-        "tr_id": tr_id
-    }
+    # 토큰은 먼저 한 번만 확보 (스레드마다 발급 시도하지 않게)
+    if not get_kis_token(real): return {}
 
-    excd_mapping = {
-        "NASD": "NAS",
-        "NYSE": "NYS",
-        "AMEX": "AMS"
-    }
+    with ThreadPoolExecutor(max_workers=min(KIS_POOL_SIZE, len(targets))) as pool:
+        quotes = list(pool.map(lambda t: get_current_price(t[0], t[1], real), targets))
 
-    excg = excd_mapping.get(exchange, exchange)
+    return {ticker: quote for (ticker, _), quote in zip(targets, quotes) if quote}
+
+def get_5m_candles(ticker, exchange, real:bool=False, nrec=120):
+    if not real:
+        # 모의투자는 지원하지 않음
+        print("❌ [KIS] 모의투자에서는 현재가 데이터를 직접 조회할 수 없습니다.")
+        return False
+
+    token = get_kis_token(real)
+    if not token: return False
 
-    params = {
-        "AUTH":"",
-        "EXCD":excg,
-        "SYMB":ticker,
-        "NMIN":"5",
-        "PINC":"1",
-        "NEXT":"",
-        "NREC":"120",
-        "FILL":"",
-        "KEYB":""
-        }
-    
     try:
-        res = requests.get(url, headers=headers, params=params)
-        data = res.json()
-        if data['rt_cd'] == '0':
-            df = pd.DataFrame(data['output2'])
-            df.rename({'open':'Open','high':'High','low':'Low','last':'Close','evol':'Volume'}, inplace=True, axis=1)
-            df["Datetime"] = pd.to_datetime(
-                    df["kymd"].astype(str) + df["khms"].astype(str).str.zfill(6),
-                    format="%Y%m%d%H%M%S"
-                )
-            df.set_index("Datetime", inplace=True)
-
-            # 순서 뒤집기
-            df = df.iloc[::-1]
-
-            return df
-        else:
-            print(f"❌ [현재가조회실패]")
-            return False
+        data = _send(*_5m_candles_request(token, ticker, exchange, nrec))
+        return _parse_5m_candles(data)
     except Exception as e:
         print(f"❌ [API오류] {ticker} {exchange} {e}")
         return False
+
+def get_approval_key(real:bool=False):
+    """실시간 시세 웹소켓 접속키 (연결할 때마다 새로 발급)"""
+    try:
+        return _parse_approval_key(_send(*_approval_key_request(real)))
+    except Exception as e:
+        print(f"❌ [KIS] 실시간 접속키 발급 실패: {e}")
+        return None
     
         
         
@@ -0,0 +1,312 @@
+import asyncio, time
+import aiohttp
+
+import kis_api
+from kis_api import (
+    _rate_limiter, _is_throttled,
+    MAX_PAGES, _has_next_page, _next_page_request, _merge_page,
+    _cached_token,
+    _cached_quote, _store_quote, _quote_key, _quote_targets,
+    _account_balance_request, _parse_account_balance,
+    _buy_order_request, _parse_buy_order,
+    _sell_order_request, _parse_sell_order,
+    _stock_quantity_request, _parse_stock_quantity,
+    _unfilled_request, _parse_unfilled,
+    _cancel_order_request, _parse_cancel_order,
+    _current_price_request, _parse_current_price,
+    _5m_candles_request, _parse_5m_candles,
+    _approval_key_request, _parse_approval_key,
+)
+
+# ==========================================================
+# kis_api 의 비동기(asyncio) 버전
+# 함수 이름/인자/반환값은 kis_api 와 동일하고, 전부 await 해서 사용.
+# 요청 빌더/응답 파서는 kis_api 것을 그대로 공유하고 전송만 aiohttp 로 함.
+# ==========================================================
+
+class _LoopState:
+    """이벤트 루프마다 따로 두는 상태 (aiohttp 세션 / asyncio.Lock / Task 는 만든 루프에서만 쓸 수 있음)"""
+    def __init__(self):
+        self.session = None
+        self.token_lock = asyncio.Lock()
+        self.quote_inflight = {}  # (ticker, EXCD) -> 진행 중인 현재가 조회 Task (같은 종목 동시 조회는 한 번만)
+        self.closer = None        # 루프가 끝날 때 세션을 닫는 Task
+
+_LOOP_STATES = {}  # 이벤트 루프 -> _LoopState
+
+def _loop_state():
+    loop = asyncio.get_running_loop()
+    state = _LOOP_STATES.get(loop)
+    if state is None:
+        state = _LOOP_STATES[loop] = _LoopState()
+        state.closer = loop.create_task(_close_on_shutdown(loop, state))
+    return state
+
+async def _close_on_shutdown(loop, state):
+    """
+    루프 종료 훅: 루프가 도는 동안 기다리다가 asyncio.run 이 남은 Task 를 취소할 때
+    그 루프 안에서 세션을 닫고 상태를 지움 (다른 루프에서 닫으면 Unclosed client session 경고 + 소켓 누수)
+    """
+    try:
+        await loop.create_future()
+    finally:
+        if _LOOP_STATES.get(loop) is state:
+            del _LOOP_STATES[loop]
+        session, state.session = state.session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+async def get_http_session():
+    """
+    KIS 호출 공용 aiohttp.ClientSession (이벤트 루프당 1개, 루프가 끝나면 자동으로 닫힘)
+    풀 크기/타임아웃은 kis_api 설정(KIS_POOL_SIZE, KIS_*_TIMEOUT)을 그대로 사용.
+    """
+    state = _loop_state()
+    if state.session is None or state.session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=kis_api.KIS_POOL_SIZE, keepalive_timeout=30)
+        timeout = aiohttp.ClientTimeout(sock_connect=kis_api.KIS_CONNECT_TIMEOUT, sock_read=kis_api.KIS_READ_TIMEOUT)
+        state.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return state.session
+
+async def close_http_session():
+    """현재 루프의 공용 세션 닫기 (루프가 끝날 때는 _close_on_shutdown 이 닫으므로 필수는 아님)"""
+    state = _LOOP_STATES.get(asyncio.get_running_loop())
+    if state is None:
+        return
+    session, state.session = state.session, None
+    if session is not None and not session.closed:
+        await session.close()
+
+async def _send_with_headers(method, url, kwargs):
+    """빌더가 만든 요청을 보내고 (응답 JSON, 응답 헤더) 반환 (kis_api 와 같은 호출 제한/재시도)"""
+    session = await get_http_session()
+
+    # requests 처럼 값이 None 인 헤더는 빼고 보냄 (aiohttp 는 None 헤더에서 에러)
+    if "headers" in kwargs:
+        kwargs = dict(kwargs, headers={k: v for k, v in kwargs["headers"].items() if v is not None})
+
+    limiter = _rate_limiter(kwargs)
+
+    # 동기 버전과 같은 버킷을 공유 (대기만 asyncio.sleep)
+    for attempt in range(kis_api.KIS_THROTTLE_RETRIES + 1):
+        if limiter:
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        async with session.request(method, url, **kwargs) as res:
+            data = await res.json(content_type=None)
+            headers = res.headers
+
+        if limiter is None or not _is_throttled(data) or attempt == kis_api.KIS_THROTTLE_RETRIES:
+            return data, headers
+
+        limiter.throttled += 1
+        await asyncio.sleep(1.0 / limiter.rate)
+    return data, headers
+
+async def _send(method, url, kwargs):
+    """빌더가 만든 요청을 보내고 응답 JSON 반환"""
+    return (await _send_with_headers(method, url, kwargs))[0]
+
+async def _send_paged(request, list_key):
+    """연속조회(tr_cont)까지 전부 받아서 목록을 합친 응답 JSON 반환"""
+    merged = None
+    for _ in range(MAX_PAGES):
+        data, headers = await _send_with_headers(*request)
+        merged = _merge_page(merged, data, list_key)
+        if not _has_next_page(data, headers):
+            break
+        request = _next_page_request(request, data)
+    return merged
+
+async def get_kis_token(real:bool=False):
+    """
+    접근 토큰 발급/갱신 (kis_api 와 같은 메모리/파일 캐시 공유)
+    캐시 미스일 때만 kis_api.get_kis_token 을 스레드에서 실행 (파일 락이 블로킹이라서).
+    """
+    token = _cached_token(real)
+    if token:
+        return token
+
+    # 동시에 여러 코루틴이 만료를 감지해도 발급은 한 번만
+    async with _loop_state().token_lock:
+        token = _cached_token(real)
+        if token:
+            return token
+
+        return await asyncio.to_thread(kis_api.get_kis_token, real)
+
+async def get_account_balance(real:bool=False):
+    """
+    계좌의 총 자산(USD)과 주문가능 현금(USD)을 조회
+    return: (총자산, 주문가능현금)
+    """
+    token = await get_kis_token(real)
+    if not token: return 0.0, 0.0
+
+    try:
+        data = await _send(*_account_balance_request(token, real))
+        return _parse_account_balance(data, real)
+    except Exception as e:
+        print(f"❌ [잔고조회 에러] {e}")
+        return 0.0, 0.0
+
+async def send_buy_order(ticker, price, qty, exchange="NASD", real:bool=False):
+    """지정가 매수 주문"""
+    token = await get_kis_token(real)
+    if not token: return False, 0
+
+    try:
+        data = await _send(*_buy_order_request(token, ticker, price, qty, exchange, real))
+        return _parse_buy_order(data, ticker, price, qty)
+    except Exception as e:
+        print(f"❌ [API오류] {e}")
+        return False, 0
+
+async def send_sell_order(ticker, price, qty, exchange="NASD", real:bool=False):
+    """
+    해외주식 지정가 매도 주문
+    """
+    token = await get_kis_token(real)
+    if not token: return False
+
+    try:
+        data = await _send(*_sell_order_request(token, ticker, price, qty, exchange, real))
+        return _parse_sell_order(data, ticker, price, qty)
+    except Exception as e:
+        print(f"❌ [API오류] {e}")
+        return False
+
+async def get_stock_quantity(real:bool=False):
+    """
+    계좌 전체 보유 수량 조회 (매도 전 확인용)
+    return: 보유 종목 리스트
+    """
+    token = await get_kis_token(real)
+    if not token: return 0
+
+    try:
+        data = await _send_paged(_stock_quantity_request(token, real), 'output1')
+        return _parse_stock_quantity(data)
+    except Exception as e:
+        print(f"❌ [수량조회 오류] {e}")
+        return 0
+
+## 매수 주문 미체결 수량 조회
+async def get_unfilled_quantity(real: bool = False):
+    token = await get_kis_token(real)
+    if not token: return 0
+
+    try:
+        data = await _send_paged(_unfilled_request(token, real), 'output')
+        return _parse_unfilled(data)
+    except Exception as e:
+        print(f"❌ [{'미체결내역조회' if real else '체결내역조회'} 오류] {e}")
+        return 0
+
+async def get_account_snapshot(real:bool=False):
+    """
+    잔고 / 보유종목 / 미체결을 한 번에 (세 TR 동시 조회)
+    return: {"total_asset", "orderable_cash", "holdings", "unfilled", "fetched_at"}
+    """
+    if not await get_kis_token(real):
+        return {"total_asset": 0.0, "orderable_cash": 0.0, "holdings": 0, "unfilled": 0, "fetched_at": time.time()}
+
+    (total_asset, orderable_cash), holdings, unfilled = await asyncio.gather(
+        get_account_balance(real),
+        get_stock_quantity(real),
+        get_unfilled_quantity(real),
+    )
+    return {
+        "total_asset": total_asset,
+        "orderable_cash": orderable_cash,
+        "holdings": holdings,
+        "unfilled": unfilled,
+        "fetched_at": time.time(),
+    }
+
+# 주문 취소
+async def cancel_order(ticker, order_no, qty, real:bool=False):
+    token = await get_kis_token(real)
+    if not token: return False
+
+    try:
+        data = await _send(*_cancel_order_request(token, ticker, order_no, qty, real))
+        return _parse_cancel_order(data, ticker)
+    except Exception as e:
+        print(f"❌ [API오류] {e}")
+        return False
+
+# 현재가 데이터 조회
+async def _fetch_current_price(ticker, exchange, real:bool=False):
+    token = await get_kis_token(real)
+    if not token: return False
+
+    try:
+        data = await _send(*_current_price_request(token, ticker, exchange))
+        return _store_quote(ticker, exchange, _parse_current_price(data, ticker))
+    except Exception as e:
+        print(f"❌ [API오류] {e}")
+        return False
+
+async def get_current_price(ticker, exchange, real:bool=False):
+    if not real:
+        # 모의투자는 지원하지 않음
+        print("❌ [KIS] 모의투자에서는 현재가 데이터를 직접 조회할 수 없습니다.")
+        return False
+
+    quote = _cached_quote(ticker, exchange)
+    if quote:
+        return quote
+
+    # 같은 종목을 이미 조회 중이면 그 결과를 같이 기다림
+    key = _quote_key(ticker, exchange)
+    inflight = _loop_state().quote_inflight
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_current_price(ticker, exchange, real))
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+async def get_current_prices(tickers, real:bool=False):
+    """
+    여러 종목 현재가 동시 조회 ({ticker: exchange} 또는 [(ticker, exchange)])
+    return: {ticker: 시세 output} (실패한 종목은 빠짐)
+    """
+    if not real:
+        # 모의투자는 지원하지 않음
+        print("❌ [KIS] 모의투자에서는 현재가 데이터를 직접 조회할 수 없습니다.")
+        return {}
+
+    targets = _quote_targets(tickers)
+    if not targets:
+        return {}
+
+    quotes = await asyncio.gather(*[get_current_price(ticker, exchange, real) for ticker, exchange in targets])
+    return {ticker: quote for (ticker, _), quote in zip(targets, quotes) if quote}
+
+async def get_5m_candles(ticker, exchange, real:bool=False, nrec=120):
+    if not real:
+        # 모의투자는 지원하지 않음
+        print("❌ [KIS] 모의투자에서는 현재가 데이터를 직접 조회할 수 없습니다.")
+        return False
+
+    token = await get_kis_token(real)
+    if not token: return False
+
+    try:
+        data = await _send(*_5m_candles_request(token, ticker, exchange, nrec))
+        return _parse_5m_candles(data)
+    except Exception as e:
+        print(f"❌ [API오류] {ticker} {exchange} {e}")
+        return False
+
+async def get_approval_key(real:bool=False):
+    """실시간 시세 웹소켓 접속키 (연결할 때마다 새로 발급)"""
+    try:
+        return _parse_approval_key(await _send(*_approval_key_request(real)))
+    except Exception as e:
+        print(f"❌ [KIS] 실시간 접속키 발급 실패: {e}")
+        return None
@@ -0,0 +1,185 @@
+import os, io, time, shutil, asyncio, argparse, contextlib, tempfile
+
+import kis_api
+import kis_api_async
+from kis_fake import FakeKisServer
+
+# ==========================================================
+# KIS 클라이언트 부하 테스트 (kis_fake.py 상대로)
+# 실제 kis_api / kis_api_async 코드 경로 그대로 호출해서
+# 처리량(호출/초), 지연(p50/p95), 실패 수, 클라이언트 버킷 대기/EGW00201 재시도 횟수를 봄.
+# - --url 없으면 가짜 서버를 같은 프로세스에서 띄움 (--latency/--error-rate/--server-rps 로 조건 설정)
+# - 토큰 캐시는 임시 파일 사용 (실제 kis_token.json 안 건드림)
+#
+# 실행 예: python kis_bench.py --latency 0.05 --jitter 0.05 --error-rate 0.02 --server-rps 20 --client-quote-rps 10
+# ==========================================================
+
+SCENARIOS = ("quotes", "candles", "snapshot", "orders", "quotes_sync")
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def configure_client(url, quote_rps, trade_rps, quote_cache=False):
+    """kis_api 전역 설정을 가짜 서버용으로 바꿈 (주소, 더미 계좌, 임시 토큰 캐시, 버킷 속도)"""
+    kis_api.KIS_BASE_URL = kis_api.KIS_BASE_URL_REAL = url
+    kis_api.KIS_APP_KEY_REAL = kis_api.KIS_APP_KEY_REAL or "fake-appkey"
+    kis_api.KIS_APP_SECRET_REAL = kis_api.KIS_APP_SECRET_REAL or "fake-secret"
+    kis_api.KIS_CANO_REAL = kis_api.KIS_CANO_REAL or "00000000"
+    kis_api.KIS_ACNT_PRDT_CD_REAL = kis_api.KIS_ACNT_PRDT_CD_REAL or "01"
+    kis_api.KIS_TOKEN_CACHE_PATH = os.path.join(tempfile.mkdtemp(prefix="kis_bench_"), "kis_token.json")
+    kis_api.TOKEN_CACHE.clear()
+
+    if not quote_cache:
+        kis_api.QUOTE_CACHE_TTL_SEC = 0
+    kis_api.QUOTE_CACHE.clear()
+    reset_limiters(quote_rps, trade_rps)
+
+def reset_limiters(quote_rps, trade_rps):
+    """시나리오마다 새 버킷 (통계 초기화)"""
+    kis_api.RATE_LIMITERS["quote"] = kis_api.TokenBucket("quote", quote_rps)
+    kis_api.RATE_LIMITERS["trade"] = kis_api.TokenBucket("trade", trade_rps)
+
+async def _timed(latencies, coro):
+    started = time.perf_counter()
+    result = await coro
+    latencies.append(time.perf_counter() - started)
+    return result
+
+async def _quotes(tickers, rounds, latencies):
+    # 종목마다 따로 재서 호출당 지연을 봄 (get_current_prices 와 같은 동시 호출)
+    results = []
+    for _ in range(rounds):
+        results += await asyncio.gather(*[_timed(latencies, kis_api_async.get_current_price(t, "NAS", True))
+                                          for t in tickers])
+    return len(results), sum(1 for r in results if not r)
+
+async def _candles(tickers, rounds, latencies):
+    results = []
+    for _ in range(rounds):
+        results += await asyncio.gather(*[_timed(latencies, kis_api_async.get_5m_candles(t, "NAS", True))
+                                          for t in tickers])
+    return len(results), sum(1 for r in results if r is False)
+
+async def _snapshot(tickers, rounds, latencies):
+    failures = 0
+    for _ in range(rounds):
+        snap = await _timed(latencies, kis_api_async.get_account_snapshot(True))
+        # 조회 실패: 잔고 TR 은 (0.0, 0.0), 보유/미체결 TR 은 0
+        balance_failed = snap["total_asset"] == 0.0 and snap["orderable_cash"] == 0.0
+        failures += balance_failed or snap["holdings"] == 0 or snap["unfilled"] == 0
+    return rounds, failures
+
+async def _orders(tickers, rounds, latencies):
+    """현재가보다 한참 낮은 지정가 매수 -> 취소 (체결 안 되게)"""
+    calls = failures = 0
+    for _ in range(rounds):
+        for ticker in tickers:
+            ok, odno = await _timed(latencies, kis_api_async.send_buy_order(ticker, 0.01, 1, "NASD", True))
+            calls += 1
+            if not ok:
+                failures += 1
+                continue
+            calls += 1
+            failures += not await _timed(latencies, kis_api_async.cancel_order(ticker, odno, 1, True))
+    return calls, failures
+
+async def _quotes_sync(tickers, rounds, latencies):
+    # 동기 버전 (스레드 풀, 지연은 한 라운드 전체) - 서버가 같은 이벤트 루프에 있어서 스레드에서 실행
+    def run():
+        results = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            quotes = kis_api.get_current_prices([(t, "NAS") for t in tickers], True)
+            latencies.append(time.perf_counter() - started)
+            results += [t in quotes for t in tickers]
+        return len(results), results.count(False)
+    return await asyncio.to_thread(run)
+
+RUNNERS = {"quotes": _quotes, "candles": _candles, "snapshot": _snapshot, "orders": _orders, "quotes_sync": _quotes_sync}
+
+async def run_bench(url=None, scenarios=SCENARIOS, tickers=20, rounds=5,
+                    quote_rps=kis_api.KIS_QUOTE_RPS, trade_rps=kis_api.KIS_TRADE_RPS, quote_cache=False,
+                    quiet=True, **server_opts):
+    server = None
+    if url is None:
+        server = FakeKisServer(port=0, **server_opts)
+        await server.start()
+        url = server.url
+
+    configure_client(url, quote_rps, trade_rps, quote_cache)
+    symbols = [f"T{i:03d}" for i in range(tickers)]
+    report = []
+
+    try:
+        for name in scenarios:
+            reset_limiters(quote_rps, trade_rps)
+            before = dict(server.stats()) if server else None
+            latencies = []
+
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+                calls, failures = await RUNNERS[name](symbols, rounds, latencies)
+            elapsed = time.perf_counter() - started
+
+            limits = kis_api.get_rate_limit_stats()
+            row = {
+                "scenario": name, "calls": calls, "failures": failures,
+                "elapsed_sec": round(elapsed, 3), "calls_per_sec": round(calls / elapsed, 1) if elapsed else 0.0,
+                "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+                "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+                "max_ms": round(max(latencies, default=0.0) * 1000, 1),
+                "client_waits": sum(s["waited_calls"] for s in limits.values()),
+                "client_wait_sec": round(sum(s["total_wait_sec"] for s in limits.values()), 3),
+                "retried_throttle": sum(s["throttled"] for s in limits.values()),
+            }
+            if server:
+                after = server.stats()
+                row["server_throttled"] = after["throttled"] - before["throttled"]
+                row["server_errors"] = after["errors"] - before["errors"]
+            report.append(row)
+            print(f"📊 [Bench] {name:<12} {calls:>5}건 {row['calls_per_sec']:>7.1f}/s "
+                  f"p50 {row['p50_ms']:>7.1f}ms p95 {row['p95_ms']:>7.1f}ms 실패 {failures:>3} "
+                  f"대기 {row['client_waits']:>4}회({row['client_wait_sec']:.2f}s) EGW00201 재시도 {row['retried_throttle']}"
+                  + (f" / 서버 제한 {row['server_throttled']} 에러 {row['server_errors']}" if server else ""))
+    finally:
+        await kis_api_async.close_http_session()
+        shutil.rmtree(os.path.dirname(kis_api.KIS_TOKEN_CACHE_PATH), ignore_errors=True)
+        if server:
+            print(f"🧪 [FakeKIS] {server.stats()}")
+            await server.stop()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="가짜 KIS 서버 상대로 kis_api 처리량/재시도/호출 제한 측정")
+    parser.add_argument("--url", help="이미 떠 있는 서버 주소 (없으면 가짜 서버를 직접 띄움)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"쉼표 구분 ({', '.join(SCENARIOS)})")
+    parser.add_argument("--tickers", type=int, default=20, help="조회할 종목 수")
+    parser.add_argument("--rounds", type=int, default=5, help="시나리오별 반복 횟수")
+    parser.add_argument("--client-quote-rps", type=float, default=kis_api.KIS_QUOTE_RPS, help="클라이언트 시세 버킷 속도")
+    parser.add_argument("--client-trade-rps", type=float, default=kis_api.KIS_TRADE_RPS, help="클라이언트 주문/잔고 버킷 속도")
+    parser.add_argument("--quote-cache", action="store_true", help="현재가 캐시 켜고 측정")
+    parser.add_argument("--verbose", action="store_true", help="클라이언트 로그 보기")
+    # 가짜 서버 조건 (--url 없을 때만)
+    parser.add_argument("--latency", type=float, default=0.03, help="서버 응답 기본 지연 (초)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="서버 추가 랜덤 지연 최대값 (초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="서버 500 에러 확률")
+    parser.add_argument("--server-rps", type=float, default=20, help="서버 앱키당 초당 제한 (0 이면 제한 없음)")
+    parser.add_argument("--page-size", type=int, default=20, help="서버 목록 조회 한 페이지 건수")
+    parser.add_argument("--holdings", type=int, default=50, help="서버에 미리 넣어 둘 보유 종목 수 (연속조회)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in RUNNERS]
+    if unknown:
+        parser.error(f"알 수 없는 시나리오: {unknown}")
+
+    server_opts = {} if args.url else dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                           rps=args.server_rps, page_size=args.page_size,
+                                           holdings=args.holdings, seed=args.seed)
+    asyncio.run(run_bench(args.url, scenarios, args.tickers, args.rounds,
+                          args.client_quote_rps, args.client_trade_rps, args.quote_cache,
+                          not args.verbose, **server_opts))
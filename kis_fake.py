@@ -0,0 +1,373 @@
+import asyncio, json, random, argparse, math, time, zlib
+from datetime import datetime, timedelta
+from aiohttp import web
+
+from kis_api import ORDER_TIME_OFFSET
+
+# ==========================================================
+# 로컬 가짜 KIS REST 서버 (부하/지연/재시도 테스트용)
+# kis_api / kis_api_async 가 쓰는 엔드포인트만 실제와 같은 경로/응답 형태로 흉내냄:
+#   tokenP, Approval, inquire-present-balance, inquire-balance, inquire-ccnl, inquire-nccs,
+#   order, order-rvsecncl, price-detail, inquire-time-itemchartprice
+# - latency + jitter: 응답마다 지연
+# - error_rate: 이 확률로 500 에러 응답
+# - rps / mock_rps: 앱키별 초당 호출 제한, 넘으면 실제처럼 EGW00201 응답 (실전 TR / 모의 TR 따로)
+# - token_interval: 토큰 발급 최소 간격 (실제 1분당 1회, 넘으면 EGW00133)
+# - page_size: 목록 조회는 tr_cont / CTX_AREA_NK200 연속조회로 나눠서 응답
+# - 시세는 종목별 랜덤워크, 지정가 매수는 현재가가 주문가 이하로 내려오면 체결, 매도는 바로 체결
+# - GET /__stats: 엔드포인트별 호출 수 / 제한 / 에러 통계
+#
+# 실행 예: python kis_fake.py --port 21100 --latency 0.05 --error-rate 0.01
+# 연결 예: KIS_BASE_URL_REAL=http://127.0.0.1:21100 KIS_BASE_URL=http://127.0.0.1:21100 python bot_runner.py
+# ==========================================================
+
+THROTTLE_MSG = {"rt_cd": "1", "msg_cd": "EGW00201", "msg1": "초당 거래건수를 초과하였습니다."}
+TOKEN_LIMIT_MSG = {"error_code": "EGW00133", "error_description": "접근토큰 발급 잠시 후 다시 시도하세요(1분당 1회)"}
+ERROR_MSG = {"rt_cd": "1", "msg_cd": "EGW00500", "msg1": "(fake) 서버 내부 오류"}
+
+BUY_TR_IDS = {"TTTT1002U", "VTTT1002U"}
+FX_KRW = 1500  # 잔고 조회는 원화로 응답 (main 이 1500 으로 나눠 씀)
+
+def _ok(msg1="정상처리 되었습니다.", **fields):
+    return dict({"rt_cd": "0", "msg_cd": "KIOK0000", "msg1": msg1}, **fields)
+
+class FakeKisServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 21100,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rps: float = 20, mock_rps: float = 2, token_interval: float = 60,
+                 page_size: int = 20, cash_usd: float = 10_000.0, holdings: int = 0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rps = rps
+        self.mock_rps = mock_rps
+        self.token_interval = token_interval
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.seed = seed
+
+        # 계좌
+        self.cash = cash_usd
+        self.positions = {}   # ticker -> {"qty", "avg", "excg"}
+        self.orders = {}      # odno -> {"ticker", "side", "price", "qty", "excg", "at"}
+        self.next_odno = 1
+        for i in range(holdings):  # 연속조회 테스트용 보유 종목
+            self.positions[f"FK{i:03d}"] = {"qty": 10, "avg": 10.0, "excg": "NASD"}
+
+        self.prices = {}      # ticker -> 현재가 (랜덤워크)
+        self.windows = {}     # (appkey, 실전/모의) -> 최근 1초 요청 시각 deque 대신 list
+        self.last_token = {}  # appkey -> 마지막 토큰 발급 시각
+
+        # 통계
+        self.calls = {}
+        self.throttled = 0
+        self.errors = 0
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/oauth2/tokenP", self._token)
+        app.router.add_post("/oauth2/Approval", self._approval)
+        app.router.add_get("/uapi/overseas-stock/v1/trading/inquire-present-balance", self._present_balance)
+        app.router.add_get("/uapi/overseas-stock/v1/trading/inquire-balance", self._balance)
+        app.router.add_get("/uapi/overseas-stock/v1/trading/inquire-ccnl", self._orders_list)
+        app.router.add_get("/uapi/overseas-stock/v1/trading/inquire-nccs", self._orders_list)
+        app.router.add_post("/uapi/overseas-stock/v1/trading/order", self._order)
+        app.router.add_post("/uapi/overseas-stock/v1/trading/order-rvsecncl", self._cancel)
+        app.router.add_get("/uapi/overseas-price/v1/quotations/price-detail", self._price)
+        app.router.add_get("/uapi/overseas-price/v1/quotations/inquire-time-itemchartprice", self._chart)
+        app.router.add_get("/__stats", self._stats)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+
+        # port=0 이면 OS 가 잡아준 포트로 갱신
+        self.port = self.runner.addresses[0][1]
+        print(f"🧪 [FakeKIS] {self.url} 시작")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    # ------------------------------------------------------
+    # 공통: 지연 / 호출 제한 / 에러 주입
+    # ------------------------------------------------------
+    def _over_limit(self, request):
+        tr_id = request.headers.get("tr_id")
+        if not tr_id:
+            return False
+        mock = tr_id.startswith("V")
+        limit = self.mock_rps if mock else self.rps
+        if not limit:
+            return False
+
+        now = time.monotonic()
+        key = (request.headers.get("appKey"), mock)
+        window = [t for t in self.windows.get(key, []) if now - t < 1.0]
+        if len(window) >= limit:
+            self.windows[key] = window
+            return True
+        window.append(now)
+        self.windows[key] = window
+        return False
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if request.path == "/__stats":
+            return await handler(request)
+
+        name = request.path.rsplit("/", 1)[-1]
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self._over_limit(request):
+            self.throttled += 1
+            return web.json_response(THROTTLE_MSG, status=500)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response(ERROR_MSG, status=500)
+
+        return await handler(request)
+
+    def _paged(self, request, rows, list_key, extra):
+        """CTX_AREA_NK200 를 시작 위치로 써서 page_size 개씩 응답 (남았으면 tr_cont=M)"""
+        try:
+            offset = int(request.query.get("CTX_AREA_NK200") or 0)
+        except ValueError:
+            offset = 0
+        page = rows[offset:offset + self.page_size]
+        more = offset + self.page_size < len(rows)
+
+        body = _ok(**{list_key: page}, **extra)
+        body["ctx_area_fk200"] = ""
+        body["ctx_area_nk200"] = str(offset + self.page_size) if more else ""
+        return web.json_response(body, headers={"tr_cont": "M" if more else "D"})
+
+    # ------------------------------------------------------
+    # 시세
+    # ------------------------------------------------------
+    def _symbol_seed(self, ticker):
+        return zlib.crc32(f"{self.seed}:{ticker}".encode())
+
+    def price_of(self, ticker):
+        if ticker not in self.prices:
+            self.prices[ticker] = 5 + self._symbol_seed(ticker) % 20000 / 100  # 5 ~ 205
+        return self.prices[ticker]
+
+    def _tick(self, ticker):
+        """현재가 한 번 움직이고 체결 가능한 매수 주문 처리"""
+        price = max(0.01, self.price_of(ticker) * (1 + self.random.gauss(0, 0.002)))
+        self.prices[ticker] = price
+        for odno, order in list(self.orders.items()):
+            if order["ticker"] == ticker and order["side"] == "buy" and price <= order["price"]:
+                self._fill(odno, min(price, order["price"]))
+        return price
+
+    def _fill(self, odno, price):
+        order = self.orders.pop(odno)
+        pos = self.positions.setdefault(order["ticker"], {"qty": 0, "avg": 0.0, "excg": order["excg"]})
+        pos["avg"] = (pos["avg"] * pos["qty"] + price * order["qty"]) / (pos["qty"] + order["qty"])
+        pos["qty"] += order["qty"]
+
+    async def _price(self, request):
+        ticker = request.query.get("SYMB", "")
+        price = self._tick(ticker)
+        return web.json_response(_ok(output={
+            "rsym": f"D{request.query.get('EXCD', '')}{ticker}",
+            "last": f"{price:.4f}",
+            "base": f"{self.price_of(ticker):.4f}",
+            "tvol": str(self.random.randint(1_000, 1_000_000)),
+        }))
+
+    async def _chart(self, request):
+        """최근 nrec 개 5분봉 (최신이 앞, 시각은 한국 시간). 종목/봉 번호로 정해지는 결정적 가격"""
+        ticker = request.query.get("SYMB", "")
+        nrec = min(120, int(request.query.get("NREC") or 120))
+        base = self.price_of(ticker)
+        phase = self._symbol_seed(ticker) % 1000 / 100
+
+        now = datetime.now()
+        last = now.replace(second=0, microsecond=0) - timedelta(minutes=now.minute % 5)
+        rows = []
+        for i in range(nrec):
+            ts = last - timedelta(minutes=5 * i)
+            bar_no = int(ts.timestamp() // 300)
+            close = base * (1 + 0.05 * math.sin(bar_no / 20 + phase))
+            open_ = base * (1 + 0.05 * math.sin((bar_no - 1) / 20 + phase))
+            rows.append({
+                "kymd": ts.strftime("%Y%m%d"), "khms": ts.strftime("%H%M%S"),
+                "open": f"{open_:.4f}", "high": f"{max(open_, close) * 1.002:.4f}",
+                "low": f"{min(open_, close) * 0.998:.4f}", "last": f"{close:.4f}",
+                "evol": str(1000 + bar_no % 997),
+            })
+        return web.json_response(_ok(output1={"rsym": f"D{request.query.get('EXCD', '')}{ticker}", "nrec": str(nrec)},
+                                     output2=rows))
+
+    # ------------------------------------------------------
+    # 토큰 / 계좌
+    # ------------------------------------------------------
+    async def _token(self, request):
+        try:
+            body = json.loads(await request.text() or "{}")
+        except ValueError:
+            body = {}
+        appkey = body.get("appkey")
+
+        now = time.monotonic()
+        last = self.last_token.get(appkey)
+        if self.token_interval and last is not None and now - last < self.token_interval:
+            return web.json_response(TOKEN_LIMIT_MSG, status=403)
+        self.last_token[appkey] = now
+
+        expires = datetime.now() + timedelta(days=1)
+        return web.json_response({
+            "access_token": f"fake-token-{self.random.getrandbits(64):016x}",
+            "token_type": "Bearer",
+            "expires_in": 86400,
+            "access_token_token_expired": expires.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    async def _approval(self, request):
+        return web.json_response({"approval_key": f"fake-approval-{self.random.getrandbits(32):08x}"})
+
+    def _purchase_amount(self):
+        return sum(pos["qty"] * pos["avg"] for pos in self.positions.values())
+
+    def _orderable(self):
+        reserved = sum(o["price"] * o["qty"] for o in self.orders.values() if o["side"] == "buy")
+        return self.cash - reserved
+
+    async def _present_balance(self, request):
+        purchased = f"{self._purchase_amount() * FX_KRW:.2f}"
+        orderable = f"{self._orderable() * FX_KRW:.2f}"
+        return web.json_response(_ok(output1=[], output2=[], output3={
+            "pchs_amt_smtl_amt": purchased, "pchs_amt_smtl": purchased,
+            "frcr_use_psbl_amt": orderable, "frcr_evlu_tota": orderable,
+        }))
+
+    async def _balance(self, request):
+        rows = []
+        for ticker, pos in self.positions.items():
+            if pos["qty"] <= 0:
+                continue
+            now_price = self.price_of(ticker)
+            rows.append({
+                "ovrs_pdno": ticker, "ovrs_item_name": ticker,
+                "ovrs_cblc_qty": str(pos["qty"]), "ord_psbl_qty": str(pos["qty"]),
+                "pchs_avg_pric": f"{pos['avg']:.4f}", "now_pric2": f"{now_price:.4f}",
+                "evlu_pfls_rt": f"{(now_price - pos['avg']) / pos['avg'] * 100:.2f}",
+                "ovrs_excg_cd": pos["excg"],
+            })
+        return self._paged(request, rows, "output1", {"output2": {}})
+
+    async def _orders_list(self, request):
+        rows = [{
+            "pdno": o["ticker"], "odno": odno, "orgn_odno": odno,
+            "sll_buy_dvsn_cd": "02" if o["side"] == "buy" else "01",
+            "ft_ord_qty": str(o["qty"]), "nccs_qty": str(o["qty"]),
+            "ft_ord_unpr3": f"{o['price']:.4f}",
+            # 실제 응답처럼 한국 시간보다 ORDER_TIME_OFFSET 만큼 늦은 값 (main 의 주문 유효시간 계산 기준)
+            "ord_dt": (o["at"] - ORDER_TIME_OFFSET).strftime("%Y%m%d"),
+            "ord_tmd": (o["at"] - ORDER_TIME_OFFSET).strftime("%H%M%S"),
+            "ovrs_excg_cd": o["excg"],
+        } for odno, o in self.orders.items()]
+        return self._paged(request, rows, "output", {})
+
+    # ------------------------------------------------------
+    # 주문
+    # ------------------------------------------------------
+    def _new_odno(self):
+        odno = f"{self.next_odno:010d}"
+        self.next_odno += 1
+        return odno
+
+    async def _order(self, request):
+        try:
+            body = json.loads(await request.text() or "{}")
+            ticker = body["PDNO"]
+            qty = int(body["ORD_QTY"])
+            price = float(body["OVRS_ORD_UNPR"])
+        except (ValueError, KeyError):
+            return web.json_response({"rt_cd": "1", "msg_cd": "APBK0919", "msg1": "주문 입력값 오류"})
+
+        excg = body.get("OVRS_EXCG_CD", "NASD")
+        odno = self._new_odno()
+        now = datetime.now()
+        output = {"KRX_FWDG_ORD_ORGNO": "", "ODNO": odno, "ORD_TMD": now.strftime("%H%M%S")}
+
+        if request.headers.get("tr_id") in BUY_TR_IDS:
+            if qty < 1 or price * qty > self._orderable():
+                return web.json_response({"rt_cd": "1", "msg_cd": "APBK0952", "msg1": "주문가능금액을 초과 했습니다"})
+            self.orders[odno] = {"ticker": ticker, "side": "buy", "price": price, "qty": qty, "excg": excg, "at": now}
+            if self.price_of(ticker) <= price:
+                self._fill(odno, self.price_of(ticker))
+            return web.json_response(_ok("주문 전송 완료 되었습니다.", output=output))
+
+        # 매도: 보유 수량 안에서 바로 체결
+        pos = self.positions.get(ticker)
+        if pos is None or qty < 1 or qty > pos["qty"]:
+            return web.json_response({"rt_cd": "1", "msg_cd": "APBK0986", "msg1": "주문가능수량을 초과하였습니다"})
+        self.cash += price * qty
+        pos["qty"] -= qty
+        if pos["qty"] <= 0:
+            del self.positions[ticker]
+        return web.json_response(_ok("주문 전송 완료 되었습니다.", output=output))
+
+    async def _cancel(self, request):
+        # kis_api 는 취소 요청을 쿼리스트링(params)으로 보냄 -> 둘 다 받음
+        try:
+            body = json.loads(await request.text() or "{}")
+        except ValueError:
+            body = {}
+        odno = request.query.get("ORGN_ODNO") or body.get("ORGN_ODNO")
+
+        if self.orders.pop(odno, None) is None:
+            return web.json_response({"rt_cd": "1", "msg_cd": "APBK1219", "msg1": "취소 가능한 주문이 없습니다"})
+        return web.json_response(_ok("주문 전송 완료 되었습니다.",
+                                     output={"KRX_FWDG_ORD_ORGNO": "", "ODNO": self._new_odno(), "ORD_TMD": datetime.now().strftime("%H%M%S")}))
+
+    async def _stats(self, request):
+        return web.json_response(self.stats())
+
+    def stats(self):
+        return {"calls": dict(sorted(self.calls.items())), "throttled": self.throttled, "errors": self.errors,
+                "orders_open": len(self.orders), "positions": len(self.positions)}
+
+async def _main(args):
+    server = FakeKisServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                           args.rps, args.mock_rps, args.token_interval, args.page_size,
+                           args.cash, args.holdings, args.seed)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="가짜 KIS REST 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=21100)
+    parser.add_argument("--latency", type=float, default=0.0, help="응답 기본 지연 (초)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="추가 랜덤 지연 최대값 (초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 에러 응답 확률 (0~1)")
+    parser.add_argument("--rps", type=float, default=20, help="실전 TR 앱키당 초당 호출 제한 (0 이면 제한 없음)")
+    parser.add_argument("--mock-rps", type=float, default=2, help="모의 TR 앱키당 초당 호출 제한")
+    parser.add_argument("--token-interval", type=float, default=60, help="토큰 발급 최소 간격 (초)")
+    parser.add_argument("--page-size", type=int, default=20, help="목록 조회 한 페이지 건수")
+    parser.add_argument("--cash", type=float, default=10_000.0, help="시작 현금 (USD)")
+    parser.add_argument("--holdings", type=int, default=0, help="미리 넣어 둘 보유 종목 수 (연속조회 테스트)")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(_main(parser.parse_args()))
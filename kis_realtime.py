@@ -0,0 +1,241 @@
+import asyncio, json, os, time
+import aiohttp
+
+import kis_api_async as kis_async
+from kis_api import EXCD_MAPPING
+
+# ==========================================================
+# KIS 실시간 시세 (웹소켓) 구독
+# - 해외주식 실시간지연체결가(HDFSCNT0)를 보유 종목만 구독해서 틱마다 on_tick(ticker, price) 호출
+# - 종목별로 처리 중인 틱이 있으면 최신 가격만 남겨두고 끝나면 이어서 처리 (틱이 밀려 쌓이지 않음)
+# - 접속이 끊기면 접속키 재발급 후 재접속 + 구독 복구 (점점 길게 대기)
+# - 로컬 테스트는 kis_ws_fake.py 서버에 url/approval_key 를 넘겨서 사용
+# ==========================================================
+
+KIS_WS_URL_REAL = os.environ.get("KIS_WS_URL_REAL", "ws://ops.koreainvestment.com:21000")
+KIS_WS_URL = os.environ.get("KIS_WS_URL", "ws://ops.koreainvestment.com:31000")
+
+REALTIME_TR_ID = "HDFSCNT0"   # 해외주식 실시간지연체결가
+REALTIME_MAX_SUBS = 40        # 세션당 구독 가능 개수 (KIS 41건 제한)
+RECONNECT_MAX_SEC = 30        # 재접속 최대 대기 (초)
+
+# HDFSCNT0 레코드 필드 (^ 구분)
+HDFSCNT0_FIELDS = 26
+FIELD_RSYM = 0   # 실시간 종목코드 (예: DNASAAPL)
+FIELD_LAST = 11  # 현재가
+
+def tr_key(ticker, exchange):
+    """구독 키: 'D' + 거래소(NAS/NYS/AMS) + 심볼"""
+    return f"D{EXCD_MAPPING.get(exchange, exchange)}{ticker}"
+
+def subscribe_message(approval_key, key, subscribe=True):
+    return json.dumps({
+        "header": {
+            "approval_key": approval_key,
+            "custtype": "P",
+            "tr_type": "1" if subscribe else "2", # 1: 등록, 2: 해제
+            "content-type": "utf-8",
+        },
+        "body": {"input": {"tr_id": REALTIME_TR_ID, "tr_key": key}},
+    })
+
+def parse_ticks(text):
+    """
+    체결 데이터 프레임 '0|HDFSCNT0|건수|필드^필드^...' -> [(tr_key, 현재가)]
+    JSON(구독 응답/PINGPONG) 이거나 다른 TR 이면 빈 리스트.
+    """
+    if not text or text[0] not in "01":
+        return []
+
+    parts = text.split("|", 3)
+    if len(parts) < 4 or parts[1] != REALTIME_TR_ID:
+        return []
+
+    fields = parts[3].split("^")
+    count = int(parts[2]) if parts[2].isdigit() else 1
+    width = len(fields) // count if count else HDFSCNT0_FIELDS
+
+    ticks = []
+    for i in range(count):
+        record = fields[i * width:(i + 1) * width]
+        if len(record) <= FIELD_LAST:
+            continue
+        try:
+            ticks.append((record[FIELD_RSYM], float(record[FIELD_LAST])))
+        except ValueError:
+            continue
+    return ticks
+
+class RealtimeQuotes:
+    def __init__(self, on_tick, real: bool = True, url: str = None, approval_key: str = None):
+        """
+        on_tick: async (ticker, price) 콜백
+        url / approval_key: 지정하면 그대로 사용 (가짜 서버 테스트용), 아니면 실전/모의 설정 사용
+        """
+        self.on_tick = on_tick
+        self.real = real
+        self.url = url or (KIS_WS_URL_REAL if real else KIS_WS_URL)
+        self.approval_key = approval_key
+
+        self.subs = {}           # 구독해야 할 tr_key -> ticker
+        self.active = set()      # 현재 연결에서 구독 중인 tr_key
+        self.ws = None
+        self.connected = asyncio.Event()
+
+        self.last_tick = {}      # ticker -> (가격, monotonic 시각)
+        self._latest = {}        # ticker -> 아직 처리 안 한 최신 가격
+        self._workers = {}       # ticker -> 처리 태스크
+
+        # 통계
+        self.ticks = 0
+        self.coalesced = 0
+        self.reconnects = 0
+
+    # ------------------------------------------------------
+    # 구독 관리
+    # ------------------------------------------------------
+    async def set_tickers(self, tickers):
+        """구독 종목 교체 {ticker: exchange}. 연결 중이면 바뀐 것만 등록/해제."""
+        subs = {}
+        for ticker, exchange in tickers.items():
+            if len(subs) >= REALTIME_MAX_SUBS:
+                print(f"⚠️ [Realtime] 구독 한도({REALTIME_MAX_SUBS}) 초과, {ticker} 제외 (폴링으로 감시)")
+                continue
+            subs[tr_key(ticker, exchange)] = ticker
+        self.subs = subs
+
+        for ticker in list(self.last_tick):
+            if ticker not in subs.values():
+                del self.last_tick[ticker]
+
+        if self.ws is not None and not self.ws.closed:
+            await self._sync_subscriptions(self.ws)
+
+    async def _sync_subscriptions(self, ws):
+        for key in set(self.subs) - self.active:
+            await ws.send_str(subscribe_message(self.approval_key, key, True))
+            self.active.add(key)
+        for key in self.active - set(self.subs):
+            await ws.send_str(subscribe_message(self.approval_key, key, False))
+            self.active.discard(key)
+
+    def is_fresh(self, ticker, max_age_sec: float):
+        """max_age_sec 안에 틱을 받은 종목인지 (아니면 폴링으로 보완)"""
+        tick = self.last_tick.get(ticker)
+        return tick is not None and time.monotonic() - tick[1] < max_age_sec
+
+    def stats(self):
+        return {
+            "connected": self.connected.is_set(),
+            "subscribed": len(self.active),
+            "ticks": self.ticks,
+            "coalesced": self.coalesced,
+            "reconnects": self.reconnects,
+        }
+
+    # ------------------------------------------------------
+    # 틱 처리 (종목별 최신 가격만 순서대로)
+    # ------------------------------------------------------
+    def _dispatch(self, ticker, price):
+        self.ticks += 1
+        self.last_tick[ticker] = (price, time.monotonic())
+
+        if ticker in self._latest:
+            self.coalesced += 1 # 아직 처리 못 한 이전 가격은 버림
+        self._latest[ticker] = price
+
+        if ticker not in self._workers:
+            self._workers[ticker] = asyncio.create_task(self._drain(ticker))
+
+    async def _drain(self, ticker):
+        try:
+            while ticker in self._latest:
+                price = self._latest.pop(ticker)
+                try:
+                    await self.on_tick(ticker, price)
+                except Exception as e:
+                    print(f"❌ [Realtime] {ticker} 틱 처리 에러: {e}")
+        finally:
+            self._workers.pop(ticker, None)
+
+    # ------------------------------------------------------
+    # 연결 / 수신 루프
+    # ------------------------------------------------------
+    async def _handle_control(self, ws, text):
+        """JSON 메시지: PINGPONG 은 그대로 돌려주고, 구독 응답 에러는 로그"""
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            return
+
+        header = msg.get("header", {})
+        if header.get("tr_id") == "PINGPONG":
+            await ws.send_str(text)
+            return
+
+        body = msg.get("body", {})
+        if body.get("rt_cd") not in (None, "0"):
+            print(f"⚠️ [Realtime] 구독 응답 에러 {header.get('tr_key')}: {body.get('msg1')}")
+
+    async def _session(self, http):
+        if self.approval_key is None:
+            self.approval_key = await kis_async.get_approval_key(self.real)
+            if not self.approval_key:
+                raise ConnectionError("접속키 발급 실패")
+
+        async with http.ws_connect(self.url, heartbeat=None) as ws:
+            self.ws = ws
+            self.active = set()
+            await self._sync_subscriptions(ws)
+            self.connected.set()
+            print(f"📡 [Realtime] 연결됨 ({len(self.active)}종목 구독)")
+
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    if msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSE):
+                        break
+                    continue
+
+                ticks = parse_ticks(msg.data)
+                if not ticks:
+                    await self._handle_control(ws, msg.data)
+                    continue
+
+                for key, price in ticks:
+                    ticker = self.subs.get(key)
+                    if ticker:
+                        self._dispatch(ticker, price)
+
+    async def run(self):
+        """끊기면 재접속하면서 계속 수신 (취소될 때까지)"""
+        backoff = 1.0
+        fixed_key = self.approval_key is not None
+
+        async with aiohttp.ClientSession() as http:
+            try:
+                while True:
+                    started = time.monotonic()
+                    try:
+                        await self._session(http)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        print(f"❌ [Realtime] 연결 에러: {e}")
+                    finally:
+                        self.ws = None
+                        self.active = set()
+                        self.connected.clear()
+
+                    # 한동안 잘 붙어 있었으면 대기 초기화
+                    if time.monotonic() - started > RECONNECT_MAX_SEC:
+                        backoff = 1.0
+                    if not fixed_key:
+                        self.approval_key = None # 재접속 때 새 접속키
+
+                    self.reconnects += 1
+                    print(f"🔁 [Realtime] {backoff:.0f}초 후 재접속")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, RECONNECT_MAX_SEC)
+            finally:
+                for t in self._workers.values():
+                    t.cancel()
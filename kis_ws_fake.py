@@ -0,0 +1,169 @@
+import asyncio, json, random, argparse
+from datetime import datetime
+from aiohttp import web
+
+from kis_realtime import REALTIME_TR_ID, HDFSCNT0_FIELDS, FIELD_RSYM, FIELD_LAST
+
+# ==========================================================
+# 로컬 가짜 KIS 실시간 시세 웹소켓 서버 (kis_realtime 테스트용)
+# - 구독 등록/해제 응답, 주기적 PINGPONG, HDFSCNT0 형식 체결 틱 전송
+# - push(key, price) 로 원하는 가격을 직접 흘리거나, --walk 로 랜덤워크 시세 생성
+#
+# 실행 예: python kis_ws_fake.py --port 21000 --walk
+# 연결 예: RealtimeQuotes(on_tick, url="ws://127.0.0.1:21000", approval_key="fake")
+# ==========================================================
+
+def tick_frame(key, price):
+    """HDFSCNT0 체결 데이터 한 건을 실제와 같은 '0|TR|건수|필드^...' 형식으로"""
+    now = datetime.now()
+    fields = [""] * HDFSCNT0_FIELDS
+    fields[FIELD_RSYM] = key
+    fields[1] = key[4:]                     # SYMB
+    fields[3] = now.strftime("%Y%m%d")      # 현지일자
+    fields[5] = now.strftime("%H%M%S")      # 현지시간
+    fields[FIELD_LAST] = f"{price:.4f}"
+    return f"0|{REALTIME_TR_ID}|001|{'^'.join(fields)}"
+
+class FakeKisWsServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 21000, ping_interval: float = 10.0):
+        self.host = host
+        self.port = port
+        self.ping_interval = ping_interval
+
+        self.clients = {}   # ws -> 구독 중인 tr_key set
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self._ws_handler)
+        app.router.add_post("/oauth2/Approval", self._approval_handler)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+
+        # port=0 이면 OS 가 잡아준 포트로 갱신
+        self.port = self.runner.addresses[0][1]
+        print(f"🧪 [FakeWS] {self.url} 시작")
+
+    async def stop(self):
+        for ws in list(self.clients):
+            await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def subscribed(self):
+        """모든 클라이언트가 구독 중인 tr_key"""
+        keys = set()
+        for subs in self.clients.values():
+            keys |= subs
+        return keys
+
+    async def push(self, key, price):
+        """key(예: DNASAAPL)를 구독한 클라이언트에 체결 틱 전송 -> 받은 클라이언트 수"""
+        frame = tick_frame(key, price)
+        sent = 0
+        for ws, subs in list(self.clients.items()):
+            if key in subs and not ws.closed:
+                await ws.send_str(frame)
+                sent += 1
+        return sent
+
+    async def drop_clients(self):
+        """연결 강제 종료 (재접속/구독 복구 확인용)"""
+        for ws in list(self.clients):
+            await ws.close()
+
+    async def _approval_handler(self, request):
+        return web.json_response({"approval_key": "fake-approval-key"})
+
+    async def _ws_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients[ws] = set()
+
+        ping_task = asyncio.create_task(self._ping_loop(ws))
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                await self._handle_message(ws, msg.data)
+        finally:
+            ping_task.cancel()
+            self.clients.pop(ws, None)
+        return ws
+
+    async def _handle_message(self, ws, text):
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            return
+
+        header = msg.get("header", {})
+        if header.get("tr_id") == "PINGPONG":
+            return # 클라이언트가 돌려준 PINGPONG
+
+        tr = msg.get("body", {}).get("input", {})
+        key = tr.get("tr_key")
+        if tr.get("tr_id") != REALTIME_TR_ID or not key:
+            await ws.send_str(json.dumps({
+                "header": {"tr_id": tr.get("tr_id"), "tr_key": key, "encrypt": "N"},
+                "body": {"rt_cd": "1", "msg_cd": "OPSP8996", "msg1": "invalid tr_id"},
+            }))
+            return
+
+        if header.get("tr_type") == "2":
+            self.clients[ws].discard(key)
+            msg1 = "UNSUBSCRIBE SUCCESS"
+        else:
+            self.clients[ws].add(key)
+            msg1 = "SUBSCRIBE SUCCESS"
+
+        await ws.send_str(json.dumps({
+            "header": {"tr_id": REALTIME_TR_ID, "tr_key": key, "encrypt": "N"},
+            "body": {"rt_cd": "0", "msg_cd": "OPSP0000", "msg1": msg1},
+        }))
+
+    async def _ping_loop(self, ws):
+        while not ws.closed:
+            await asyncio.sleep(self.ping_interval)
+            await ws.send_str(json.dumps({
+                "header": {"tr_id": "PINGPONG", "datetime": datetime.now().strftime("%Y%m%d%H%M%S")}
+            }))
+
+    async def random_walk(self, interval: float = 0.2, start_price: float = 10.0, vol_pct: float = 1.0):
+        """구독된 종목마다 interval 초마다 랜덤워크 가격 전송 (취소될 때까지)"""
+        prices = {}
+        while True:
+            for key in self.subscribed():
+                price = prices.get(key, start_price)
+                price = max(0.01, price * (1 + random.gauss(0, vol_pct / 100)))
+                prices[key] = price
+                await self.push(key, price)
+            await asyncio.sleep(interval)
+
+async def _main(args):
+    server = FakeKisWsServer(args.host, args.port, args.ping_interval)
+    await server.start()
+    try:
+        if args.walk:
+            await server.random_walk(args.interval)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="가짜 KIS 실시간 시세 웹소켓 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=21000)
+    parser.add_argument("--ping-interval", type=float, default=10.0)
+    parser.add_argument("--walk", action="store_true", help="구독 종목 랜덤워크 시세 전송")
+    parser.add_argument("--interval", type=float, default=0.2, help="랜덤워크 틱 간격 (초)")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,19 +1,31 @@
 import asyncio
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 import yfinance as yf
 import pandas as pd
 import math
 from datetime import datetime, timedelta
 import warnings
-import os, json, tempfile
+import os, json, time
 
 
 # 모듈 임포트
-from toss_crawler import scrape_toss_data
-from utils import ichimoku, span_b_signal
+from toss_crawler import scrape_toss_data, get_ranking_snapshot
+from utils import ichimoku, span_b_signal, IchimokuStream
+from candle_store import CandleStore
+from candle_archive import CandleArchive
+from signal_scanner import scan_universe
 from kis_api import *
+import kis_api_async as kis_async
+from kis_realtime import RealtimeQuotes
+from state_store import StateJournal, StateReader
+from trade_store import TradeStore
+from strategy import (
+    MAX_SLOTS, TRAILING_DD, LOSS_RATIO,
+    SIGNAL_N, SIGNAL_K, ORDER_LIFETIME_LIMIT,
+    exit_signal, ladder_steps, is_trading_time, is_close_out_time,
+)
 
 warnings.filterwarnings("ignore")
 app = FastAPI()
@@ -27,126 +39,158 @@ STATE_LOCK = asyncio.Lock()
 CRAWL_INTERVAL_SEC = 120  # [정찰병] 크롤링 주기 (3분) -> 밴 방지!
 TRADE_INTERVAL_SEC = 5   # [스나이퍼] 매매 주기 (15초) -> 급등주 대응!
 
-MAX_SLOTS = 5
 BUY_PERCENT = 19
 
 GLOBAL_TARGET_TICKERS = []
 
-# 손익비 및 트레일링 단계 비율
-REMAINING_RATIO = {0: 1.0, 1: 0.70, 2: 0.50, 3: 0.30, 4: 0.15, 5: 0.0}
-PROFIT_STEPS = [
-    # (target_stage, trigger_profit_pct, sell_ratio_on_init_qty)
-    (1, 30.0, 0.30),
-    (2, 60.0, 0.20),
-    (3, 100.0, 0.20),
-    (4, 150.0, 0.15),
-    (5, 200.0, 0.15),
-]
-
-# stage별 트레일링 드로다운(최고수익률 대비 몇 % 하락하면 전량 정리)
-TRAILING_DD = {
-    1: 12.0,  # stage1: 최고수익률에서 12%p 빠지면
-    2: 15.0,
-    3: 18.0,
-    4: 22.0,
-    5: 28.0,
-}
-
-SMALL_INIT_QTY_THRESHOLD = 25   # 초기수량(추정)이 이 이하면 "소량"으로 간주
-MIN_REMAIN_SHARES = 1           # stage 1~4에서는 최소 1주 남기기(전량 방지)
-
-LOSS_RATIO = 10  # %
-
-SIGNAL_N = 7 # Flat 유지 기간
-SIGNAL_K = 2 # 오차 범위 (%)
-ORDER_LIFETIME_LIMIT = 2 * 60 * 60 # 2시간
+# 전략 파라미터(손절/익절 단계/트레일링/시그널)는 strategy.py (백테스트와 공유)
+SCAN_CONCURRENCY = 8 # 캔들 동시 조회 개수 (KIS 초당 호출 제한 고려)
 
 
 ACC_STOCK = {}       # 매도 감시용 (보유주식)
 PENDING_ORDERS = {}  # 슬롯 점유용 (미체결)
+INDICATORS = {}      # 종목별 증분 일목균형표 (IchimokuStream)
+CANDLE_STORE = CandleStore(forming_ttl=2 * TRADE_INTERVAL_SEC)  # (종목, 거래소, 간격)별 캔들 캐시 (새 봉만 추가 조회, 진행 중 봉은 한 루프 건너 갱신)
+CANDLE_ARCHIVE = CandleArchive()  # 받은 봉 전부 디스크에 보관 (백테스트/리플레이용)
+ACCOUNT_SNAPSHOT = None  # 이번 루프의 잔고/보유/미체결 스냅샷 (주문 시 무효화)
+ACCOUNT_LOCK = asyncio.Lock()
+SELL_LOCKS = {}      # 종목별 매도 처리 가드 (같은 종목 틱 동시 처리 방지)
+REALTIME_QUOTES = None  # 실시간 시세 구독 (realtime_quote_loop 실행 중일 때만)
+
+REALTIME_SYNC_SEC = 1    # 실시간 구독 목록을 보유 종목과 맞추는 주기 (초)
+REALTIME_STALE_SEC = 15  # 이 시간 동안 틱이 없으면 폴링으로 현재가 조회
+REALTIME_RETRY_SEC = 5   # 실시간 시세 감시가 에러로 멈추면 이만큼 쉬고 다시 시작 (초)
+
+# 시계 (replay.py 가 시뮬레이션 시계로 교체: 벽시계 대기 없이 최대 속도로 재생)
+_now = datetime.now
+_sleep = asyncio.sleep
 
 BOT_STATE_PATH = os.environ.get("BOT_STATE_PATH", "./bot_state.json")
+STATE_JOURNAL = StateJournal(BOT_STATE_PATH)  # 봇: 바뀐 것만 저널에 추가, 주기적으로 스냅샷 합치기
+STATE_READER = StateReader(BOT_STATE_PATH)    # 대시보드: 스냅샷 + 저널 읽기 (안 바뀌면 재파싱 안 함)
+TRADE_STORE = TradeStore()  # 주문/체결/매도/손익 기록 (SQLite, 백그라운드 일괄 저장)
 
-def calc_sell_qty(estimated_init_qty: float, sell_ratio: float, cur_qty: int, target_stage: int) -> int:
+BROKER_HOLDINGS = {}  # 마지막 동기화 때 증권사 잔고 (종목 -> {"qty", "avg_pric"}) - 체결/실현손익은 이 값과의 차이로 기록
+SELL_ORDERS = {}      # 체결 대기 중인 매도 주문 (종목 -> 보낸 순서대로 [{"kind", "price", "qty", "stage", "at"}, ...])
+
+def record_sell(kind, ticker, info, price, qty, stage=None):
     """
-    소량 포지션에서 ceil로 인한 과매도 왜곡을 완화하고,
-    마지막 stage(5) 이전에는 최소 1주 남기도록 보호.
+    매도 주문 접수 기록 (실제로 보낸 주문가) + 계좌 스냅샷 무효화.
+    체결/실현손익은 여기서 안 씀 -> 동기화 때 잔고가 줄어든 만큼 기록 (record_holding_changes)
     """
-    desired = estimated_init_qty * sell_ratio
-
-    # 1) 소량 포지션은 round 기반(왜곡 완화)
-    if estimated_init_qty <= SMALL_INIT_QTY_THRESHOLD:
-        sell_qty = int(round(desired))
-        # 원하는 게 0.x로 나와도 비중 익절 의도가 있으면 1주는 팔게
-        if sell_qty <= 0 and desired > 0:
-            sell_qty = 1
-    else:
-        # 2) 일반 포지션은 기존대로 ceil(원금기준 비율 매도 유지)
-        sell_qty = math.ceil(desired)
-
-    # 3) 마지막 졸업(stage=5) 전에는 전량 방지(최소 1주 남기기)
-    if target_stage < 5 and cur_qty > MIN_REMAIN_SHARES:
-        max_sell = cur_qty - MIN_REMAIN_SHARES
-        if sell_qty > max_sell:
-            sell_qty = max_sell
-
-    # 4) 방어
-    if sell_qty > cur_qty:
-        sell_qty = cur_qty
-    if sell_qty < 0:
-        sell_qty = 0
-
-    return sell_qty
-
-def save_bot_state():
+    invalidate_account_snapshot()
+    order_price = sell_order_price(price)
+    stage = info.get("stage", 0) if stage is None else stage
+    TRADE_STORE.record(ticker, "order", "sell", price=order_price, qty=qty, stage=stage,
+                       avg_price=info["avg_pric"], note=kind)
+
+    SELL_ORDERS.setdefault(ticker, []).append(
+        {"kind": kind, "price": order_price, "qty": qty, "stage": stage, "at": _now()})
+
+def _holding_qty(stock):
+    """잔고 수량 (매도 주문 걸린 수량 포함, 없으면 주문가능수량)"""
+    return int(stock.get('ovrs_cblc_qty') or stock['ord_psbl_qty'])
+
+def broker_holdings(holdings):
+    """보유 조회 결과 -> {종목: {"qty", "avg_pric"}} (수량 0 제외)"""
+    current = {}
+    for stock in holdings or []:
+        qty = _holding_qty(stock)
+        if qty > 0:
+            current[stock['ovrs_pdno']] = {"qty": qty, "avg_pric": float(stock['pchs_avg_pric'])}
+    return current
+
+def _record_sell_fill(ticker, qty, avg_price):
     """
-    봇 상태(보유/미체결)를 JSON 파일로 저장.
-    os.replace를 써서 원자적(atomic)으로 교체 -> 읽는 쪽에서 깨진 파일 볼 확률 줄임.
+    잔고 감소분 = 매도 체결. 그 종목에 보낸 매도 주문을 먼저 보낸 것부터(FIFO) 채워서 주문마다 한 줄씩 기록
+    (가격/stage/사유는 그 주문 것, 손익은 직전 평단 기준). 주문보다 더 줄어든 수량은 봇 밖 매도 (가격 모름).
     """
-    state = {
-        "updated_at": datetime.now().isoformat(timespec="seconds"),
-        "acc_stock": ACC_STOCK,
-        "pending_orders": PENDING_ORDERS,
-    }
+    orders = SELL_ORDERS.get(ticker, [])
+    while qty > 0:
+        order = orders[0] if orders else None
+        filled = min(qty, order["qty"]) if order else qty
+        price = order["price"] if order else None
+        print(f"💵 [매도 체결] {ticker} {filled}주" + (f" @ {price}" if price else ""))
+        TRADE_STORE.record(
+            ticker, "fill", "sell",
+            price=price, qty=filled,
+            stage=order["stage"] if order else None,
+            avg_price=avg_price,
+            pnl=round((price - avg_price) * filled, 4) if price else None,
+            pnl_pct=round((price - avg_price) / avg_price * 100, 2) if price and avg_price else None,
+            note=order["kind"] if order else "봇 밖 매도",
+        )
+        qty -= filled
+        if order:
+            order["qty"] -= filled
+            if order["qty"] <= 0:
+                orders.pop(0)
+
+    if ticker in SELL_ORDERS and not orders:
+        del SELL_ORDERS[ticker]
+
+def record_holding_changes(holdings):
+    """
+    직전 동기화 잔고와 비교해서 체결 기록.
+    늘어난 수량 -> 매수 체결 (가격은 평단 변화로 역산), 줄어든 수량 -> 매도 체결 + 실현손익.
+    """
+    global BROKER_HOLDINGS
 
-    dirpath = os.path.dirname(BOT_STATE_PATH) or "."
-    os.makedirs(dirpath, exist_ok=True)
+    current = broker_holdings(holdings)
+    for ticker in list(BROKER_HOLDINGS) + [t for t in current if t not in BROKER_HOLDINGS]:
+        old = BROKER_HOLDINGS.get(ticker, {"qty": 0, "avg_pric": 0.0})
+        new = current.get(ticker, {"qty": 0, "avg_pric": old["avg_pric"]})
+        delta = new["qty"] - old["qty"]
 
-    fd, tmp_path = tempfile.mkstemp(prefix="bot_state_", suffix=".json", dir=dirpath)
-    try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, BOT_STATE_PATH)  # atomic replace
-    except Exception:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
-        raise
+        if delta > 0:
+            price = (new["avg_pric"] * new["qty"] - old["avg_pric"] * old["qty"]) / delta
+            print(f"🎉 [체결 확인] {ticker} {delta}주가 잔고로 들어왔습니다!")
+            TRADE_STORE.record(ticker, "fill", "buy", price=round(price, 4), qty=delta,
+                               stage=0 if old["qty"] == 0 else None, avg_price=new["avg_pric"])
+        elif delta < 0:
+            _record_sell_fill(ticker, -delta, old["avg_pric"])
 
-def fetch_account_snapshot(real:bool=False):
+        if ticker not in current:
+            SELL_ORDERS.pop(ticker, None)
+
+    BROKER_HOLDINGS = current
+
+def save_bot_state():
     """
-    API에서 실시간 잔고와 미체결 내역을 가져와서
-    ACC_STOCK(보유)과 PENDING_ORDERS(미체결)를 최신 상태로 동기화함.
-    *중요: 기존 보유 종목의 stage, max_profit 정보는 유지해야 함!
+    봇 상태(보유/미체결) 저장.
+    전체 파일을 다시 쓰지 않고 지난 저장 이후 바뀐 내용만 저널에 추가 (바뀐 게 없으면 안 씀).
+    스냅샷(bot_state.json) 합치기는 저널이 길어지면 StateJournal 이 알아서 함.
     """
-    global ACC_STOCK, PENDING_ORDERS
+    return STATE_JOURNAL.record(ACC_STOCK, PENDING_ORDERS)
 
-    real_holdings = get_stock_quantity(real)
-    real_unfilled = get_unfilled_quantity(real)
+def invalidate_account_snapshot():
+    """주문/취소를 넣으면 잔고가 바뀌므로 다음 조회 때 새로 받게 함"""
+    global ACCOUNT_SNAPSHOT
+    ACCOUNT_SNAPSHOT = None
 
-    return real_holdings, real_unfilled
+async def fetch_account_snapshot(real:bool=False):
+    """
+    잔고 / 보유 / 미체결 스냅샷 (세 TR 동시 조회, 연속조회 포함).
+    루프 한 바퀴 동안 캐시해서 같이 쓰고, 주문이 들어가면 invalidate_account_snapshot 으로 버림.
+    """
+    global ACCOUNT_SNAPSHOT
+
+    async with ACCOUNT_LOCK:
+        if ACCOUNT_SNAPSHOT is None:
+            ACCOUNT_SNAPSHOT = await kis_async.get_account_snapshot(real)
+        return ACCOUNT_SNAPSHOT
   
 async def sync_account_data_safe(real:bool=False):
     """
-    이벤트 루프에서 실행: 스레드에서 가져온 스냅샷을 락 걸고 전역 상태에 반영
+    이벤트 루프에서 실행: 비동기로 가져온 스냅샷을 락 걸고 전역 상태에 반영
     stage/max_profit 보존
     """
     global ACC_STOCK, PENDING_ORDERS
 
     print("🔄 [Sync] 계좌 동기화 진행 중...")
 
-    real_holdings, real_unfilled = await asyncio.to_thread(fetch_account_snapshot, real=real)
+    snapshot = await fetch_account_snapshot(real=real)
+    real_holdings, real_unfilled = snapshot["holdings"], snapshot["unfilled"]
 
     # ---- 미체결 동기화 ----
     NEW_PENDING = {}
@@ -159,6 +203,18 @@ async def sync_account_data_safe(real:bool=False):
                 "order_no": order['orgn_odno']
             }
 
+    # ---- 체결 기록 (직전 잔고 대비 증감) ----
+    # 조회 실패(0)일 때는 비교하지 않음 (전부 매도된 걸로 기록되지 않게)
+    if isinstance(real_holdings, list):
+        record_holding_changes(real_holdings)
+
+    # 오래 체결 안 된 매도 주문은 더 기다리지 않음 (남은 잔고는 다시 보유 종목으로 관리)
+    now = _now()
+    for ticker, orders in list(SELL_ORDERS.items()):
+        orders[:] = [o for o in orders if now - o["at"] <= timedelta(seconds=ORDER_LIFETIME_LIMIT)]
+        if not orders:
+            del SELL_ORDERS[ticker]
+
     # ---- 보유 동기화(stage/max_profit 보존) ----
     real_ticker_list = []
     NEW_ACC = dict(ACC_STOCK)  # 복사 후 갱신
@@ -178,8 +234,10 @@ async def sync_account_data_safe(real:bool=False):
                 # 진행상황 보존하면서 수량/평단만 갱신
                 NEW_ACC[ticker]["qty"] = qty
                 NEW_ACC[ticker]["avg_pric"] = avg_price
+            elif ticker in SELL_ORDERS:
+                # 전량 매도 주문을 냈는데 아직 체결 전 -> 새 보유로 다시 잡지 않음 (중복 매도 방지)
+                continue
             else:
-                print(f"🎉 [체결 확인] {ticker} {qty}주가 잔고로 들어왔습니다!")
                 NEW_ACC[ticker] = {
                     "avg_pric": avg_price,
                     "qty": qty,
@@ -200,19 +258,304 @@ async def sync_account_data_safe(real:bool=False):
         ACC_STOCK = NEW_ACC
 
 
+async def evaluate_buy_signal(item, sem, real:bool=False):
+    """
+    한 종목의 5분봉 조회 + 일목 시그널 판단.
+    캔들 조회만 세마포어로 동시 개수 제한.
+    return: (signal, price)
+    """
+    ticker = item['ticker']
+    kis_exchange = map_exchange_code(item.get('exchange', 'NSQ'))
+
+    try:
+        async def fetch(rows, since):
+            df = await kis_async.get_5m_candles(ticker, kis_exchange, real, nrec=rows)
+            CANDLE_ARCHIVE.append(ticker, df, source="kis")
+            return df
+
+        async with sem:
+            # df = yf.download(ticker, interval="5m", period="5d", prepost=True, progress=False, multi_level_index=False)
+            # 캐시된 봉 이후 구간만 조회 (최대 120봉)
+            df = await CANDLE_STORE.aget_or_fetch((ticker, kis_exchange, "5m"), fetch, timedelta(minutes=5), 120)
+        if len(df) < 60: return False, None
+
+        # 분석: 새로 생긴 봉/갱신된 마지막 봉만 증분 반영 (배열 그대로 사용, JSON 변환 없음)
+        stream = INDICATORS.setdefault(ticker, IchimokuStream())
+        stream.ingest_df(df)
+        chart_data = stream.arrays()
+        if not chart_data: return False, None
+
+        # 시그널 확인
+        return span_b_signal(chart_data, n=SIGNAL_N, k=SIGNAL_K)
+    except Exception as e:
+        return False, None # 개별 종목 에러 무시
+
+async def place_buy_order(item, price, real:bool=False):
+    """시그널 발생 종목 지정가 매수 (자산 대비 수량 계산 포함)"""
+    ticker = item['ticker']
+    toss_exchange = item.get('exchange', 'NSQ')
+    kis_exchange = map_exchange_code(toss_exchange)
+
+    order_price = round(price, 2)
+    
+    # ==================================================
+    # [핵심] 자산 대비 수량 계산 로직
+    # ==================================================
+    # 1. 내 계좌 총 자산 조회 (주식평가금 + 현금) -> 이번 루프 스냅샷 재사용 (주문 후엔 새로 조회)
+    snapshot = await fetch_account_snapshot(real)
+    total_asset, orderable_cash = snapshot["total_asset"], snapshot["orderable_cash"]
+
+    # total_asset = total_asset / 1500 # 환율 적용
+    orderable_cash = orderable_cash / 1500 # 환율 적용
+
+    async with STATE_LOCK:
+        used_slots = len(ACC_STOCK) + len(PENDING_ORDERS)
+
+    if orderable_cash <= 0:
+        print(f"⚠️ [Skip] 자산 조회 오류 또는 잔고 0 (Asset: {total_asset})")
+        return
+
+    remain_slot = MAX_SLOTS - used_slots
+
+    target_amount = (orderable_cash / remain_slot) * 0.98
+    
+    # 3. 매수 가능 수량 계산 (목표금액 / 주당가격) -> 소수점 버림
+    qty = math.floor(target_amount / order_price)
+    
+    # 4. 예외 처리
+    if qty < 1:
+        # 1주도 못 사는 경우 (돈이 없거나 주식이 너무 비쌈)
+        # print(f"   [Skip] {ticker} 자산 부족 (필요: ${order_price}, 할당: ${target_amount:.2f})")
+        return
+        
+    # (선택) 현금 부족 시 주문 가능한 만큼만 사기 (Safety)
+    max_qty_by_cash = math.floor(orderable_cash / order_price)
+    if qty > max_qty_by_cash:
+        qty = max_qty_by_cash # 현금 있는 만큼만 조정
+        if qty < 1: return
+
+    print(f"⚡ [SIGNAL] {ticker} ({toss_exchange}) 매수! ${order_price} x {qty}주 (비중 {BUY_PERCENT}%)")
+    
+    # 5. 주문 전송
+    
+    success, odno = await kis_async.send_buy_order(ticker, order_price, qty, kis_exchange, real)
+    
+    if success:
+        invalidate_account_snapshot()
+        PENDING_ORDERS[ticker] = {
+            "order_price": order_price,
+            "qty": qty,
+            "order_no": odno}
+        TRADE_STORE.record(ticker, "order", "buy", price=order_price, qty=qty, order_no=odno)
+
+async def scan_and_buy(targets, real:bool=False):
+    """
+    타겟 종목들의 캔들을 최대 SCAN_CONCURRENCY 개씩 동시에 조회하고, 도착하는 대로 시그널 판단.
+    주문은 랭킹 순서를 지켜서 넣음: 앞 순위 종목 결과가 모두 나온 구간까지만 차례로 처리.
+    슬롯(MAX_SLOTS)이 다 차면 남은 조회는 취소.
+    """
+    candidates = [item for item in targets
+                  if item['ticker'] not in ACC_STOCK and item['ticker'] not in PENDING_ORDERS]
+
+    # 타겟에서 빠진 종목의 지표 상태 정리
+    target_tickers = {item['ticker'] for item in targets}
+    for ticker in list(INDICATORS.keys()):
+        if ticker not in target_tickers:
+            del INDICATORS[ticker]
+
+    if not candidates or (len(ACC_STOCK) + len(PENDING_ORDERS)) >= MAX_SLOTS:
+        return
+
+    sem = asyncio.Semaphore(SCAN_CONCURRENCY)
+
+    async def run(idx, item):
+        return idx, await evaluate_buy_signal(item, sem, real)
+
+    tasks = [asyncio.create_task(run(idx, item)) for idx, item in enumerate(candidates)]
+    results = [None] * len(candidates)
+    next_idx = 0
+
+    try:
+        for fut in asyncio.as_completed(tasks):
+            idx, result = await fut
+            results[idx] = result
+
+            # 랭킹 순서대로 결과가 준비된 종목까지 주문 처리
+            while next_idx < len(candidates) and results[next_idx] is not None:
+                item = candidates[next_idx]
+                signal, price = results[next_idx]
+                next_idx += 1
+
+                if (len(ACC_STOCK) + len(PENDING_ORDERS)) >= MAX_SLOTS:
+                    return
+
+                if item['ticker'] in ACC_STOCK or item['ticker'] in PENDING_ORDERS:
+                    continue
+
+                if signal:
+                    try:
+                        await place_buy_order(item, price, real)
+                    except Exception as e:
+                        continue # 개별 종목 에러 무시
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def apply_sell_rules(ticker, curr_price, real:bool=False):
+    """
+    보유 종목 한 개에 현재가 한 번 반영: 손절 / 본절 스탑 / 트레일링 스탑 / 분할익절
+    """
+    info = ACC_STOCK.get(ticker)
+    if info is None:
+        return
+
+    avg_price = info["avg_pric"]
+    qty = info["qty"]
+    excg = info["excg"]
+    stage = info.get("stage", 0)
+
+    if "max_profit" not in info:
+        info["max_profit"] = -999.0
+
+    profit_pct = ((curr_price - avg_price) / avg_price) * 100
+
+    # 최고 수익률 갱신 (트레일링 스탑용)
+    if profit_pct > info["max_profit"]:
+        info["max_profit"] = profit_pct
+
+    max_p = info["max_profit"] # 현재까지의 최고 수익률
+
+    # -------------------------------------------------------
+    # 1. 전량 정리 (손절 / 본절 스탑 / 트레일링 스탑) - 판단은 strategy.exit_signal
+    # -------------------------------------------------------
+    kind = exit_signal(profit_pct, max_p, stage)
+    if kind == "stop_loss":
+        print(f"❌ [손절] {ticker} -{LOSS_RATIO}% 도달.. 전량 매도")
+    elif kind == "breakeven":
+        print(f"🛡️ [본절 스탑] {ticker} +15% 찍고 하락..")
+    elif kind == "trailing":
+        print(f"📉 [트레일링 스탑] {ticker} stage={stage} max={max_p:.2f}% -> now={profit_pct:.2f}% (DD {TRAILING_DD.get(stage)}%) 전량 매도")
+
+    if kind:
+        if await kis_async.send_sell_order(ticker, curr_price, qty, excg, real):
+            record_sell(kind, ticker, info, curr_price, qty)
+            ACC_STOCK.pop(ticker, None)
+        return
+
+    # -------------------------------------------------------
+    # 2. 분할익절 - 계획은 strategy.ladder_steps, 주문이 실패하면 거기서 멈춤
+    # -------------------------------------------------------
+    cur_qty = qty
+    cur_stage = stage
+
+    for target_stage, trigger_profit, sell_qty in ladder_steps(qty, stage, profit_pct):
+        if sell_qty <= 0:
+            # 방어
+            cur_stage = target_stage
+            info["stage"] = cur_stage
+            TRADE_STORE.record(ticker, "stage", stage=cur_stage, note=f"profit={profit_pct:.2f}% (매도 수량 0)")
+            continue
+
+        print(f"💰 [분할익절] {ticker} stage {cur_stage}->{target_stage} "
+            f"profit={profit_pct:.2f}% trigger={trigger_profit}% sell={sell_qty}/{cur_qty}")
+
+        if await kis_async.send_sell_order(ticker, curr_price, sell_qty, excg, real):
+            record_sell("take_profit", ticker, info, curr_price, sell_qty, stage=target_stage)
+            # 주문 성공 반영
+            cur_qty -= sell_qty
+            info["qty"] = cur_qty
+            cur_stage = target_stage
+            info["stage"] = cur_stage
+
+            if cur_qty <= 0:
+                ACC_STOCK.pop(ticker, None)
+                print(f"👋 {ticker} 졸업 완료.")
+                break
+        else:
+            # 주문 실패면 더 진행하지 않음
+            print(f"⚠️ [익절 실패] {ticker} 매도 주문 실패, 다음 틱에서 재시도")
+            break
+
+async def handle_price_tick(ticker, curr_price, real:bool=False):
+    """
+    가격 틱 한 번 처리 (실시간 웹소켓/폴링 공용).
+    종목별 가드: 이전 틱의 매도 주문이 아직 처리 중이면 이번 틱은 건너뜀 (중복 매도 방지).
+    """
+    lock = SELL_LOCKS.setdefault(ticker, asyncio.Lock())
+    if lock.locked():
+        return
+
+    async with lock:
+        await apply_sell_rules(ticker, curr_price, real)
+
+    if ticker not in ACC_STOCK:
+        SELL_LOCKS.pop(ticker, None)
+
+async def realtime_quote_loop(real:bool=True):
+    """
+    보유 종목 실시간 체결가 구독 -> 틱마다 handle_price_tick.
+    구독 목록은 REALTIME_SYNC_SEC 마다 ACC_STOCK 기준으로 맞춤 (장 시간 외에는 전부 해제).
+    보조 기능이라 에러는 밖으로 안 올림: 로그 찍고 REALTIME_RETRY_SEC 후 다시 접속
+    (그동안 매매 루프는 REST 현재가로 판단).
+    """
+    print("📡 [Realtime] 실시간 시세 감시 시작")
+
+    while True:
+        try:
+            await _watch_realtime_quotes(real)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ [Realtime] 실시간 시세 에러: {e} ({REALTIME_RETRY_SEC}초 후 다시 시작)")
+        await _sleep(REALTIME_RETRY_SEC)
+
+async def _watch_realtime_quotes(real):
+    global REALTIME_QUOTES
+
+    async def on_tick(ticker, price):
+        await handle_price_tick(ticker, price, real)
+
+    quotes = RealtimeQuotes(on_tick, real=real)
+    REALTIME_QUOTES = quotes
+    run_task = asyncio.create_task(quotes.run())
+
+    try:
+        while True:
+            if run_task.done():
+                run_task.result() # 수신 루프가 죽었으면 예외를 올려서 새로 접속
+
+            if is_trading_time(_now().time()):
+                tickers = {ticker: info["excg"] for ticker, info in list(ACC_STOCK.items())}
+            else:
+                tickers = {}
+            await quotes.set_tickers(tickers)
+
+            await _sleep(REALTIME_SYNC_SEC)
+    finally:
+        REALTIME_QUOTES = None
+        run_task.cancel()
+        await asyncio.gather(run_task, return_exceptions=True)
+
 async def crawler_loop():
     print(f"🐢 [Crawler] 정찰병 시작 (주기: {CRAWL_INTERVAL_SEC}초)")
     global GLOBAL_TARGET_TICKERS
     
+    last_updated_ts = None
+
     while True:
         try:
             print("🔍 [Crawler] 토스 랭킹 갱신 중...")
-            new_data = await asyncio.to_thread(scrape_toss_data)
+            # 크롤링 결과는 스냅샷 파일로 공유 (대시보드 /api/scrape 가 그대로 사용)
+            # 대시보드가 방금 갱신했으면 크롤링 없이 그 스냅샷을 씀
+            snapshot = await asyncio.to_thread(get_ranking_snapshot, CRAWL_INTERVAL_SEC / 2)
+            new_data = snapshot.get("data")
             
-            if new_data:
+            if new_data and snapshot.get("updated_ts") != last_updated_ts:
                 async with STATE_LOCK:
                     GLOBAL_TARGET_TICKERS = new_data
-                print(f"✅ [Crawler] 타겟 리스트 갱신 완료 ({len(new_data)}개)")
+                last_updated_ts = snapshot.get("updated_ts")
+                print(f"✅ [Crawler] 타겟 리스트 갱신 완료 ({len(new_data)}개, {snapshot.get('updated_at')})")
             else:
                 print("⚠️ [Crawler] 데이터 없음 (기존 리스트 유지)")
                 
@@ -226,7 +569,7 @@ async def trading_bot_loop(real:bool=False):
     print("🚀 [System] 자동매매 봇이 백그라운드에서 시작되었습니다.")
 
     # ACC_STOCK 초기화
-    global ACC_STOCK, PENDING_ORDERS
+    global ACC_STOCK, PENDING_ORDERS, BROKER_HOLDINGS
 
     async with STATE_LOCK:
         ACC_STOCK = {}
@@ -234,7 +577,17 @@ async def trading_bot_loop(real:bool=False):
 
     # get_kis_token(real)
 
-    holdings = get_stock_quantity(real)
+    # 지난 실행의 진행상황(stage/max_profit) 복원용 (스냅샷 + 저널 재생)
+    saved_acc, _ = STATE_JOURNAL.load()
+
+    # 보유 + 미체결 한 번에 조회
+    invalidate_account_snapshot()
+    snapshot = await fetch_account_snapshot(real)
+
+    holdings = snapshot["holdings"]
+    # 지금 잔고를 체결 비교 기준으로 (재시작 때 기존 보유를 새 체결로 기록하지 않게)
+    BROKER_HOLDINGS = broker_holdings(holdings) if isinstance(holdings, list) else {}
+    SELL_ORDERS.clear()
     if holdings:
         async with STATE_LOCK:
             for stock in holdings:
@@ -246,16 +599,19 @@ async def trading_bot_loop(real:bool=False):
                 avg_price = float(stock['pchs_avg_pric'])
                 excg_code = stock['ovrs_excg_cd']
 
+                saved = saved_acc.get(ticker, {})
                 ACC_STOCK[ticker] = {
                     "avg_pric": avg_price,
                     "qty": qty,
                     "excg": excg_code,
-                    "stage": 0,
-                    "max_profit": -999.0
+                    "stage": saved.get("stage", 0),
+                    "max_profit": saved.get("max_profit", -999.0)
                 }
+                if saved:
+                    print(f"♻️ [복원] {ticker} stage={ACC_STOCK[ticker]['stage']} max={ACC_STOCK[ticker]['max_profit']:.2f}%")
     
     # 지정가 구매 주문 내역 불러오기
-    unfilled_orders = get_unfilled_quantity(real)
+    unfilled_orders = snapshot["unfilled"]
     if unfilled_orders:
         async with STATE_LOCK:
             for order in unfilled_orders:
@@ -273,24 +629,22 @@ async def trading_bot_loop(real:bool=False):
 
     while True:
         # 시간대가 오후 6시~오후9시59분, 오후11시~익일오전2시 일때만 동작            
-        now = datetime.now().time()
+        now = _now().time()
         # print(f"[현재시각_디버깅용] {now}")
         # print(f"[시작시각_디버깅용] {datetime.strptime('18:00:00', '%H:%M:%S').time()}")
-        if not (
-            (now >= datetime.strptime("18:00:00", "%H:%M:%S").time() and now <= datetime.strptime("23:59:59", "%H:%M:%S").time()) or
-            (now >= datetime.strptime("00:00:00", "%H:%M:%S").time() and now <= datetime.strptime("05:00:00", "%H:%M:%S").time())
-            ):
+        if not is_trading_time(now):
             print("😴 [Bot] 미국 주식 시장 운영 시간 외에는 대기합니다.")
 
             # 만약 주식을 가지고 있거나, 미체결 내역이 있으면 팔기 및 취소하기            
-            if (ACC_STOCK or PENDING_ORDERS) and (now >= datetime.strptime("05:00:01", "%H:%M:%S").time() and now <= datetime.strptime("06:00:00", "%H:%M:%S").time()) :
+            if (ACC_STOCK or PENDING_ORDERS) and is_close_out_time(now) :
                 print("⚠️ [Bot] 시장 운영 시간 외, 보유 종목 및 미체결 주문 정리 시도...")
                 
                 # 보유 종목 매도
+                # 현재가 일괄 조회 (실전 투자만 가능하므로 모의투자 시에는 임의 가격으로 매도 시도)
+                quotes = await kis_async.get_current_prices({t: i['excg'] for t, i in ACC_STOCK.items()}, real)
                 for ticker, info in list(ACC_STOCK.items()):
                     print(f"💰 [정리] {ticker} 보유 수량 {info['qty']}주 매도 시도...")
-                    # 현재가 조회 (실전 투자만 가능하므로 모의투자 시에는 임의 가격으로 매도 시도)
-                    current_price_data = get_current_price(ticker, info['excg'], real)
+                    current_price_data = quotes.get(ticker)
                     if current_price_data:
                         current_price = float(current_price_data['last'])
                     else:
@@ -298,7 +652,8 @@ async def trading_bot_loop(real:bool=False):
                         current_price = info['avg_pric'] * 0.95 # 보수적으로 5% 낮은 가격으로 매도 시도
                         print(f"⚠️ [정리] {ticker} 현재가 조회 실패, 평균가 {info['avg_pric']:.2f}의 95%인 {current_price:.2f}로 매도 시도")
 
-                    if send_sell_order(ticker, current_price, info['qty'], info['excg'], real):
+                    if await kis_async.send_sell_order(ticker, current_price, info['qty'], info['excg'], real):
+                        record_sell("close_out", ticker, info, current_price, info['qty'])
                         del ACC_STOCK[ticker]
                         print(f"✅ [정리] {ticker} 매도 완료.")
                     else:
@@ -307,25 +662,30 @@ async def trading_bot_loop(real:bool=False):
                 # 미체결 주문 취소
                 for ticker, order_info in list(PENDING_ORDERS.items()):
                     print(f"🗑️ [정리] {ticker} 미체결 주문 {order_info['order_no']} 취소 시도...")
-                    if cancel_order(ticker, order_info['order_no'], order_info['qty'], real):
+                    if await kis_async.cancel_order(ticker, order_info['order_no'], order_info['qty'], real):
+                        invalidate_account_snapshot()
+                        TRADE_STORE.record(ticker, "cancel", "cancel", price=order_info['order_price'], qty=order_info['qty'],
+                                           order_no=order_info['order_no'], note="장 마감 정리")
                         del PENDING_ORDERS[ticker]
                         print(f"✅ [정리] {ticker} 미체결 주문 취소 완료.")
                     else:
                         print(f"❌ [정리] {ticker} 미체결 주문 취소 실패.")
 
             
-            await asyncio.sleep(600) # 10분 대기
+            await _sleep(600) # 10분 대기
             continue
 
         try:
             #### 매수 루프 ####
             # 1. KIS 토큰 점검
-            get_kis_token(real)
+            await kis_async.get_kis_token(real)
 
+            # 2. 계좌 스냅샷(잔고/보유/미체결)은 루프당 한 번만 조회해서 동기화/취소/매수 계산이 같이 씀
+            invalidate_account_snapshot()
             await sync_account_data_safe(real)
 
             # 오래된 지정가 주문내역 취소
-            unfilled_orders = get_unfilled_quantity(real)
+            unfilled_orders = (await fetch_account_snapshot(real))["unfilled"]
             if unfilled_orders:
                 for order in unfilled_orders:
                     ticker = order['pdno']
@@ -334,14 +694,16 @@ async def trading_bot_loop(real:bool=False):
                     qty = int(order['nccs_qty'])
 
                     ord_datetime = datetime.strptime(f"{ord_date} {ord_time}", "%Y%m%d %H%M%S")
-                    now = datetime.now()
-                    diff = now - ord_datetime - timedelta(days=1)
+                    now = _now()
+                    diff = now - ord_datetime - ORDER_TIME_OFFSET
 
                     if diff > timedelta(seconds=ORDER_LIFETIME_LIMIT):
                         ord_no = order['orgn_odno']
 
-                        success = cancel_order(ticker, ord_no, qty, real)
+                        success = await kis_async.cancel_order(ticker, ord_no, qty, real)
                         if success:
+                            invalidate_account_snapshot()
+                            TRADE_STORE.record(ticker, "cancel", "cancel", qty=qty, order_no=ord_no, note="주문 유효시간 초과")
                             if ticker in PENDING_ORDERS:
                                 del PENDING_ORDERS[ticker]
                         
@@ -349,176 +711,24 @@ async def trading_bot_loop(real:bool=False):
             async with STATE_LOCK:
                 current_targets = list(GLOBAL_TARGET_TICKERS)
                 
-            # 3. 각 종목 분석 및 주문
-            for item in current_targets:
-                ticker = item['ticker']
-                toss_exchange = item.get('exchange', 'NSQ')
-                kis_exchange = map_exchange_code(toss_exchange)
-
-                if (len(ACC_STOCK) + len(PENDING_ORDERS)) >= MAX_SLOTS:
-                    break
-
-                if ticker in ACC_STOCK or ticker in PENDING_ORDERS:
-                    continue
-
-                try:
-                    # df = yf.download(ticker, interval="5m", period="5d", prepost=True, progress=False, multi_level_index=False)
-                    df = get_5m_candles(ticker, kis_exchange, real)
-                    if len(df) < 60: continue
-
-                    # 분석
-                    chart_data = ichimoku(df, {"delta": timedelta(minutes=5)})
-                    if not chart_data: continue
-
-                    # 시그널 확인
-                    signal, price = span_b_signal(chart_data, n=SIGNAL_N, k=SIGNAL_K)
-
-                    if signal:
-                        order_price = round(price, 2)
-                        
-                        # ==================================================
-                        # [핵심] 자산 대비 수량 계산 로직
-                        # ==================================================
-                        # 1. 내 계좌 총 자산 조회 (주식평가금 + 현금)
-                        total_asset, orderable_cash = get_account_balance(real)
-
-                        # total_asset = total_asset / 1500 # 환율 적용
-                        orderable_cash = orderable_cash / 1500 # 환율 적용
-
-                        async with STATE_LOCK:
-                            used_slots = len(ACC_STOCK) + len(PENDING_ORDERS)
-
-                        if orderable_cash <= 0:
-                            print(f"⚠️ [Skip] 자산 조회 오류 또는 잔고 0 (Asset: {total_asset})")
-                            continue
-
-                        remain_slot = MAX_SLOTS - used_slots
-
-                        target_amount = (orderable_cash / remain_slot) * 0.98
-                        
-                        # 3. 매수 가능 수량 계산 (목표금액 / 주당가격) -> 소수점 버림
-                        qty = math.floor(target_amount / order_price)
-                        
-                        # 4. 예외 처리
-                        if qty < 1:
-                            # 1주도 못 사는 경우 (돈이 없거나 주식이 너무 비쌈)
-                            # print(f"   [Skip] {ticker} 자산 부족 (필요: ${order_price}, 할당: ${target_amount:.2f})")
-                            continue
-                            
-                        # (선택) 현금 부족 시 주문 가능한 만큼만 사기 (Safety)
-                        max_qty_by_cash = math.floor(orderable_cash / order_price)
-                        if qty > max_qty_by_cash:
-                            qty = max_qty_by_cash # 현금 있는 만큼만 조정
-                            if qty < 1: continue
-
-                        print(f"⚡ [SIGNAL] {ticker} ({toss_exchange}) 매수! ${order_price} x {qty}주 (비중 {BUY_PERCENT}%)")
-                        
-                        # 5. 주문 전송
-                        
-                        success, odno = send_buy_order(ticker, order_price, qty, kis_exchange, real)
-                        
-                        if success:
-                            PENDING_ORDERS[ticker] = {
-                                "order_price": order_price,
-                                "qty": qty,
-                                "order_no": odno}
-                    
-                except Exception as e:
-                    continue # 개별 종목 에러 무시
+            # 3. 각 종목 분석(동시 조회) 및 주문(랭킹 순서)
+            await scan_and_buy(current_targets, real)
             
             #################
 
             #### 매도 루프 ####
-            # 손익 보고 익절, 손절
-            current_tickers = list(ACC_STOCK.keys())
-            for ticker in current_tickers:
-                info = ACC_STOCK[ticker]
-
-                avg_price = info["avg_pric"]
-                qty = info["qty"]
-                excg = info["excg"]
-                stage = info.get("stage", 0)
-
-                if "max_profit" not in info:
-                    info["max_profit"] = -999.0
-                
-                try:
-                    # 현재가 조회
-                    # df = await asyncio.to_thread(yf.download, ticker, interval="5m", period="1d", prepost=True, progress=False, multi_level_index=False)
-                    df = await asyncio.to_thread(get_current_price, ticker, excg, real)
-                    
-                    if len(df) < 1: continue
-
-                    curr_price = float(df['last'])
-                    profit_pct = ((curr_price - avg_price) / avg_price) * 100
-
-                    # 최고 수익률 갱신 (트레일링 스탑용)
-                    if profit_pct > info["max_profit"]:
-                        info["max_profit"] = profit_pct
-
-                    max_p = info["max_profit"] # 현재까지의 최고 수익률
-
-                    # -------------------------------------------------------
-                    # 1. 🛑 손절 (-10%)
-                    # -------------------------------------------------------
-                    if profit_pct <= -10.0:
-                        print(f"❌ [손절] {ticker} -10% 도달.. 전량 매도")
-                        if send_sell_order(ticker, curr_price, qty, excg, real):
-                            del ACC_STOCK[ticker]
-                        continue
-
-                    if stage == 0 and info["max_profit"] >= 15.0 and profit_pct <= 1.0:
-                        print(f"🛡️ [본절 스탑] {ticker} +15% 찍고 하락..")
-                        if send_sell_order(ticker, curr_price, qty, excg, real): del ACC_STOCK[ticker]
-                        continue
-
-                    if stage >= 1:
-                        dd = TRAILING_DD.get(stage, None)
-                        if dd is not None and (max_p - profit_pct) >= dd:
-                            print(f"📉 [트레일링 스탑] {ticker} stage={stage} max={max_p:.2f}% -> now={profit_pct:.2f}% (DD {dd}%) 전량 매도")
-                            if send_sell_order(ticker, curr_price, qty, excg, real):
-                                del ACC_STOCK[ticker]
-                            continue
-
-                    cur_qty = qty
-                    cur_stage = stage
-
-                    for target_stage, trigger_profit, sell_ratio in PROFIT_STEPS:
-                        # 아직 그 단계 안 갔고, 수익률이 트리거 이상이면 실행
-                        if cur_stage < target_stage and profit_pct >= trigger_profit:
-
-                            # 역산 공식 그대로 사용 (현재 stage에서 남아있어야 하는 비율 기반)
-                            current_ratio_factor = REMAINING_RATIO.get(cur_stage, 1.0)
-                            estimated_init_qty = cur_qty / current_ratio_factor
-
-                            sell_qty = calc_sell_qty(estimated_init_qty, sell_ratio, cur_qty, target_stage)
-
-                            if sell_qty <= 0:
-                                # 방어
-                                cur_stage = target_stage
-                                ACC_STOCK[ticker]["stage"] = cur_stage
-                                continue
-
-                            print(f"💰 [분할익절] {ticker} stage {cur_stage}->{target_stage} "
-                                f"profit={profit_pct:.2f}% trigger={trigger_profit}% sell={sell_qty}/{cur_qty}")
-
-                            if send_sell_order(ticker, curr_price, sell_qty, excg, real):
-                                # 주문 성공 반영
-                                cur_qty -= sell_qty
-                                ACC_STOCK[ticker]["qty"] = cur_qty
-                                cur_stage = target_stage
-                                ACC_STOCK[ticker]["stage"] = cur_stage
-
-                                if cur_qty <= 0:
-                                    del ACC_STOCK[ticker]
-                                    print(f"👋 {ticker} 졸업 완료.")
-                                    break
-                            else:
-                                # 주문 실패면 더 진행하지 않음
-                                print(f"⚠️ [익절 실패] {ticker} 매도 주문 실패, 다음 루프에서 재시도")
-                                break
+            # 손익 보고 익절, 손절 -> 실시간 틱(realtime_quote_loop)으로 처리
+            # 여기서는 최근 틱이 없는 종목만 현재가를 폴링해서 보완 (웹소켓 끊김/구독 한도 초과 등)
+            stale = {ticker: info["excg"] for ticker, info in list(ACC_STOCK.items())
+                     if REALTIME_QUOTES is None or not REALTIME_QUOTES.is_fresh(ticker, REALTIME_STALE_SEC)}
 
+            # 현재가 일괄 조회 (동시 요청 + 짧은 캐시)
+            # df = await asyncio.to_thread(yf.download, ticker, interval="5m", period="1d", prepost=True, progress=False, multi_level_index=False)
+            quotes = await kis_async.get_current_prices(stale, real) if stale else {}
 
+            for ticker, quote in quotes.items():
+                try:
+                    await handle_price_tick(ticker, float(quote['last']), real)
                 except Exception as e:
                     print(f"❌ 매도 로직 에러 ({ticker}): {e}")
                     continue
@@ -528,7 +738,7 @@ async def trading_bot_loop(real:bool=False):
         
         # 주기 대기
         save_bot_state()
-        await asyncio.sleep(TRADE_INTERVAL_SEC)
+        await _sleep(TRADE_INTERVAL_SEC)
 
 def map_exchange_code(toss_code):
     # Toss Code -> KIS Code
@@ -548,15 +758,17 @@ async def read_root(request: Request):
 
 @app.get("/api/scrape")
 async def get_scraped_data():
-    data = scrape_toss_data()
-    return data
+    # 봇 크롤러가 공유한 스냅샷을 그대로 반환, 오래됐을 때만 (단일 비행으로) 새로 크롤링
+    snapshot = await asyncio.to_thread(get_ranking_snapshot)
+    if "error" in snapshot:
+        return snapshot
+    return snapshot["data"]
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     state = {}
     try:
-        with open("./bot_state.json", "r", encoding="utf-8") as f:
-            state = json.load(f)
+        state = STATE_READER.read() or {}
     except Exception:
         pass
 
@@ -565,72 +777,129 @@ async def dashboard(request: Request):
         {"request": request, "state": state}
     )
 
+@app.get("/api/quotes")
+async def get_holding_quotes():
+    """봇 보유 종목 현재가 (bot_state.json + 저널 기준, 일괄 조회 + 짧은 캐시 공유)"""
+    try:
+        acc_stock = (STATE_READER.read() or {}).get("acc_stock", {})
+    except Exception:
+        acc_stock = {}
+
+    quotes = await kis_async.get_current_prices({t: i.get("excg", "NASD") for t, i in acc_stock.items()}, True)
+
+    result = {}
+    for ticker, quote in quotes.items():
+        last = float(quote['last'])
+        avg_price = acc_stock[ticker].get("avg_pric") or 0
+        result[ticker] = {
+            "last": last,
+            "profit_pct": round((last - avg_price) / avg_price * 100, 2) if avg_price else None,
+        }
+    return result
+
+@app.get("/api/trades/daily-pnl")
+async def get_daily_pnl(days: int = 30):
+    """일별 실현손익 (최근 days 일)"""
+    return await asyncio.to_thread(TRADE_STORE.daily_pnl, days)
+
+@app.get("/api/trades/recent")
+async def get_recent_trades(limit: int = 100):
+    return await asyncio.to_thread(TRADE_STORE.recent, limit)
+
+@app.get("/api/trades/ticker/{ticker}")
+async def get_ticker_trades(ticker: str, limit: int = 200):
+    """종목별 주문/체결/매도 기록"""
+    return await asyncio.to_thread(TRADE_STORE.ticker_history, ticker.upper(), limit)
+
+# 각 봉 별 시간 간격 정의
+HISTORY_CONFIGS = [
+    {"label": "1분봉 (최근 2일)", "interval": "1m", "period": "2d", "delta": timedelta(minutes=1)},
+    {"label": "2분봉 (최근 3일)", "interval": "2m", "period": "3d", "delta": timedelta(minutes=2)}, 
+    {"label": "5분봉 (최근 10일)", "interval": "5m", "period": "10d", "delta": timedelta(minutes=5)},
+    {"label": "15분봉 (최근 20일)", "interval": "15m", "period": "20d", "delta": timedelta(minutes=15)}, 
+    {"label": "30분봉 (최근 30일)", "interval": "30m", "period": "30d", "delta": timedelta(minutes=30)}
+]
+HISTORY_CACHE_TTL_SEC = 30  # 차트 응답 캐시 유효 시간 (초)
+HISTORY_PARTIAL_TTL_SEC = 5 # 일부 타임프레임이 실패한 응답은 짧게만 캐시 (전부 실패하면 캐시 안 함)
+HISTORY_CACHE = {}          # ticker -> (만료 시각, 응답)
+HISTORY_LAST_SWEEP = 0.0    # 마지막 만료 캐시 정리 시각
+HISTORY_LOCKS = {}          # ticker -> asyncio.Lock (같은 종목 동시 요청은 한 번만 다운로드)
+
+def fetch_history_chart(ticker, conf):
+    """한 타임프레임 다운로드 + 일목 계산 (스레드에서 실행)"""
+    # yf.download 는 스레드 간 전역 상태를 공유하므로 동시 실행에는 Ticker.history 사용
+    df = yf.Ticker(ticker).history(interval=conf['interval'], period=conf['period'], prepost=True)
+    return ichimoku(df, conf)
+
+def _sweep_history_cache(now):
+    """만료된 차트 캐시와 쓰지 않는 종목 락 정리 (HISTORY_CACHE_TTL_SEC 마다 한 번, 종목 락 밖에서)"""
+    global HISTORY_LAST_SWEEP
+    if now - HISTORY_LAST_SWEEP < HISTORY_CACHE_TTL_SEC:
+        return
+    HISTORY_LAST_SWEEP = now
+
+    for key, (expires_at, _) in list(HISTORY_CACHE.items()):
+        if now >= expires_at:
+            del HISTORY_CACHE[key]
+    for key, lock in list(HISTORY_LOCKS.items()):
+        if key not in HISTORY_CACHE and not lock.locked():
+            del HISTORY_LOCKS[key]
+
 @app.get("/api/history/{ticker}")
 async def get_stock_history(ticker: str):
-    # 각 봉 별 시간 간격 정의
-    configs = [
-        {"label": "1분봉 (최근 2일)", "interval": "1m", "period": "2d", "delta": timedelta(minutes=1)},
-        {"label": "2분봉 (최근 3일)", "interval": "2m", "period": "3d", "delta": timedelta(minutes=2)}, 
-        {"label": "5분봉 (최근 10일)", "interval": "5m", "period": "10d", "delta": timedelta(minutes=5)},
-        {"label": "15분봉 (최근 20일)", "interval": "15m", "period": "20d", "delta": timedelta(minutes=15)}, 
-        {"label": "30분봉 (최근 30일)", "interval": "30m", "period": "30d", "delta": timedelta(minutes=30)}
-    ]
-    
-    response_data = []
-
-    for conf in configs:
-        try:
-            # 1. 데이터 다운로드
-            df = yf.download(ticker, interval=conf['interval'], period=conf['period'], progress=False, prepost=True, multi_level_index=False)
-            
-            chart_data = ichimoku(df, conf)
-            
+    now = time.monotonic()
+    _sweep_history_cache(now)
+    cached = HISTORY_CACHE.get(ticker)
+    if cached and now < cached[0]:
+        return cached[1]
+
+    lock = HISTORY_LOCKS.setdefault(ticker, asyncio.Lock())
+    async with lock:
+        # 기다리는 동안 다른 요청이 채웠으면 그대로 사용
+        cached = HISTORY_CACHE.get(ticker)
+        if cached and time.monotonic() < cached[0]:
+            return cached[1]
+
+        # 1. 타임프레임 5개를 이벤트 루프 밖에서 동시에 다운로드 + 계산
+        results = await asyncio.gather(
+            *[asyncio.to_thread(fetch_history_chart, ticker, conf) for conf in HISTORY_CONFIGS],
+            return_exceptions=True,
+        )
+
+        response_data = []
+        for conf, chart_data in zip(HISTORY_CONFIGS, results):
+            if isinstance(chart_data, Exception):
+                print(f"❌ Error fetching {conf['interval']} for {ticker}: {chart_data}")
+                continue
             response_data.append(chart_data)
-            
-        except Exception as e:
-            print(f"❌ Error fetching {conf['interval']} for {ticker}: {e}")
+
+        # 전부 실패면 캐시하지 않음 (다음 요청에서 바로 다시 시도), 일부 실패면 짧게만
+        if response_data:
+            ttl = HISTORY_CACHE_TTL_SEC if len(response_data) == len(HISTORY_CONFIGS) else HISTORY_PARTIAL_TTL_SEC
+            HISTORY_CACHE[ticker] = (time.monotonic() + ttl, response_data)
 
     return response_data
 
 @app.post("/api/scan/signals")
 async def scan_signals(request: Request):
+    """
+    종목 리스트 일괄 스캔. body: {"tickers": [...], "stream": false}
+    stream=true 면 종목별 결과를 끝나는 순서대로 NDJSON 한 줄씩 흘려보냄.
+    """
     data = await request.json()
     tickers = data.get("tickers", []) 
-    
-    INTERVAL = "5m" 
-    PERIOD = "5d"
 
-    signals = {}
-
-    for ticker in tickers:
-        if not ticker or ticker == "N/A": continue
-        
-        try:
-            # 1. 데이터 가져오기
-            df = yf.download(ticker, interval=INTERVAL, period=PERIOD, prepost=True, progress=False, multi_level_index=False)
-            if len(df) < 60: continue 
+    if data.get("stream"):
+        async def generate():
+            async for ticker, result in scan_universe(tickers, CANDLE_STORE, archive=CANDLE_ARCHIVE):
+                yield json.dumps({"ticker": ticker, **(result or {"detected": False})}, ensure_ascii=False) + "\n"
 
-            chart_data = ichimoku(df, {"label": f"{INTERVAL} (최근 5일)", "interval": INTERVAL, "period": PERIOD, "delta": timedelta(minutes=5)})
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
 
-            is_floating, value = span_b_signal(chart_data, 7, 2)
-
-            curr_span_b = value
-
-            if is_floating:
-                # 이격도는 '현재가' 기준으로 계산 (가장 최근 봉)
-                curr_close = df['Close'].iloc[-1]
-                gap_pct = ((curr_close - curr_span_b) / curr_span_b) * 100
-                
-                signals[ticker] = {
-                    "detected": True,
-                    "flat_price": float(curr_span_b),
-                    "gap_pct": round(gap_pct, 2),
-                    "msg": f"5봉 연속 공중부양 (Gap +{round(gap_pct, 2)}%)"
-                }
-
-        except Exception as e:
-            print(f"Scan Error {ticker}: {e}")
-            continue
+    signals = {}
+    async for ticker, result in scan_universe(tickers, CANDLE_STORE, archive=CANDLE_ARCHIVE):
+        if result:
+            signals[ticker] = result
 
     return signals
 
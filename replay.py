@@ -0,0 +1,345 @@
+import argparse, asyncio, contextlib, io, os, time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import backtest
+from kis_api import ORDER_TIME_OFFSET, sell_order_price
+
+# ==========================================================
+# 리플레이 모드: 실제 main.trading_bot_loop 를 기록된 5분봉 + 시뮬레이션 시계 + 가짜 브로커로 실행
+# - main._now / main._sleep 을 SimClock 으로 교체 -> sleep 은 시계만 앞으로 돌리고 바로 리턴 (CPU 최대 속도)
+# - main.kis_async 를 SimBroker 로 교체 -> 캔들/현재가는 그 시각까지 완성된 봉, 지정가 매수는 이후 봉 저가로 체결
+# - 네트워크 없이 같은 데이터면 같은 결과 (전략 변경 회귀 테스트 / 루프 지연 측정용)
+#
+# 실행 예: python replay.py --archive kis --start 2025-03-03 --end 2025-03-05 --quiet
+# ==========================================================
+
+KST = "Asia/Seoul"
+BAR = timedelta(minutes=5)
+FX_KRW = 1500            # main.place_buy_order 가 주문가능 현금(원)을 1500 으로 나눠 씀 -> 브로커는 원화로 보고
+REPLAY_OUT_DIR = "./replay_out"
+OHLCV = ("Open", "High", "Low", "Close", "Volume")
+
+class ReplayFinished(Exception):
+    """시뮬레이션 시계가 데이터 끝을 지남"""
+
+class SimClock:
+    """main 의 datetime.now / asyncio.sleep 대체 (KST naive datetime, main 과 같은 로컬 시간 기준)"""
+    def __init__(self, start: datetime, end: datetime, on_advance=None):
+        self.t = start
+        self.end = end
+        self.on_advance = on_advance
+
+        # 루프 지연: sleep 호출 사이의 실제 경과 시간 = 루프 한 바퀴 처리 시간
+        self.iteration_sec = []
+        self._last_wake = None
+
+    def now(self):
+        return self.t
+
+    def time(self):
+        """epoch 초 (TradeStore 기록 시각용)"""
+        return pd.Timestamp(self.t).tz_localize(KST).timestamp()
+
+    async def sleep(self, sec):
+        wall = time.perf_counter()
+        if self._last_wake is not None:
+            self.iteration_sec.append(wall - self._last_wake)
+
+        self.t += timedelta(seconds=sec)
+        if self.t > self.end:
+            raise ReplayFinished()
+        if self.on_advance:
+            self.on_advance(self.t)
+
+        await asyncio.sleep(0)  # 다른 태스크에 양보만
+        self._last_wake = time.perf_counter()
+
+class SimBroker:
+    """
+    kis_api_async 와 같은 함수/반환 형태의 가짜 브로커 (main 이 쓰는 것만).
+    - 가격: 현재 시각까지 완성된 마지막 봉 종가 (진행 중인 봉은 안 보여줌 -> 미래 정보 없음)
+    - 매수: 지정가 주문 후 시작하는 봉 중 저가가 주문가 이하인 첫 봉에서 min(시가, 주문가) 체결
+    - 매도: main 이 현재가로 내는 지정가 -> 실제 주문가(kis_api.sell_order_price)로 즉시 체결
+    - 미체결 주문일시(ord_dt/ord_tmd)는 실제 응답과 같은 기준 (시뮬레이션 시계 KST - ORDER_TIME_OFFSET)
+    """
+    def __init__(self, frames, clock: SimClock, cash: float = 10_000.0, api_latency: float = 0.0):
+        self.clock = clock
+        self.api_latency = api_latency
+
+        self.data = {}
+        for ticker, df in frames.items():
+            index = pd.DatetimeIndex(df.index)
+            if index.tz is not None:
+                index = index.tz_convert(KST).tz_localize(None)
+            self.data[ticker] = {
+                "start": index.to_numpy(dtype="datetime64[ns]"),
+                "ohlcv": {col: df[col].to_numpy(dtype=np.float64) for col in OHLCV},
+            }
+
+        self.cash = float(cash)    # USD
+        self.holdings = {}         # ticker -> {"qty", "avg"}
+        self.orders = {}           # order_no -> {"ticker", "price", "qty", "placed"}
+        self.next_order_no = 1
+
+        self.calls = {}
+        self.counts = {"buy_orders": 0, "fills": 0, "sells": 0, "cancels": 0, "rejected": 0}
+        self.realized = 0.0
+
+    # ------------------------------------------------------
+    # 시세
+    # ------------------------------------------------------
+    def _completed(self, ticker, now=None):
+        """now 까지 완성된 봉 개수 (봉 시작 + 5분 <= now)"""
+        d = self.data.get(ticker)
+        if d is None:
+            return 0
+        now = np.datetime64(now or self.clock.now(), "ns")
+        return int(np.searchsorted(d["start"], now - np.timedelta64(5, "m"), side="right"))
+
+    def last_price(self, ticker):
+        end = self._completed(ticker)
+        return float(self.data[ticker]["ohlcv"]["Close"][end - 1]) if end else None
+
+    def advance(self, now):
+        """시계가 움직일 때마다: 그 사이 완성된 봉으로 미체결 지정가 매수 체결"""
+        for order_no, order in list(self.orders.items()):
+            d = self.data[order["ticker"]]
+            first = int(np.searchsorted(d["start"], order["placed"], side="left"))  # 주문 후 시작한 봉부터
+            end = self._completed(order["ticker"], now)
+            if end <= first:
+                continue
+
+            low = d["ohlcv"]["Low"][first:end]
+            hit = np.flatnonzero(low <= order["price"])
+            if not len(hit):
+                continue
+
+            bar = first + int(hit[0])
+            price = min(float(d["ohlcv"]["Open"][bar]), order["price"])
+            self._fill(order_no, price)
+
+    def _fill(self, order_no, price):
+        order = self.orders.pop(order_no)
+        ticker, qty = order["ticker"], order["qty"]
+        self.cash -= price * qty
+
+        pos = self.holdings.setdefault(ticker, {"qty": 0, "avg": 0.0})
+        pos["avg"] = (pos["avg"] * pos["qty"] + price * qty) / (pos["qty"] + qty)
+        pos["qty"] += qty
+        self.counts["fills"] += 1
+
+    def reserved(self):
+        return sum(o["price"] * o["qty"] for o in self.orders.values())
+
+    def equity(self):
+        value = sum(pos["qty"] * (self.last_price(t) or pos["avg"]) for t, pos in self.holdings.items())
+        return self.cash + value
+
+    async def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.api_latency > 0:
+            await asyncio.sleep(self.api_latency)  # 실제 대기 (동시 요청 효과 확인용)
+
+    # ------------------------------------------------------
+    # kis_api_async 대체 함수들
+    # ------------------------------------------------------
+    async def get_kis_token(self, real: bool = False):
+        await self._call("token")
+        return "sim-token"
+
+    async def get_account_snapshot(self, real: bool = False):
+        await self._call("account_snapshot")
+        orderable = self.cash - self.reserved()
+        purchased = sum(pos["qty"] * pos["avg"] for pos in self.holdings.values())
+
+        holdings = [{
+            "ovrs_pdno": ticker,
+            "ovrs_cblc_qty": str(pos["qty"]),
+            "ord_psbl_qty": str(pos["qty"]),
+            "pchs_avg_pric": f"{pos['avg']:.4f}",
+            "ovrs_excg_cd": "NASD",
+        } for ticker, pos in self.holdings.items() if pos["qty"] > 0]
+        unfilled = [{
+            "pdno": order["ticker"],
+            "ft_ord_unpr3": f"{order['price']:.4f}",
+            "nccs_qty": str(order["qty"]),
+            "orgn_odno": order_no,
+            "ord_dt": (pd.Timestamp(order["placed"]) - ORDER_TIME_OFFSET).strftime("%Y%m%d"),
+            "ord_tmd": (pd.Timestamp(order["placed"]) - ORDER_TIME_OFFSET).strftime("%H%M%S"),
+        } for order_no, order in self.orders.items()]
+
+        return {
+            "total_asset": (purchased + orderable) * FX_KRW,
+            "orderable_cash": orderable * FX_KRW,
+            "holdings": holdings,
+            "unfilled": unfilled,
+            "fetched_at": self.clock.time(),
+        }
+
+    async def get_5m_candles(self, ticker, exchange, real: bool = False, nrec=120):
+        await self._call("candles")
+        end = self._completed(ticker)
+        if not end:
+            return False
+
+        start = max(0, end - int(nrec))
+        d = self.data[ticker]
+        index = pd.DatetimeIndex(d["start"][start:end], name="Datetime")
+        return pd.DataFrame({col: values[start:end] for col, values in d["ohlcv"].items()}, index=index)
+
+    async def get_current_price(self, ticker, exchange, real: bool = False):
+        await self._call("price")
+        price = self.last_price(ticker) if ticker in self.data else None
+        return {"last": f"{price:.4f}"} if price else False
+
+    async def get_current_prices(self, tickers, real: bool = False):
+        targets = tickers.items() if isinstance(tickers, dict) else tickers
+        quotes = await asyncio.gather(*[self.get_current_price(t, e, real) for t, e in targets])
+        return {t: q for (t, _), q in zip(targets, quotes) if q}
+
+    async def send_buy_order(self, ticker, price, qty, exchange="NASD", real: bool = False):
+        await self._call("buy")
+        if ticker not in self.data or qty < 1 or price * qty > self.cash - self.reserved():
+            self.counts["rejected"] += 1
+            return False, 0
+
+        order_no = f"{self.next_order_no:010d}"
+        self.next_order_no += 1
+        self.orders[order_no] = {"ticker": ticker, "price": float(price), "qty": int(qty),
+                                 "placed": np.datetime64(self.clock.now(), "ns")}
+        self.counts["buy_orders"] += 1
+        return True, order_no
+
+    async def send_sell_order(self, ticker, price, qty, exchange="NASD", real: bool = False):
+        await self._call("sell")
+        pos = self.holdings.get(ticker)
+        if pos is None or qty < 1 or qty > pos["qty"]:
+            self.counts["rejected"] += 1
+            return False
+
+        price = sell_order_price(price)
+        self.cash += price * qty
+        self.realized += (price - pos["avg"]) * qty
+        pos["qty"] -= qty
+        if pos["qty"] <= 0:
+            del self.holdings[ticker]
+        self.counts["sells"] += 1
+        return True
+
+    async def cancel_order(self, ticker, order_no, qty, real: bool = False):
+        await self._call("cancel")
+        if self.orders.pop(order_no, None) is None:
+            return False
+        self.counts["cancels"] += 1
+        return True
+
+# ==========================================================
+# 실행
+# ==========================================================
+def _percentiles_ms(values):
+    if not values:
+        return {}
+    arr = np.asarray(values) * 1000
+    return {f"p{p}": round(float(np.percentile(arr, p)), 3) for p in (50, 95, 99)} | {"max": round(float(arr.max()), 3)}
+
+async def run_replay(frames, cash=10_000.0, start=None, end=None, out_dir=REPLAY_OUT_DIR,
+                     interval=None, api_latency=0.0, quiet=False):
+    """
+    frames: {ticker: 5분봉 DataFrame} (전 종목을 토스 랭킹 대신 매수 후보로 사용, 순서 = 랭킹 순서)
+    start/end: KST 기준 (없으면 데이터 전체)
+    return: 요약 dict
+    """
+    import main
+    from candle_store import CandleStore
+    from candle_archive import CandleArchive
+    from state_store import StateJournal
+    from trade_store import TradeStore
+
+    starts = [pd.DatetimeIndex(df.index) for df in frames.values() if len(df)]
+    starts = [i.tz_convert(KST).tz_localize(None) if i.tz is not None else i for i in starts]
+    start = pd.Timestamp(start).to_pydatetime() if start else min(i[0] for i in starts).to_pydatetime()
+    end = pd.Timestamp(end).to_pydatetime() if end else (max(i[-1] for i in starts) + BAR).to_pydatetime()
+
+    clock = SimClock(start, end)
+    broker = SimBroker(frames, clock, cash, api_latency)
+    clock.on_advance = broker.advance
+
+    # 결과 폴더 초기화 (같은 입력이면 같은 결과)
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, "bot_state.json")
+    db_path = os.path.join(out_dir, "trades.db")
+    for path in (state_path, state_path + ".journal", db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    saved = {name: getattr(main, name) for name in (
+        "_now", "_sleep", "kis_async", "GLOBAL_TARGET_TICKERS", "CANDLE_STORE", "CANDLE_ARCHIVE",
+        "INDICATORS", "STATE_JOURNAL", "TRADE_STORE", "TRADE_INTERVAL_SEC")}
+
+    main._now = clock.now
+    main._sleep = clock.sleep
+    main.kis_async = broker
+    main.GLOBAL_TARGET_TICKERS = [{"ticker": ticker, "exchange": "NSQ"} for ticker in frames]
+    main.CANDLE_ARCHIVE = CandleArchive(root=None)   # 재생 데이터는 다시 보관하지 않음
+    main.INDICATORS = {}
+    main.STATE_JOURNAL = StateJournal(state_path)
+    main.TRADE_STORE = TradeStore(db_path, clock=clock.time)
+    if interval:
+        main.TRADE_INTERVAL_SEC = interval
+    main.CANDLE_STORE = CandleStore(forming_ttl=2 * main.TRADE_INTERVAL_SEC, now=clock.now)  # 캐시 유효 시간/증분 조회 모두 시뮬레이션 시계로
+
+    print(f"⏪ [Replay] {start} ~ {end} / 종목 {len(frames)}개 / 루프 {main.TRADE_INTERVAL_SEC}초")
+    wall = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            await main.trading_bot_loop(real=True)
+    except ReplayFinished:
+        pass
+    finally:
+        wall = time.perf_counter() - wall
+        candle_stats = main.CANDLE_STORE.stats()
+        main.TRADE_STORE.close()
+        for name, value in saved.items():
+            setattr(main, name, value)
+
+    sim_sec = (clock.t - start).total_seconds()
+    final = broker.equity()
+    summary = {
+        "sim_hours": round(sim_sec / 3600, 2),
+        "wall_sec": round(wall, 3),
+        "speedup": round(sim_sec / wall, 1) if wall else None,
+        "iterations": len(clock.iteration_sec) + 1,
+        "loop_latency_ms": _percentiles_ms(clock.iteration_sec),
+        "api_calls": dict(sorted(broker.calls.items())),
+        "candle_store": candle_stats,
+        **broker.counts,
+        "realized_pnl": round(broker.realized, 2),
+        "final_equity": round(final, 2),
+        "total_return_pct": round((final - cash) / cash * 100, 2),
+        "open_positions": {t: pos["qty"] for t, pos in broker.holdings.items()},
+        "out_dir": out_dir,
+    }
+
+    print("📊 [Replay] 결과")
+    for key, value in summary.items():
+        print(f"   {key}: {value}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="기록된 캔들로 trading_bot_loop 재생 (시뮬레이션 시계 + 가짜 브로커)")
+    backtest.add_data_args(parser)
+    parser.add_argument("--cash", type=float, default=10_000.0, help="시작 현금 (USD)")
+    parser.add_argument("--from", dest="sim_start", help="재생 시작 시각 (KST, 예: '2025-03-03 18:00')")
+    parser.add_argument("--to", dest="sim_end", help="재생 끝 시각 (KST)")
+    parser.add_argument("--interval", type=float, help="매매 루프 주기 (초, 기본 main.TRADE_INTERVAL_SEC)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="가짜 API 호출마다 실제로 기다릴 시간 (초)")
+    parser.add_argument("--out", default=REPLAY_OUT_DIR, help="상태/매매기록 저장 폴더")
+    parser.add_argument("--quiet", action="store_true", help="봇 로그 숨기기")
+    args = parser.parse_args()
+
+    frames = backtest.load_frames(args, parser)
+    asyncio.run(run_replay(frames, args.cash, args.sim_start, args.sim_end, args.out,
+                           args.interval, args.api_latency, args.quiet))
@@ -0,0 +1,154 @@
+import asyncio, threading
+from datetime import timedelta
+
+import pandas as pd
+import yfinance as yf
+
+from utils import ichimoku_arrays, span_b_signal_many
+
+# ==========================================================
+# 종목 리스트 일괄 시그널 스캔 (/api/scan/signals)
+# - 종목을 CHUNK_SIZE 개씩 묶어서 yf.download 한 번(내부 멀티스레드)으로 받음
+# - 캔들은 CandleStore 에 캐시 -> 다음 스캔부터는 마지막 봉 이후만 받음
+# - 새로 받은 봉은 CandleArchive 에도 넘겨서 디스크에 보관 (archive 를 넘긴 경우)
+# - 묶음별 일목 계산 + span_b_signal 일괄 판단은 스레드에서, 끝나는 묶음부터 결과를 흘려보냄
+# ==========================================================
+
+INTERVAL = "5m"
+PERIOD = "5d"
+CHUNK_SIZE = 25
+MIN_BARS = 60
+
+# yf.download 는 모듈 전역 상태를 쓰므로 동시에 한 번만 호출 (다운로드 내부는 멀티스레드)
+_YF_LOCK = threading.Lock()
+
+def _split_download(df: pd.DataFrame, tickers):
+    """group_by='ticker' 결과를 종목별 DataFrame 으로 분리 (다른 종목 때문에 생긴 빈 행 제거)"""
+    frames = {}
+    if df is None or df.empty:
+        return frames
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        # 종목 1개일 때 단일 컬럼으로 오는 경우
+        frames[tickers[0]] = df.dropna(how="all")
+        return frames
+
+    level0 = set(df.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker in level0:
+            sub = df[ticker].dropna(how="all")
+            if len(sub):
+                frames[ticker] = sub
+    return frames
+
+def _archive(archive, frames):
+    if archive is None:
+        return
+    for ticker, df in frames.items():
+        archive.append(ticker, df, source="yf")
+
+def _download_chunk(tickers, store, archive=None):
+    """
+    묶음 캔들 확보 -> {ticker: DataFrame}
+    캐시가 신선하면 그대로, 캐시가 있으면 가장 이른 마지막 봉 이후만, 없으면 PERIOD 전체를 받음.
+    """
+    frames = {}
+    warm = {}   # ticker -> 마지막 캐시 봉 시각
+    cold = []
+
+    for ticker in tickers:
+        key = (ticker, "YF", INTERVAL)
+        cached = store.get_fresh(key, timedelta(minutes=5))
+        if cached is not None:
+            frames[ticker] = cached
+            continue
+
+        _, since = store.plan(key, timedelta(minutes=5), 0)
+        if since is None:
+            cold.append(ticker)
+        else:
+            warm[ticker] = since
+
+    if warm:
+        with _YF_LOCK:
+            df = yf.download(list(warm), interval=INTERVAL, start=min(warm.values()), group_by="ticker",
+                             threads=True, prepost=True, progress=False)
+        downloaded = _split_download(df, list(warm))
+        _archive(archive, downloaded)
+
+        for ticker, since in warm.items():
+            sub = downloaded.get(ticker)
+            merged = store.apply((ticker, "YF", INTERVAL), sub[sub.index >= since] if sub is not None else None, since)
+            if merged is None or merged is False:
+                cold.append(ticker) # 캐시와 안 이어지거나 실패 -> 전체 재조회
+            else:
+                frames[ticker] = merged
+
+    if cold:
+        with _YF_LOCK:
+            df = yf.download(cold, interval=INTERVAL, period=PERIOD, group_by="ticker",
+                             threads=True, prepost=True, progress=False)
+        downloaded = _split_download(df, cold)
+        _archive(archive, downloaded)
+
+        for ticker in cold:
+            merged = store.apply((ticker, "YF", INTERVAL), downloaded.get(ticker), None)
+            if merged is not None and merged is not False:
+                frames[ticker] = merged
+
+    return frames
+
+def _evaluate_chunk(tickers, frames, n, k):
+    """묶음 일목 계산 + span_b_signal 일괄 판단 -> [(ticker, result or None)]"""
+    names, datas, closes = [], [], []
+    for ticker in tickers:
+        df = frames.get(ticker)
+        if df is None or len(df) < MIN_BARS:
+            continue
+
+        chart_data = ichimoku_arrays(df)
+        if not chart_data:
+            continue
+
+        names.append(ticker)
+        datas.append(chart_data)
+        closes.append(float(df['Close'].iloc[-1]))
+
+    signals = dict.fromkeys(tickers)
+    for ticker, curr_close, (is_floating, curr_span_b) in zip(names, closes, span_b_signal_many(datas, n, k)):
+        if is_floating:
+            # 이격도는 '현재가' 기준으로 계산 (가장 최근 봉)
+            gap_pct = ((curr_close - curr_span_b) / curr_span_b) * 100
+
+            signals[ticker] = {
+                "detected": True,
+                "flat_price": float(curr_span_b),
+                "gap_pct": round(gap_pct, 2),
+                "msg": f"5봉 연속 공중부양 (Gap +{round(gap_pct, 2)}%)"
+            }
+    return list(signals.items())
+
+async def scan_universe(tickers, store, n: int = 7, k: float = 2, archive=None):
+    """
+    비동기 제너레이터: 묶음이 끝나는 대로 (ticker, result or None) 를 흘려보냄.
+    다운로드는 _YF_LOCK 으로 한 번에 하나씩이지만, 앞 묶음 계산과 다음 묶음 다운로드는 겹쳐서 진행됨.
+    """
+    tickers = list(dict.fromkeys(t for t in tickers if t and t != "N/A"))
+    chunks = [tickers[i:i + CHUNK_SIZE] for i in range(0, len(tickers), CHUNK_SIZE)]
+
+    async def run(chunk):
+        try:
+            frames = await asyncio.to_thread(_download_chunk, chunk, store, archive)
+            return await asyncio.to_thread(_evaluate_chunk, chunk, frames, n, k)
+        except Exception as e:
+            print(f"Scan Error {chunk}: {e}")
+            return [(ticker, None) for ticker in chunk]
+
+    tasks = [asyncio.create_task(run(chunk)) for chunk in chunks]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            for ticker, result in await fut:
+                yield ticker, result
+    finally:
+        for t in tasks:
+            t.cancel()
@@ -0,0 +1,230 @@
+import json, os, tempfile, copy, time
+from datetime import datetime
+
+# ==========================================================
+# 봇 상태 저장소 (스냅샷 + 이벤트 저널)
+# - 매 루프마다 전체 JSON 을 다시 쓰지 않고, 바뀐 내용만 저널 파일에 한 줄씩 추가
+#   (주문 접수 / 체결 / stage 변경 / max_profit 갱신 / 삭제)
+# - 바뀐 게 없으면 아무것도 안 씀 (HEARTBEAT_SEC 마다 생존 표시 한 줄만)
+# - 저널이 COMPACT_EVERY 줄을 넘으면 스냅샷(bot_state.json, 기존 형식 그대로)으로 합치고 저널 비움
+# - 읽기: 스냅샷 + 스냅샷 이후 저널 이벤트 재생 (봇 재시작 / 대시보드 공용)
+# ==========================================================
+
+COMPACT_EVERY = 500     # 저널이 이 줄 수를 넘으면 스냅샷으로 합침
+HEARTBEAT_SEC = 60      # 변경이 없어도 이 간격마다 updated_at 갱신용 한 줄
+
+TABLES = ("acc_stock", "pending_orders")
+
+def journal_path(snapshot_path):
+    return snapshot_path + ".journal"
+
+def _event_kind(table, fields, is_new):
+    """사람이 읽기 쉬운 이벤트 종류 (재생에는 안 씀)"""
+    if table == "pending_orders":
+        return "order" if is_new else "order_update"
+    if is_new:
+        return "fill"
+    if "stage" in fields:
+        return "stage"
+    if set(fields) == {"max_profit"}:
+        return "max_profit"
+    return "position"
+
+def apply_event(state, event):
+    """이벤트 한 건을 상태 dict 에 반영"""
+    op = event.get("op")
+    if op == "set":
+        table = state.setdefault(event["table"], {})
+        table.setdefault(event["key"], {}).update(event["fields"])
+    elif op == "del":
+        state.setdefault(event["table"], {}).pop(event["key"], None)
+
+    if "at" in event:
+        state["updated_at"] = event["at"]
+    state["seq"] = max(state.get("seq", 0), event.get("seq", 0))
+
+def _read_snapshot(snapshot_path):
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception:
+        return None
+    for table in TABLES:
+        state.setdefault(table, {})
+    state.setdefault("seq", 0)
+    return state
+
+def _read_journal(path):
+    """저널 이벤트 리스트 (깨진 줄은 건너뜀 -> 그 뒤 이벤트는 그대로 재생)"""
+    events = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return events
+
+def _repair_journal(path):
+    """
+    쓰다 죽어서 줄바꿈 없이 끝난 마지막 줄 잘라냄.
+    그대로 두면 다음 append 가 그 줄에 붙어서 새 이벤트까지 깨진 줄이 됨.
+    """
+    try:
+        with open(path, "rb+") as f:
+            data = f.read()
+            if not data or data.endswith(b"\n"):
+                return
+            f.truncate(data.rfind(b"\n") + 1)
+    except FileNotFoundError:
+        pass
+
+def load_state(snapshot_path):
+    """
+    스냅샷 + 저널 재생 -> {"updated_at", "seq", "acc_stock", "pending_orders"}
+    둘 다 없으면 None.
+    """
+    state = _read_snapshot(snapshot_path)
+    events = _read_journal(journal_path(snapshot_path))
+    if state is None and not events:
+        return None
+
+    state = state or {"seq": 0, "acc_stock": {}, "pending_orders": {}}
+    base_seq = state["seq"]
+    for event in events:
+        # 합치기 도중 죽었으면 이미 스냅샷에 들어간 이벤트가 남아 있을 수 있음
+        if event.get("seq", 0) > base_seq:
+            apply_event(state, event)
+    return state
+
+class StateReader:
+    """대시보드용: 파일이 안 바뀌었으면 다시 파싱하지 않음"""
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self._sig = None
+        self._state = None
+
+    def _signature(self):
+        sig = []
+        for path in (self.snapshot_path, journal_path(self.snapshot_path)):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append(None)
+        return tuple(sig)
+
+    def read(self):
+        sig = self._signature()
+        if sig != self._sig:
+            self._state = load_state(self.snapshot_path)
+            self._sig = sig
+        return self._state
+
+class StateJournal:
+    def __init__(self, snapshot_path, compact_every: int = COMPACT_EVERY, heartbeat_sec: float = HEARTBEAT_SEC):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path(snapshot_path)
+        self.compact_every = compact_every
+        self.heartbeat_sec = heartbeat_sec
+
+        self.saved = {table: {} for table in TABLES}  # 마지막으로 기록한 상태
+        self.seq = 0
+        self.journal_lines = 0
+        self.last_write = 0.0
+
+    def load(self):
+        """재시작 시 디스크 상태 복원 -> (acc_stock, pending_orders)"""
+        _repair_journal(self.journal_path)
+        state = load_state(self.snapshot_path) or {"seq": 0, "acc_stock": {}, "pending_orders": {}}
+        self.saved = {table: copy.deepcopy(state.get(table, {})) for table in TABLES}
+        self.seq = state.get("seq", 0)
+        self.journal_lines = len(_read_journal(self.journal_path))
+        return copy.deepcopy(self.saved["acc_stock"]), copy.deepcopy(self.saved["pending_orders"])
+
+    def _diff(self, table, current):
+        saved = self.saved[table]
+        events = []
+        for key, entry in current.items():
+            old = saved.get(key)
+            fields = {k: v for k, v in entry.items() if old is None or old.get(k) != v}
+            if fields:
+                events.append({"op": "set", "kind": _event_kind(table, fields, old is None),
+                               "table": table, "key": key, "fields": fields})
+        for key in saved:
+            if key not in current:
+                events.append({"op": "del", "kind": "close" if table == "acc_stock" else "order_done",
+                               "table": table, "key": key})
+        return events
+
+    def record(self, acc_stock, pending_orders):
+        """
+        현재 상태와 마지막 기록을 비교해서 바뀐 것만 저널에 추가.
+        return: 기록한 이벤트 수 (0 이면 아무것도 안 씀, 하트비트 제외)
+        """
+        current = {"acc_stock": acc_stock, "pending_orders": pending_orders}
+        events = []
+        for table in TABLES:
+            events += self._diff(table, current[table])
+
+        now = time.monotonic()
+        if not events:
+            if now - self.last_write < self.heartbeat_sec:
+                return 0
+            events_to_write = [{"op": "beat"}]
+        else:
+            events_to_write = events
+
+        at = datetime.now().isoformat(timespec="seconds")
+        lines = []
+        for event in events_to_write:
+            self.seq += 1
+            event["seq"] = self.seq
+            event["at"] = at
+            lines.append(json.dumps(event, ensure_ascii=False))
+
+        dirpath = os.path.dirname(self.journal_path) or "."
+        os.makedirs(dirpath, exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        self.saved = {table: copy.deepcopy(current[table]) for table in TABLES}
+        self.journal_lines += len(lines)
+        self.last_write = now
+
+        if self.journal_lines >= self.compact_every:
+            self.compact()
+        return len(events)
+
+    def compact(self):
+        """
+        현재까지 상태를 스냅샷으로 원자적 저장 후 저널 비움.
+        스냅샷에 seq 를 같이 남겨서, 저널 비우기 전에 죽어도 재생 때 중복 반영 안 됨.
+        """
+        state = {
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "seq": self.seq,
+            "acc_stock": self.saved["acc_stock"],
+            "pending_orders": self.saved["pending_orders"],
+        }
+
+        dirpath = os.path.dirname(self.snapshot_path) or "."
+        os.makedirs(dirpath, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(prefix="bot_state_", suffix=".json", dir=dirpath)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.snapshot_path)  # atomic replace
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+            raise
+
+        open(self.journal_path, "w").close()
+        self.journal_lines = 0
@@ -0,0 +1,156 @@
+import math
+from datetime import datetime
+
+# ==========================================================
+# 매매 전략 파라미터 + 매도 판단 로직
+# 실매매(main.py) 와 백테스트(backtest.py) 가 같은 코드를 쓰도록 분리.
+# 여기 함수들은 주문을 내지 않고 "무엇을 해야 하는지"만 계산함.
+# ==========================================================
+
+MAX_SLOTS = 5
+
+# 손익비 및 트레일링 단계 비율
+REMAINING_RATIO = {0: 1.0, 1: 0.70, 2: 0.50, 3: 0.30, 4: 0.15, 5: 0.0}
+PROFIT_STEPS = [
+    # (target_stage, trigger_profit_pct, sell_ratio_on_init_qty)
+    (1, 30.0, 0.30),
+    (2, 60.0, 0.20),
+    (3, 100.0, 0.20),
+    (4, 150.0, 0.15),
+    (5, 200.0, 0.15),
+]
+
+# stage별 트레일링 드로다운(최고수익률 대비 몇 % 하락하면 전량 정리)
+TRAILING_DD = {
+    1: 12.0,  # stage1: 최고수익률에서 12%p 빠지면
+    2: 15.0,
+    3: 18.0,
+    4: 22.0,
+    5: 28.0,
+}
+
+SMALL_INIT_QTY_THRESHOLD = 25   # 초기수량(추정)이 이 이하면 "소량"으로 간주
+MIN_REMAIN_SHARES = 1           # stage 1~4에서는 최소 1주 남기기(전량 방지)
+
+LOSS_RATIO = 10  # %
+
+# 본절 스탑: stage 0 에서 최고수익률이 TRIGGER 이상 찍고 FLOOR 이하로 내려오면 전량 정리
+BREAKEVEN_TRIGGER = 15.0
+BREAKEVEN_FLOOR = 1.0
+
+SIGNAL_N = 7 # Flat 유지 기간
+SIGNAL_K = 2 # 오차 범위 (%)
+ORDER_LIFETIME_LIMIT = 2 * 60 * 60 # 2시간
+
+# 매매 시간 (KST): 오후 6시~자정, 자정~오전 5시 (미국장 프리/정규/애프터)
+# 장 마감 후 정리: 오전 5시~6시 사이에 남은 보유/미체결 정리
+TRADING_WINDOWS = [("18:00:00", "23:59:59"), ("00:00:00", "05:00:00")]
+CLOSE_OUT_WINDOW = ("05:00:01", "06:00:00")
+
+def _hms(s):
+    return datetime.strptime(s, "%H:%M:%S").time()
+
+def is_trading_time(now=None):
+    """오후 6시~자정, 자정~오전 5시 (미국장 프리/정규/애프터)"""
+    now = now or datetime.now().time()
+    return any(_hms(start) <= now <= _hms(end) for start, end in TRADING_WINDOWS)
+
+def is_close_out_time(now=None):
+    """장 마감 후 보유/미체결 정리 시간"""
+    now = now or datetime.now().time()
+    start, end = CLOSE_OUT_WINDOW
+    return _hms(start) <= now <= _hms(end)
+
+def remaining_ratio(profit_steps=PROFIT_STEPS):
+    """PROFIT_STEPS 의 매도 비율로 stage별 남은 비율 계산 (기본값이면 REMAINING_RATIO 그대로)"""
+    if profit_steps is PROFIT_STEPS:
+        return REMAINING_RATIO
+
+    ratios = {0: 1.0}
+    remain = 1.0
+    for target_stage, _, sell_ratio in profit_steps:
+        remain = max(0.0, round(remain - sell_ratio, 10))
+        ratios[target_stage] = remain
+    return ratios
+
+def calc_sell_qty(estimated_init_qty: float, sell_ratio: float, cur_qty: int, target_stage: int) -> int:
+    """
+    소량 포지션에서 ceil로 인한 과매도 왜곡을 완화하고,
+    마지막 stage(5) 이전에는 최소 1주 남기도록 보호.
+    """
+    desired = estimated_init_qty * sell_ratio
+
+    # 1) 소량 포지션은 round 기반(왜곡 완화)
+    if estimated_init_qty <= SMALL_INIT_QTY_THRESHOLD:
+        sell_qty = int(round(desired))
+        # 원하는 게 0.x로 나와도 비중 익절 의도가 있으면 1주는 팔게
+        if sell_qty <= 0 and desired > 0:
+            sell_qty = 1
+    else:
+        # 2) 일반 포지션은 기존대로 ceil(원금기준 비율 매도 유지)
+        sell_qty = math.ceil(desired)
+
+    # 3) 마지막 졸업(stage=5) 전에는 전량 방지(최소 1주 남기기)
+    if target_stage < 5 and cur_qty > MIN_REMAIN_SHARES:
+        max_sell = cur_qty - MIN_REMAIN_SHARES
+        if sell_qty > max_sell:
+            sell_qty = max_sell
+
+    # 4) 방어
+    if sell_qty > cur_qty:
+        sell_qty = cur_qty
+    if sell_qty < 0:
+        sell_qty = 0
+
+    return sell_qty
+
+def exit_signal(profit_pct, max_profit, stage,
+                loss_ratio=LOSS_RATIO, trailing_dd=TRAILING_DD,
+                breakeven_trigger=BREAKEVEN_TRIGGER, breakeven_floor=BREAKEVEN_FLOOR):
+    """
+    전량 정리 조건 확인 (max_profit 은 이번 가격까지 반영된 최고 수익률)
+    return: "stop_loss" / "breakeven" / "trailing" / None
+    """
+    # 1. 🛑 손절
+    if profit_pct <= -loss_ratio:
+        return "stop_loss"
+
+    # 2. 🛡️ 본절 스탑
+    if stage == 0 and max_profit >= breakeven_trigger and profit_pct <= breakeven_floor:
+        return "breakeven"
+
+    # 3. 📉 트레일링 스탑
+    if stage >= 1:
+        dd = trailing_dd.get(stage, None)
+        if dd is not None and (max_profit - profit_pct) >= dd:
+            return "trailing"
+
+    return None
+
+def ladder_steps(qty, stage, profit_pct, profit_steps=PROFIT_STEPS, remaining=None):
+    """
+    분할익절 계획: 이번 가격에서 넘은 단계들을 순서대로 (앞 단계 매도가 성공했다고 가정)
+    return: [(target_stage, trigger_profit, sell_qty)] (sell_qty 0 이면 stage 만 올림)
+    실매매에서는 중간 주문이 실패하면 거기서 멈추면 됨.
+    """
+    remaining = remaining or remaining_ratio(profit_steps)
+
+    steps = []
+    cur_qty = qty
+    cur_stage = stage
+    for target_stage, trigger_profit, sell_ratio in profit_steps:
+        # 아직 그 단계 안 갔고, 수익률이 트리거 이상이면 실행
+        if cur_stage < target_stage and profit_pct >= trigger_profit:
+
+            # 역산 공식 그대로 사용 (현재 stage에서 남아있어야 하는 비율 기반)
+            current_ratio_factor = remaining.get(cur_stage, 1.0)
+            estimated_init_qty = cur_qty / current_ratio_factor
+
+            sell_qty = calc_sell_qty(estimated_init_qty, sell_ratio, cur_qty, target_stage)
+            steps.append((target_stage, trigger_profit, sell_qty))
+
+            cur_stage = target_stage
+            cur_qty -= sell_qty
+            if cur_qty <= 0:
+                break
+    return steps
@@ -0,0 +1,252 @@
+import argparse, itertools, os, random, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import backtest, strategy
+from utils import ichimoku_arrays
+
+# ==========================================================
+# 전략 파라미터 스윕 (그리드 / 랜덤)
+# SIGNAL_N, SIGNAL_K, MAX_SLOTS, PROFIT_STEPS 트리거, TRAILING_DD 조합마다 backtest.run_backtest 실행.
+#
+# - 5분봉은 부모 프로세스에서 한 번 읽어서 공유 메모리 2개(시각 int64, OHLCV float64)에 이어 붙여 둠
+#   -> 워커는 작업마다 DataFrame 을 피클로 받지 않고, 시작할 때 공유 메모리를 붙여서 종목별 뷰만 만듦
+# - 일목 배열은 파라미터와 무관해서 워커마다 시작할 때 한 번만 계산
+# - 결과는 rank_by 기준으로 정렬한 CSV
+#
+# 실행 예:
+#   python sweep.py --data ./candles --n 5,7,9 --k 1,2,3 --slots 3,5 \
+#       --triggers "30/60/100/150/200;20/40/80/120/160" --dd "12/15/18/22/28;8/10/12/15/20"
+# ==========================================================
+
+OHLCV = ("Open", "High", "Low", "Close", "Volume")
+DEFAULT_RANK_BY = "total_return_pct"
+
+# ==========================================================
+# 공유 메모리
+# ==========================================================
+def share_frames(frames):
+    """
+    {ticker: DataFrame} -> (meta, [SharedMemory])
+    meta 는 워커에 넘길 작은 dict (공유 메모리 이름 + 종목별 구간)
+    시각은 전부 UTC 로 맞춰서 저장 (tz 없는 봉은 backtest 처럼 KST 로 보고 변환)
+    -> 아카이브(UTC)와 KIS(naive KST) 데이터가 섞여도 종목마다 매매 시간 판단이 맞음
+    """
+    tickers = [t for t, df in frames.items() if len(df)]
+    lengths = [len(frames[t]) for t in tickers]
+    total = max(1, sum(lengths))
+
+    ts_shm = shared_memory.SharedMemory(create=True, size=total * 8)
+    px_shm = shared_memory.SharedMemory(create=True, size=total * len(OHLCV) * 8)
+    ts_all = np.ndarray((total,), dtype=np.int64, buffer=ts_shm.buf)
+    px_all = np.ndarray((total, len(OHLCV)), dtype=np.float64, buffer=px_shm.buf)
+
+    spans = {}
+    start = 0
+    for ticker, length in zip(tickers, lengths):
+        df = frames[ticker]
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is None:
+            index = index.tz_localize(backtest.KST)
+        ts_all[start:start + length] = backtest.epoch_ns(index)
+        px_all[start:start + length] = df[list(OHLCV)].to_numpy(dtype=np.float64)
+        spans[ticker] = (start, length)
+        start += length
+
+    meta = {"ts": ts_shm.name, "px": px_shm.name, "total": total, "spans": spans, "order": tickers}
+    return meta, [ts_shm, px_shm]
+
+def release(shms):
+    for shm in shms:
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def attach_frames(meta):
+    """공유 메모리 -> ({ticker: DataFrame}, [SharedMemory]) (OHLCV 는 복사 없이 공유 메모리 뷰)"""
+    ts_shm = shared_memory.SharedMemory(name=meta["ts"])
+    px_shm = shared_memory.SharedMemory(name=meta["px"])
+    ts_all = np.ndarray((meta["total"],), dtype=np.int64, buffer=ts_shm.buf)
+    px_all = np.ndarray((meta["total"], len(OHLCV)), dtype=np.float64, buffer=px_shm.buf)
+
+    frames = {}
+    for ticker in meta["order"]:
+        start, length = meta["spans"][ticker]
+        index = pd.DatetimeIndex(ts_all[start:start + length].view("datetime64[ns]"), name="Datetime").tz_localize("UTC")
+        frames[ticker] = pd.DataFrame(px_all[start:start + length], index=index, columns=list(OHLCV), copy=False)
+    return frames, [ts_shm, px_shm]
+
+# ==========================================================
+# 워커
+# ==========================================================
+_WORKER = {}
+
+def _init_worker(meta, initial_cash):
+    frames, shms = attach_frames(meta)
+    _WORKER["frames"] = frames
+    _WORKER["shms"] = shms  # 참조 유지 (닫히면 뷰가 깨짐)
+    _WORKER["order"] = meta["order"]
+    _WORKER["arrays"] = {t: ichimoku_arrays(df) for t, df in frames.items() if len(df) >= backtest.MIN_BARS}
+    _WORKER["cash"] = initial_cash
+
+def _run_one(run_id, params):
+    started = time.perf_counter()
+    try:
+        result = backtest.run_backtest(_WORKER["frames"], params, initial_cash=_WORKER["cash"],
+                                       tickers_order=_WORKER["order"], verbose=False, arrays=_WORKER["arrays"])
+        summary = result["summary"]
+        error = None
+    except Exception as e:
+        summary = {}
+        error = str(e)
+    return run_id, params, summary, error, time.perf_counter() - started
+
+# ==========================================================
+# 파라미터 조합
+# ==========================================================
+def _with_triggers(triggers):
+    """PROFIT_STEPS 의 트리거 수익률만 교체 (stage / 매도 비율은 유지)"""
+    if len(triggers) != len(strategy.PROFIT_STEPS):
+        raise ValueError(f"트리거는 {len(strategy.PROFIT_STEPS)}개여야 함: {'/'.join(f'{t:g}' for t in triggers)}")
+    return [(stage, float(trigger), ratio) for (stage, _, ratio), trigger in zip(strategy.PROFIT_STEPS, triggers)]
+
+def _with_dd(values):
+    if len(values) != len(strategy.TRAILING_DD):
+        raise ValueError(f"트레일링 DD 는 {len(strategy.TRAILING_DD)}개여야 함: {'/'.join(f'{v:g}' for v in values)}")
+    return {stage: float(dd) for stage, dd in zip(sorted(strategy.TRAILING_DD), values)}
+
+def build_grid(space, samples=None, seed=0):
+    """
+    space: {"n": [..], "k": [..], "max_slots": [..], "triggers": [(..5개), ..], "trailing_dd": [(..5개), ..]}
+    samples 가 있으면 전체 조합 중 그만큼 랜덤 추출.
+    return: [params dict] (backtest.run_backtest 에 바로 넘기는 형태)
+    """
+    keys = list(space)
+    combos = list(itertools.product(*(space[k] for k in keys)))
+    if samples and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+
+    grid = []
+    for combo in combos:
+        params = {}
+        for key, value in zip(keys, combo):
+            if key == "triggers":
+                params["profit_steps"] = _with_triggers(value)
+            elif key == "trailing_dd":
+                params["trailing_dd"] = _with_dd(value)
+            else:
+                params[key] = value
+        grid.append(params)
+    return grid
+
+def _label(params):
+    """결과 표에 남길 파라미터 열 (리스트/dict 는 '/' 로 이어서 한 칸)"""
+    row = {}
+    for key, value in params.items():
+        if key == "profit_steps":
+            row["triggers"] = "/".join(f"{t:g}" for _, t, _ in value)
+        elif key == "trailing_dd":
+            row["trailing_dd"] = "/".join(f"{value[s]:g}" for s in sorted(value))
+        else:
+            row[key] = value
+    return row
+
+# ==========================================================
+# 실행
+# ==========================================================
+def run_sweep(frames, grid, initial_cash=10_000.0, workers=None, rank_by=DEFAULT_RANK_BY, out=None):
+    """조합별 백테스트를 프로세스 풀로 실행 -> rank_by 내림차순 DataFrame (out 이 있으면 CSV 저장)"""
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    meta, shms = share_frames(frames)
+    print(f"🧮 [Sweep] {len(grid)}개 조합 / 종목 {len(meta['order'])}개 / 봉 {meta['total']}개 / 워커 {workers}개")
+
+    rows = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(meta, initial_cash)) as pool:
+            futures = [pool.submit(_run_one, i, params) for i, params in enumerate(grid)]
+            for done, future in enumerate(as_completed(futures), 1):
+                run_id, params, summary, error, elapsed = future.result()
+                if error:
+                    print(f"❌ [Sweep] #{run_id} 실패: {error}")
+
+                row = {"run_id": run_id, **_label(params)}
+                row.update({k: v for k, v in summary.items() if k != "exit_kinds"})
+                for kind, count in summary.get("exit_kinds", {}).items():
+                    row[f"exit_{kind}"] = count
+                row["run_sec"] = round(elapsed, 3)
+                row["error"] = error
+                rows.append(row)
+
+                if done % max(1, len(grid) // 10) == 0 or done == len(grid):
+                    print(f"   {done}/{len(grid)} 완료 ({time.perf_counter() - started:.1f}s)")
+    finally:
+        release(shms)
+
+    results = pd.DataFrame(rows)
+    if rank_by in results:
+        results = results.sort_values(rank_by, ascending=False, na_position="last").reset_index(drop=True)
+        results.insert(0, "rank", np.arange(1, len(results) + 1))
+
+    if out:
+        dirpath = os.path.dirname(out) or "."
+        os.makedirs(dirpath, exist_ok=True)
+        results.to_csv(out, index=False)
+        print(f"💾 [Sweep] {out} 저장")
+
+    print(f"✅ [Sweep] {len(grid)}개 조합 완료 ({time.perf_counter() - started:.1f}s)")
+    return results
+
+def _ints(text):
+    return [int(v) for v in text.split(",") if v]
+
+def _floats(text):
+    return [float(v) for v in text.split(",") if v]
+
+def _tuples(text):
+    """'30/60/100/150/200;20/40/80/120/160' -> [(30, 60, ...), (20, 40, ...)]"""
+    return [tuple(float(v) for v in group.split("/")) for group in text.split(";") if group]
+
+if __name__ == "__main__":
+    default_triggers = "/".join(f"{t:g}" for _, t, _ in strategy.PROFIT_STEPS)
+    default_dd = "/".join(f"{strategy.TRAILING_DD[s]:g}" for s in sorted(strategy.TRAILING_DD))
+
+    parser = argparse.ArgumentParser(description="Span B 전략 파라미터 스윕")
+    backtest.add_data_args(parser)
+    parser.add_argument("--cash", type=float, default=10_000.0)
+    parser.add_argument("--n", default=str(strategy.SIGNAL_N), help="SIGNAL_N 후보 (예: 5,7,9)")
+    parser.add_argument("--k", default=str(strategy.SIGNAL_K), help="SIGNAL_K 후보 (예: 1,2,3)")
+    parser.add_argument("--slots", default=str(strategy.MAX_SLOTS), help="MAX_SLOTS 후보")
+    parser.add_argument("--triggers", default=default_triggers, help="PROFIT_STEPS 트리거 후보 (';' 로 구분)")
+    parser.add_argument("--dd", default=default_dd, help="TRAILING_DD 후보 (';' 로 구분)")
+    parser.add_argument("--random", type=int, help="전체 조합 중 이만큼만 랜덤 추출")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--no-session", action="store_true", help="매매 시간 제한/장 마감 정리 끄기")
+    parser.add_argument("--rank-by", default=DEFAULT_RANK_BY)
+    parser.add_argument("--out", default="./sweep_results.csv")
+    args = parser.parse_args()
+
+    space = {
+        "n": _ints(args.n),
+        "k": _floats(args.k),
+        "max_slots": _ints(args.slots),
+        "triggers": _tuples(args.triggers),
+        "trailing_dd": _tuples(args.dd),
+    }
+    try:
+        grid = build_grid(space, args.random, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.no_session:
+        grid = [dict(params, session=False) for params in grid]
+
+    frames = backtest.load_frames(args, parser)
+
+    results = run_sweep(frames, grid, args.cash, args.workers, args.rank_by, args.out)
+    print(results.head(10).to_string(index=False))
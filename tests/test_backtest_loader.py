@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+import backtest
+
+
+def _frame(index):
+    close = np.linspace(10.0, 20.0, len(index))
+    return pd.DataFrame({"Open": close, "High": close + 0.5, "Low": close - 0.5, "Close": close,
+                         "Volume": np.arange(len(index), dtype=np.float64)},
+                        index=pd.Index(index, name="Datetime"))
+
+
+def test_load_dir_csv_across_dst(tmp_path):
+    # 2025-03-09 미국 서머타임 시작: CSV 오프셋이 -05:00 -> -04:00 으로 바뀜
+    index = pd.date_range("2025-03-07 09:30", "2025-03-11 16:00", freq="5min", tz="America/New_York")
+    _frame(index).to_csv(tmp_path / "aaa.csv")
+    text = (tmp_path / "aaa.csv").read_text()
+    assert "-05:00" in text and "-04:00" in text
+
+    frames = backtest.load_dir(str(tmp_path))
+
+    df = frames["AAA"]
+    assert str(df.index.tz) == backtest.EXCHANGE_TZ
+    assert df.index.is_monotonic_increasing
+    assert (backtest.epoch_ns(df.index) == backtest.epoch_ns(index)).all()
+    np.testing.assert_allclose(df["Close"].to_numpy(), _frame(index)["Close"].to_numpy())
+
+
+def test_load_dir_naive_csv_stays_naive(tmp_path):
+    index = pd.date_range("2025-03-08 23:30", periods=50, freq="5min")
+    _frame(index).to_csv(tmp_path / "bbb.csv")
+
+    df = backtest.load_dir(str(tmp_path))["BBB"]
+
+    assert df.index.tz is None
+    assert (df.index == index).all()
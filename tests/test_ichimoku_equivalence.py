@@ -0,0 +1,224 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import backtest
+from utils import (ICHIMOKU_SHIFT, IchimokuStream, ichimoku, ichimoku_arrays,
+                   span_b_signal, span_b_signal_many, to_chart_data)
+
+# ==========================================================
+# 랜덤 캔들로 새 구현과 기존(리스트/pandas) 구현 결과가 같은지 확인
+# NaN 봉, tz 있는/없는 인덱스, 횡보 구간(Span B 평행 -> 시그널)이 섞이게 만듦
+# ==========================================================
+
+TRIALS = 300
+CONF = {"delta": timedelta(minutes=5)}
+TIMEZONES = (None, "UTC", "America/New_York")
+
+
+def random_candles(rng, bars=None):
+    """랜덤 5분봉 (인덱스 이름 Datetime). 일부는 횡보 구간 + NaN 봉"""
+    bars = bars or int(rng.integers(1, 260))
+    steps = rng.normal(0, rng.choice([0.001, 0.01, 0.03]), bars)
+    steps[rng.random(bars) < rng.random() * 0.8] = 0.0      # 횡보 구간
+    close = 10.0 * np.exp(np.cumsum(steps))
+    spread = np.abs(rng.normal(0, 0.005, bars)) * close
+    high, low = close + spread, close - spread
+    open_ = close * (1 + rng.normal(0, 0.002, bars))
+    volume = rng.integers(0, 10_000, bars).astype(np.float64)
+
+    if rng.random() < 0.5:
+        for col in (high, low, close):
+            col[rng.random(bars) < 0.02] = np.nan
+
+    tz = TIMEZONES[int(rng.integers(len(TIMEZONES)))]
+    dates = pd.date_range("2025-03-07 04:00", periods=bars, freq="5min", tz=tz, name="Datetime")
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=dates)
+
+
+def reference_ichimoku(df, conf):
+    """NumPy 전환 전 ichimoku (pandas rolling + 리스트)"""
+
+    def clean_list(data_list):
+        return [None if pd.isna(x) else float(x) for x in data_list]
+
+    if df.empty:
+        return None
+
+    df = df.reset_index()
+    date_col = 'Datetime' if 'Datetime' in df.columns else 'Date'
+
+    tenkan = (df['High'].rolling(window=9).max() + df['Low'].rolling(window=9).min()) / 2
+    kijun = (df['High'].rolling(window=26).max() + df['Low'].rolling(window=26).min()) / 2
+    span_a_calc = (tenkan + kijun) / 2
+    span_b_calc = (df['High'].rolling(window=52).max() + df['Low'].rolling(window=52).min()) / 2
+
+    last_date = df[date_col].iloc[-1]
+    future_dates = [last_date + conf['delta'] * i for i in range(1, 27)]
+    full_dates = df[date_col].tolist() + future_dates
+
+    pad_none = [None] * 26
+    return {
+        "dates": [d.strftime('%Y-%m-%d %H:%M') for d in full_dates],
+        "open": clean_list(df['Open'].tolist()) + pad_none,
+        "high": clean_list(df['High'].tolist()) + pad_none,
+        "low": clean_list(df['Low'].tolist()) + pad_none,
+        "close": clean_list(df['Close'].tolist()) + pad_none,
+        "volume": clean_list(df['Volume'].tolist()) + pad_none,
+        "span_a": pad_none + clean_list(span_a_calc.tolist()),
+        "span_b": pad_none + clean_list(span_b_calc.tolist()),
+    }
+
+
+def reference_span_b_signal(data, n, k):
+    """NumPy 전환 전 span_b_signal (None 이 낀 리스트 입력)"""
+    span_a_values = data['span_a']
+    span_b_values = data['span_b']
+    close_values = data['close']
+
+    if len(span_b_values) < n or len(close_values) < 1:
+        return False, None
+
+    last_span_b = span_b_values[-1]
+    last_close = close_values[-1-26]
+    if last_span_b is None or last_close is None:
+        return False, None
+
+    recent_span_b_raw = [val for val in span_b_values[-n:] if val is not None]
+    recent_span_a_raw = [val for val in span_a_values[-n:] if val is not None]
+    if not recent_span_b_raw or not recent_span_a_raw:
+        return False, None
+
+    current_span_b_val = recent_span_b_raw[-1]
+
+    is_flat = True
+    for val_a, val in zip(recent_span_a_raw, recent_span_b_raw):
+        if not (current_span_b_val * (1 - k/100) <= val <= current_span_b_val * (1 + k/100)) or val_a <= val:
+            is_flat = False
+            break
+    if not is_flat:
+        return False, None
+    if not last_close > current_span_b_val * (1 - k/100):
+        return False, current_span_b_val
+
+    recent_lows = [val for val in close_values[-n-26:-26] if val is not None]
+    if not recent_lows:
+        return False, None
+    return all(low > current_span_b_val * (1 - k/100) for low in recent_lows), current_span_b_val
+
+
+def assert_same_values(actual, expected, label):
+    """배열/리스트 비교 (NaN 과 None 은 같은 빈 값으로)"""
+    actual = np.asarray([np.nan if v is None else v for v in actual], dtype=np.float64)
+    expected = np.asarray([np.nan if v is None else v for v in expected], dtype=np.float64)
+    assert actual.shape == expected.shape, label
+    np.testing.assert_array_equal(actual, expected, err_msg=label)
+
+
+def test_ichimoku_matches_reference():
+    rng = np.random.default_rng(6)
+    for trial in range(TRIALS):
+        df = random_candles(rng)
+
+        actual = ichimoku(df.copy(), CONF)
+        expected = reference_ichimoku(df.copy(), CONF)
+
+        assert actual["dates"] == expected["dates"], f"trial {trial}"
+        for col in ("open", "high", "low", "close", "volume", "span_a", "span_b"):
+            assert all(v is None or type(v) is float for v in actual[col]), f"trial {trial} {col}"
+            assert_same_values(actual[col], expected[col], f"trial {trial} {col}")
+
+
+def assert_stream_matches(stream, df, label):
+    """스트림 결과 == 같은 봉으로 ichimoku_arrays (스트림은 최근 history+1 봉만 보관하므로 뒤쪽만 비교)"""
+    actual, expected = stream.arrays(), ichimoku_arrays(df.copy())
+    bars = len(actual["dates"])
+    assert bars == min(len(df), stream.history + 1), label
+    assert (actual["dates"] == expected["dates"][-bars:]).all(), label
+    for col in ("open", "high", "low", "close", "volume"):
+        assert_same_values(actual[col], expected[col][-bars - ICHIMOKU_SHIFT:], f"{label} {col}")
+    for col in ("tenkan", "kijun"):
+        assert_same_values(actual[col], expected[col][-bars:], f"{label} {col}")
+    for col in ("span_a", "span_b"):
+        assert_same_values(actual[col][ICHIMOKU_SHIFT:], expected[col][-bars:], f"{label} {col}")
+
+
+def test_stream_matches_batch():
+    rng = np.random.default_rng(7)
+    for trial in range(TRIALS):
+        df = random_candles(rng)
+        stream = IchimokuStream(history=int(rng.choice([20, 60, 300])))
+
+        end = 0
+        while end < len(df):
+            end = min(len(df), end + int(rng.integers(1, 40)))
+            if rng.random() < 0.5:
+                # 진행 중인 마지막 봉을 먼저 받고, 다음 조회에서 확정값으로 갱신되는 경우
+                forming = df.iloc[:end].copy()
+                forming.iloc[-1, forming.columns.get_loc("High")] -= 0.01
+                forming.iloc[-1, forming.columns.get_loc("Close")] += 0.005
+                stream.ingest_df(forming)
+            stream.ingest_df(df.iloc[:end])
+            assert_stream_matches(stream, df.iloc[:end], f"trial {trial} bars {end}")
+
+
+def test_stream_restarts_after_gap():
+    df = random_candles(np.random.default_rng(70), bars=200)
+    stream = IchimokuStream()
+    stream.ingest_df(df.iloc[:100])
+
+    # 중간 봉이 빠진 조회 -> 처음부터 다시 쌓음
+    stream.ingest_df(df.iloc[150:])
+
+    assert len(stream) == 50
+    assert_stream_matches(stream, df.iloc[150:], "gap")
+
+
+def test_span_b_signal_matches_reference():
+    rng = np.random.default_rng(8)
+    outcomes = set()
+    for trial in range(TRIALS):
+        datas = [ichimoku_arrays(random_candles(rng)) for _ in range(int(rng.integers(1, 8)))]
+        n, k = int(rng.integers(1, 30)), float(rng.choice([0.5, 1, 2, 5]))
+
+        batch = span_b_signal_many(datas, n, k)
+        for i, data in enumerate(datas):
+            expected = reference_span_b_signal(to_chart_data(data, CONF), n, k)
+            assert span_b_signal(data, n, k) == expected, f"trial {trial} row {i} n={n} k={k}"
+            assert batch[i] == expected, f"trial {trial} row {i} n={n} k={k} (batch)"
+            outcomes.add((expected[0], expected[1] is None))
+
+    # 시그널 / 평행이지만 조건 미달 / 평행 아님이 전부 나와야 의미 있는 비교
+    assert outcomes == {(True, False), (False, False), (False, True)}
+
+
+def test_span_b_signal_many_empty():
+    assert span_b_signal_many([], 7, 2) == []
+
+
+def test_backtest_signals_match_live_check():
+    """백테스트 봉별 시그널 == 그 봉까지의 캔들로 실매매가 span_b_signal 을 돌린 결과"""
+    rng = np.random.default_rng(21)
+    checked = signals = 0
+    for trial in range(30):
+        df = random_candles(rng, bars=int(rng.integers(40, 200)))
+        n, k = int(rng.integers(1, 30)), float(rng.choice([0.5, 1, 2, 5]))
+
+        actual, prices = backtest.compute_signals(ichimoku_arrays(df.copy()), n, k)
+        for t in range(len(df)):
+            if t < backtest.MIN_BARS - 1 or len(df) < max(n, backtest.MIN_BARS):
+                assert not actual[t], f"trial {trial} bar {t}"
+                continue
+            signal, value = span_b_signal(ichimoku_arrays(df.iloc[:t + 1].copy()), n, k)
+            label = f"trial {trial} bar {t} n={n} k={k}"
+            assert actual[t] == signal, label
+            assert_same_values([prices[t]], [value], label)
+            checked += 1
+            signals += signal
+
+    assert checked > 1000 and signals > 0
+
+
+def test_ichimoku_empty_frame():
+    assert ichimoku(random_candles(np.random.default_rng(0)).iloc[:0], CONF) is None
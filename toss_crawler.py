@@ -1,4 +1,7 @@
-import time
+import time, threading
+import os, json, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import requests
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -9,103 +12,339 @@ warnings.filterwarnings("ignore")
 
 MAX_MARKET_CAP_USD = 50_000_000 
 
-def scrape_toss_data():
-    """
-    기존 스크래핑 로직을 함수화하여 데이터를 리스트로 반환
-    """
-    results = []
-    
-    # ---------------------------------------------------------
-    # [Step 1] 셀레니움으로 쿠키 획득
-    # ---------------------------------------------------------
+BASE_URL = "https://tossinvest.com/?market=us&live-chart=biggest_total_amount"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+COOKIE_TTL_SEC = 30 * 60        # 셀레니움 쿠키 재사용 최대 시간 (초)
+AUTH_FAIL_STATUS = (401, 403)   # 이 응답이면 쿠키 만료로 보고 재발급
+
+RANK_API_URL = "https://wts-cert-api.tossinvest.com/api/v2/dashboard/wts/overview/ranking"
+INFO_API_URL = "https://wts-info-api.tossinvest.com/api/v1/stock-infos"
+
+def _parse_ranking_sources(spec: str):
+    """'id:duration,id:duration' -> [(id, duration)] (duration 생략 시 realtime)"""
+    sources = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        ranking_id, _, duration = part.partition(":")
+        sources.append((ranking_id.strip(), duration.strip() or "realtime"))
+    return sources
+
+# 크롤링할 랭킹 목록 (앞에 있을수록 우선순위 높음)
+# 예: TOSS_RANKINGS="biggest_total_amount:realtime,rising:realtime"
+RANKING_SOURCES = _parse_ranking_sources(os.environ.get("TOSS_RANKINGS", "biggest_total_amount:realtime"))
+
+# 종목 메타데이터(심볼/상장주식수/그룹/거래소) 디스크 캐시 -> stock-infos 는 처음 보는 종목만 조회
+TOSS_META_CACHE_PATH = os.environ.get("TOSS_META_CACHE_PATH", "./toss_meta.json")
+META_TTL_SEC = 24 * 60 * 60     # 하루 지난 메타데이터는 다시 조회
+META_MISSING_TTL_SEC = 6 * 60 * 60  # stock-infos 가 안 돌려준 종목은 이 시간 동안 다시 조회 안 함
+META_EVICT_SEC = 7 * META_TTL_SEC   # 이보다 오래 안 쓰인(갱신 안 된) 항목은 저장할 때 버림
+
+# 랭킹 스냅샷 공유 파일 (봇 크롤러가 쓰고 대시보드가 읽음)
+TOSS_SNAPSHOT_PATH = os.environ.get("TOSS_SNAPSHOT_PATH", "./toss_snapshot.json")
+SNAPSHOT_MAX_AGE_SEC = 5 * 60   # 이보다 오래된 스냅샷은 새로 크롤링
+
+try:
+    import fcntl # 프로세스 간 파일 락 (리눅스/도커)
+except ImportError:
+    fcntl = None
+
+# 전역 변수 (세션/쿠키 캐싱용)
+_SESSION = None
+_SESSION_EXPIRY = 0.0
+_SESSION_LOCK = threading.Lock()
+
+def _fetch_selenium_cookies():
+    """셀레니움(헤드리스 크롬)으로 토스 페이지를 열어 쿠키 획득"""
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--no-sandbox")
-    user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    chrome_options.add_argument(f'user-agent={user_agent}')
+    chrome_options.add_argument(f'user-agent={USER_AGENT}')
 
     # webdriver_manager를 사용하여 드라이버 자동 관리
     driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
     
-    base_url = "https://tossinvest.com/?market=us&live-chart=biggest_total_amount"
     try:
-        driver.get(base_url)
+        driver.get(BASE_URL)
         time.sleep(3)
-        selenium_cookies = driver.get_cookies()
+        return driver.get_cookies()
     finally:
         driver.quit()
 
-    # ---------------------------------------------------------
-    # [Step 2] Requests 세션 설정
-    # ---------------------------------------------------------
-    session = requests.Session()
-    for cookie in selenium_cookies:
-        session.cookies.set(cookie['name'], cookie['value'])
-
-    headers = {
-        'User-Agent': user_agent,
-        'Referer': base_url,
-        'Content-Type': 'application/json',
-        'Origin': 'https://tossinvest.com',
-        'Accept': 'application/json'
+def get_toss_session(force_refresh: bool = False, failed_session=None):
+    """
+    쿠키가 실린 requests.Session 재사용 (싱글톤).
+    처음이거나, 쿠키가 만료됐거나(COOKIE_TTL_SEC 또는 쿠키 자체 expiry), force_refresh 일 때만 크롬 실행.
+    failed_session: 인증 실패한 세션. 락을 기다리는 동안 다른 스레드가 이미 새로 받았으면 그걸 그대로 씀
+                    (쿠키 만료 때 랭킹 스레드마다 크롬을 띄우지 않게)
+    """
+    global _SESSION, _SESSION_EXPIRY
+
+    with _SESSION_LOCK:
+        if _SESSION is not None and time.time() < _SESSION_EXPIRY:
+            if not force_refresh:
+                return _SESSION
+            if failed_session is not None and _SESSION is not failed_session:
+                return _SESSION
+
+        print("🍪 [Toss] 셀레니움으로 쿠키 재발급")
+        selenium_cookies = _fetch_selenium_cookies()
+
+        session = requests.Session()
+        for cookie in selenium_cookies:
+            session.cookies.set(cookie['name'], cookie['value'])
+
+        session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Referer': BASE_URL,
+            'Content-Type': 'application/json',
+            'Origin': 'https://tossinvest.com',
+            'Accept': 'application/json'
+        })
+
+        # 가장 먼저 만료되는 쿠키 시각과 TTL 중 빠른 쪽
+        expiry = time.time() + COOKIE_TTL_SEC
+        cookie_expiries = [c['expiry'] for c in selenium_cookies if c.get('expiry')]
+        if cookie_expiries:
+            expiry = min(expiry, min(cookie_expiries))
+
+        if _SESSION is not None:
+            _SESSION.close()
+        _SESSION = session
+        _SESSION_EXPIRY = expiry
+        return _SESSION
+
+def _toss_request(method, url, **kwargs):
+    """캐시 세션으로 요청, 인증 실패(쿠키 만료)면 쿠키 재발급 후 한 번 재시도"""
+    session = get_toss_session()
+    resp = session.request(method, url, **kwargs)
+
+    if resp.status_code in AUTH_FAIL_STATUS:
+        session = get_toss_session(force_refresh=True, failed_session=session)
+        resp = session.request(method, url, **kwargs)
+    return resp
+
+# ==========================================================
+# 종목 메타데이터 캐시 (productCode -> symbol/shares/group_code/exchange)
+# 봇/대시보드 컨테이너가 같은 파일을 쓰므로 읽기-합치기-쓰기는 파일 락 안에서
+# ==========================================================
+_META_CACHE = None
+_META_LOCK = threading.Lock()
+
+class _MetaFileLock:
+    """메타데이터 캐시 파일 배타 락 (프로세스 내 + 프로세스 간)"""
+    def __enter__(self):
+        _META_LOCK.acquire()
+        self.fd = None
+        if fcntl is not None:
+            dirpath = os.path.dirname(TOSS_META_CACHE_PATH) or "."
+            os.makedirs(dirpath, exist_ok=True)
+            self.fd = os.open(TOSS_META_CACHE_PATH + ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+        _META_LOCK.release()
+
+def _read_meta_file():
+    """디스크 캐시 (없거나 깨졌으면 빈 캐시)"""
+    try:
+        with open(TOSS_META_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except Exception:
+        return {}
+
+def _load_meta_cache():
+    """메모리 캐시 (처음 한 번만 디스크에서 로드)"""
+    global _META_CACHE
+    if _META_CACHE is None:
+        _META_CACHE = _read_meta_file()
+    return _META_CACHE
+
+def _save_meta_cache(cache):
+    """캐시 원자적 저장"""
+    dirpath = os.path.dirname(TOSS_META_CACHE_PATH) or "."
+    os.makedirs(dirpath, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix="toss_meta_", suffix=".json", dir=dirpath)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, TOSS_META_CACHE_PATH)  # atomic replace
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+
+def _merge_meta_cache(entries):
+    """
+    새로 받은 항목을 디스크 캐시와 합쳐서 저장 (같은 종목은 fetched_at 이 최신인 쪽).
+    다른 컨테이너가 그 사이 저장한 항목도 유지하고, META_EVICT_SEC 지난 항목은 버림.
+    """
+    global _META_CACHE
+    now = time.time()
+
+    with _MetaFileLock():
+        cache = _read_meta_file()
+        for code, entry in list((_META_CACHE or {}).items()) + list(entries.items()):
+            if entry.get('fetched_at', 0) >= cache.get(code, {}).get('fetched_at', 0):
+                cache[code] = entry
+        cache = {c: e for c, e in cache.items() if now - e.get('fetched_at', 0) < META_EVICT_SEC}
+        _META_CACHE = cache
+
+        try:
+            _save_meta_cache(cache)
+        except Exception as e:
+            print(f"⚠️ [Toss] 메타데이터 캐시 저장 실패: {e}")
+    return cache
+
+def _is_stale(entry, now):
+    if entry is None:
+        return True
+    ttl = META_MISSING_TTL_SEC if entry.get('missing') else META_TTL_SEC
+    return now - entry.get('fetched_at', 0) >= ttl
+
+def _parse_stock_info(info):
+    return {
+        'symbol': info.get('symbol') or "N/A",
+        'shares': info.get('sharesOutstanding') or 0,
+        'group_code': (info.get('group') or {}).get('code', ''),
+        'exchange': (info.get('market') or {}).get('code', 'NSQ'),
     }
 
-    # ---------------------------------------------------------
-    # [Step 3] 랭킹 API 호출
-    # ---------------------------------------------------------
-    rank_api_url = "https://wts-cert-api.tossinvest.com/api/v2/dashboard/wts/overview/ranking"
+def get_stock_details(product_codes):
+    """
+    productCode 리스트 -> ({code: detail}, 에러 메시지 or None)
+    캐시에 없거나 TTL 지난 종목만 stock-infos 로 한 번에 조회.
+    응답에 없는 종목은 '없음'으로 캐시 (META_MISSING_TTL_SEC 동안 다시 조회 안 함, 결과에는 빠짐).
+    조회가 실패해도 오래된 캐시가 있는 종목은 그 값을 그대로 사용.
+    """
+    now = time.time()
+
+    with _META_LOCK:
+        cache = _load_meta_cache()
+        stale = [c for c in product_codes if _is_stale(cache.get(c), now)]
+
+    error = None
+    if stale:
+        try:
+            info_resp = _toss_request("GET", f"{INFO_API_URL}?codes={','.join(stale)}")
+            infos = info_resp.json().get('result', {}) if info_resp.status_code == 200 else None
+        except Exception as e:  # 네트워크 에러/깨진 응답 -> 캐시된 값으로 대체
+            info_resp, infos = None, None
+            error = f"상세 조회 실패: {e}"
+        if infos is None:
+            error = error or f"상세 조회 실패: {info_resp.status_code}"
+        else:
+            fetched = {}
+            for info in infos:
+                p_code = info.get('code')
+                if p_code:
+                    fetched[p_code] = dict(_parse_stock_info(info), fetched_at=now)
+            for p_code in stale:
+                fetched.setdefault(p_code, {'missing': True, 'fetched_at': now})
+            _merge_meta_cache(fetched)
+
+    with _META_LOCK:
+        cache = _load_meta_cache()
+        details_map = {c: cache[c] for c in product_codes if c in cache and not cache[c].get('missing')}
+        known = sum(1 for c in product_codes if c in cache)
+
+    if error and known < len(product_codes):
+        return details_map, error
+    if error:
+        print(f"⚠️ [Toss] {error} (캐시된 메타데이터 사용)")
+    return details_map, None
+
+def _fetch_ranking(ranking_id, duration):
+    """랭킹 하나 조회 -> (상품 리스트, 에러 메시지 or None)"""
     rank_payload = {
-        'id': 'biggest_total_amount',
+        'id': ranking_id,
         'filters': [], # 필터 없이 전체 가져온 뒤 파이썬에서 거름
-        'duration': 'realtime',
+        'duration': duration,
         'tag': 'us',
     }
 
-    rank_resp = session.post(rank_api_url, headers=headers, json=rank_payload)
+    try:
+        rank_resp = _toss_request("POST", RANK_API_URL, json=rank_payload)
+    except Exception as e:
+        return [], f"{ranking_id}/{duration}: {e}"
     if rank_resp.status_code != 200:
-        return {"error": f"랭킹 조회 실패: {rank_resp.status_code}"}
+        return [], f"{ranking_id}/{duration}: {rank_resp.status_code}"
 
     rank_data = rank_resp.json()
-    products = rank_data.get('result', {}).get('products', [])
-    product_codes = [p['productCode'] for p in products]
+    return rank_data.get('result', {}).get('products', []), None
 
-    if not product_codes:                                                                                                                                                           
-        return []
+def fetch_rankings(sources=None):
+    """
+    여러 랭킹을 같은 세션으로 동시에 조회해서 productCode 기준으로 합침.
+    순서는 sources 순서 -> 각 랭킹 순위 순, 중복 종목은 먼저 나온 랭킹 것을 유지.
+    rank 는 합친 목록 기준으로 다시 매기고 (랭킹마다 1위부터라 겹치므로) 원래 순위는 source_rank 에 둠.
+    return: (상품 리스트, 실패한 랭킹 에러 메시지 리스트)
+    """
+    sources = sources or RANKING_SOURCES
+
+    # 쿠키 발급은 여기서 한 번만 (스레드마다 크롬 띄우지 않게)
+    get_toss_session()
+
+    with ThreadPoolExecutor(max_workers=max(1, len(sources))) as pool:
+        fetched = list(pool.map(lambda src: _fetch_ranking(*src), sources))
+
+    products, errors = [], []
+    seen = set()
+    for (ranking_id, _), (items, error) in zip(sources, fetched):
+        if error:
+            errors.append(error)
+            continue
+        for item in items:
+            p_code = item.get('productCode')
+            if not p_code or p_code in seen:
+                continue
+            seen.add(p_code)
+            products.append(dict(item, ranking=ranking_id, source_rank=item.get('rank')))
+
+    for rank, product in enumerate(products, 1):
+        product['rank'] = rank
+    return products, errors
+
+def scrape_toss_data(sources=None):
+    """
+    기존 스크래핑 로직을 함수화하여 데이터를 리스트로 반환
+    sources: [(랭킹 id, duration)] (생략 시 RANKING_SOURCES)
+    """
+    results = []
 
     # ---------------------------------------------------------
-    # [Step 4] 상세 정보 API 호출
+    # [Step 1] 랭킹 API 호출 (캐시 세션 재사용, 여러 랭킹 동시 조회 후 합침)
     # ---------------------------------------------------------
-    codes_str = ",".join(product_codes)
-    info_api_url = f"https://wts-info-api.tossinvest.com/api/v1/stock-infos?codes={codes_str}"
-    
-    info_resp = session.get(info_api_url, headers=headers)
-    if info_resp.status_code != 200:
-        return {"error": f"상세 조회 실패: {info_resp.status_code}"}
-
-    info_json = info_resp.json()
-    stock_infos = info_json.get('result', {})
+    products, errors = fetch_rankings(sources)
+    if errors:
+        print(f"⚠️ [Toss] 일부 랭킹 조회 실패: {errors}")
+        if not products:
+            return {"error": f"랭킹 조회 실패: {', '.join(errors)}"}
 
-    details_map = {}
-    for info in stock_infos:
-        p_code = info.get('code')
-        symbol = info.get('symbol')
-        shares = info.get('sharesOutstanding')
+    product_codes = [p['productCode'] for p in products]
 
-        group_code = info.get('group', {}).get('code','')
-        market_code = info.get('market', {}).get('code','NSQ')
-        
+    if not product_codes:                                                                                                                                                           
+        return []
 
-        if p_code:
-            details_map[p_code] = {
-                'symbol': symbol or "N/A",
-                'shares': shares or 0,
-                'group_code': group_code,
-                'exchange': market_code
-            }
+    # ---------------------------------------------------------
+    # [Step 2] 상세 정보 (메타데이터 캐시에 없거나 오래된 종목만 한 번에 조회)
+    # ---------------------------------------------------------
+    details_map, error = get_stock_details(product_codes)
+    if error:
+        return {"error": error}
 
     # ---------------------------------------------------------
-    # [Step 5] 데이터 가공 및 필터링
+    # [Step 3] 데이터 가공 및 필터링
     # ---------------------------------------------------------
     for item in products:
         p_code = item['productCode']
@@ -126,7 +365,6 @@ def scrape_toss_data():
         else:
             change_rate = 0.0
             
-        detail = details_map.get(p_code, {'symbol': 'N/A', 'shares': 0, 'group_code': '', 'exchange': 'NSQ'})
         ticker = detail['symbol']
         shares = detail['shares']
         
@@ -151,10 +389,96 @@ def scrape_toss_data():
             "ticker": ticker,
             "exchange": exchange,
             "name": item['name'],
+            "ranking": item['ranking'],
+            "source_rank": item['source_rank'],
             "price": current_price,
             "change_rate": round(change_rate, 2),
             "market_cap": cap_str,
             "raw_cap": market_cap # 정렬용 원본 데이터
         })
         
-    return results
\ No newline at end of file
+    return results
+
+# ==========================================================
+# 랭킹 스냅샷 공유 (크롤러 -> 파일 -> 대시보드)
+# ==========================================================
+_SNAPSHOT_THREAD_LOCK = threading.Lock()
+
+class _SnapshotRefreshLock:
+    """스냅샷 갱신 배타 락 (프로세스 내 + 프로세스 간) -> 크롬이 동시에 여러 개 뜨지 않게"""
+    def __enter__(self):
+        _SNAPSHOT_THREAD_LOCK.acquire()
+        self.fd = None
+        if fcntl is not None:
+            dirpath = os.path.dirname(TOSS_SNAPSHOT_PATH) or "."
+            os.makedirs(dirpath, exist_ok=True)
+            self.fd = os.open(TOSS_SNAPSHOT_PATH + ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+        _SNAPSHOT_THREAD_LOCK.release()
+
+def load_snapshot():
+    """저장된 랭킹 스냅샷 (없거나 깨졌으면 None)"""
+    try:
+        with open(TOSS_SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def publish_snapshot(data):
+    """랭킹 결과를 시각과 함께 원자적으로 저장"""
+    snapshot = {
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+        "updated_ts": time.time(),
+        "data": data,
+    }
+
+    dirpath = os.path.dirname(TOSS_SNAPSHOT_PATH) or "."
+    os.makedirs(dirpath, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix="toss_snapshot_", suffix=".json", dir=dirpath)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, TOSS_SNAPSHOT_PATH)  # atomic replace
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+    return snapshot
+
+def _is_fresh(snapshot, max_age_sec):
+    return bool(snapshot) and time.time() - snapshot.get("updated_ts", 0) < max_age_sec
+
+def get_ranking_snapshot(max_age_sec: float = SNAPSHOT_MAX_AGE_SEC):
+    """
+    최신 랭킹 스냅샷 반환. max_age_sec 보다 오래됐으면 새로 크롤링해서 저장 (단일 비행:
+    동시에 여러 요청이 와도 한 곳만 크롤링하고 나머지는 락 해제 후 새 스냅샷을 읽음).
+    return: {"updated_at", "updated_ts", "data"} / 크롤링 실패 시 기존 스냅샷, 그것도 없으면 {"error": ...}
+    """
+    snapshot = load_snapshot()
+    if _is_fresh(snapshot, max_age_sec):
+        return snapshot
+
+    with _SnapshotRefreshLock():
+        # 락 기다리는 동안 다른 쪽이 갱신했으면 그대로 사용
+        snapshot = load_snapshot()
+        if _is_fresh(snapshot, max_age_sec):
+            return snapshot
+
+        try:
+            data = scrape_toss_data()
+        except Exception as e:  # 쿠키 발급/요청 에러 -> 기존 스냅샷 유지
+            data = {"error": f"크롤링 에러: {e}"}
+        if isinstance(data, list):
+            return publish_snapshot(data)
+
+        print(f"⚠️ [Toss] 랭킹 갱신 실패: {data.get('error')}")
+        return snapshot or data
@@ -0,0 +1,175 @@
+import os, sqlite3, threading, queue, time
+from datetime import datetime
+
+# ==========================================================
+# 매매 기록 저장소 (SQLite)
+# - 주문 / 체결 / 취소 / stage 변경 + 실현손익(매도 체결 때)을 한 테이블에 기록
+# - record() 는 큐에 넣기만 함 -> 백그라운드 스레드가 모아서 한 트랜잭션으로 저장 (매매 루프 안 막음)
+# - WAL 모드라 봇이 쓰는 중에도 대시보드가 바로 읽을 수 있음
+# - (ticker, ts), (day), (ts) 인덱스로 종목별 내역 / 일별 손익 / 최근 내역 조회
+# ==========================================================
+
+TRADE_DB_PATH = os.environ.get("TRADE_DB_PATH", "./trades.db")
+
+FLUSH_INTERVAL_SEC = 1.0   # 쓰기 스레드가 모아서 저장하는 주기 (초)
+BATCH_SIZE = 200           # 한 트랜잭션 최대 건수
+
+COLUMNS = ("ts", "day", "ticker", "side", "kind", "price", "qty",
+           "stage", "avg_price", "pnl", "pnl_pct", "order_no", "note")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts        REAL    NOT NULL,   -- epoch 초
+    day       TEXT    NOT NULL,   -- YYYY-MM-DD (로컬 시간)
+    ticker    TEXT    NOT NULL,
+    side      TEXT    NOT NULL,   -- buy / sell / cancel / none
+    kind      TEXT    NOT NULL,   -- order / fill / cancel / stage (매도 사유 take_profit / stop_loss / breakeven / trailing / close_out 는 note)
+    price     REAL,
+    qty       INTEGER,
+    stage     INTEGER,
+    avg_price REAL,
+    pnl       REAL,               -- 실현손익 (USD, 매도 체결 행에만: 체결 수량 x (매도 주문가 - 직전 평단))
+    pnl_pct   REAL,
+    order_no  TEXT,
+    note      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_ticker_ts ON trades (ticker, ts);
+CREATE INDEX IF NOT EXISTS idx_trades_day ON trades (day);
+CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades (ts);
+"""
+
+def _connect(path):
+    dirpath = os.path.dirname(path) or "."
+    os.makedirs(dirpath, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+class TradeStore:
+    def __init__(self, path: str = TRADE_DB_PATH, flush_interval: float = FLUSH_INTERVAL_SEC, batch_size: int = BATCH_SIZE,
+                 clock=time.time):
+        self.path = path
+        self.clock = clock  # 기록 시각 (리플레이에서는 시뮬레이션 시계)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.queue = queue.Queue()
+        self.writer = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        self._read_conn = None
+        self._read_lock = threading.Lock()
+
+        # 통계
+        self.written = 0
+        self.batches = 0
+
+    # ------------------------------------------------------
+    # 쓰기 (비동기 배치)
+    # ------------------------------------------------------
+    def record(self, ticker, kind, side="none", **fields):
+        """이벤트 한 건 기록 요청 (즉시 반환). fields: price, qty, stage, avg_price, pnl, pnl_pct, order_no, note"""
+        now = self.clock()
+        row = dict(fields, ts=now, day=datetime.fromtimestamp(now).strftime("%Y-%m-%d"),
+                   ticker=ticker, side=side, kind=kind)
+        self._ensure_writer()
+        self.queue.put(tuple(row.get(col) for col in COLUMNS))
+
+    def _ensure_writer(self):
+        if self.writer is not None and self.writer.is_alive():
+            return
+        with self.lock:
+            if self.writer is None or not self.writer.is_alive():
+                self.stopped.clear()
+                self.writer = threading.Thread(target=self._writer_loop, name="trade-store-writer", daemon=True)
+                self.writer.start()
+
+    def _writer_loop(self):
+        conn = _connect(self.path)
+        sql = f"INSERT INTO trades ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        try:
+            while not (self.stopped.is_set() and self.queue.empty()):
+                try:
+                    batch = [self.queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+
+                # 잠깐 모아서 한 번에
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and time.monotonic() < deadline and not self.stopped.is_set():
+                    try:
+                        batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+
+                try:
+                    with conn:
+                        conn.executemany(sql, batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                except Exception as e:
+                    print(f"❌ [TradeStore] 기록 실패 ({len(batch)}건): {e}")
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+        finally:
+            conn.close()
+
+    def flush(self):
+        """대기 중인 기록이 저장될 때까지 기다림"""
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.join()
+
+    def close(self):
+        self.stopped.set()
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+        if self._read_conn is not None:
+            self._read_conn.close()
+            self._read_conn = None
+
+    # ------------------------------------------------------
+    # 조회 (대시보드)
+    # ------------------------------------------------------
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            if self._read_conn is None:
+                self._read_conn = _connect(self.path)
+            return [dict(row) for row in self._read_conn.execute(sql, params).fetchall()]
+
+    def daily_pnl(self, days: int = 30):
+        """일별 실현손익 / 매도 횟수 (최근 days 일)"""
+        return self._query(
+            """
+            SELECT day,
+                   ROUND(SUM(pnl), 2) AS pnl,
+                   COUNT(*) AS sells,
+                   SUM(CASE WHEN pnl > 0 THEN 1 ELSE 0 END) AS wins
+            FROM trades
+            WHERE pnl IS NOT NULL AND day >= date('now', 'localtime', ?)
+            GROUP BY day
+            ORDER BY day DESC
+            """,
+            (f"-{int(days)} days",),
+        )
+
+    def ticker_history(self, ticker, limit: int = 200):
+        """종목별 기록 (최신순)"""
+        return self._query(
+            "SELECT * FROM trades WHERE ticker = ? ORDER BY ts DESC LIMIT ?",
+            (ticker, int(limit)),
+        )
+
+    def recent(self, limit: int = 100):
+        """최근 기록 (최신순)"""
+        return self._query("SELECT * FROM trades ORDER BY ts DESC LIMIT ?", (int(limit),))
+
+    def stats(self):
+        return {"queued": self.queue.qsize(), "written": self.written, "batches": self.batches}
@@ -1,77 +1,264 @@
 import pandas as pd
 import numpy as np
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
 
 ## 주식 보조지표
 
-def ichimoku(df: pd.DataFrame, conf):
-
-    def clean_list(data_list):
-        return [None if pd.isna(x) else float(x) for x in data_list]
-
+ICHIMOKU_SHIFT = 26 # 선행스팬 이동 봉 수
+
+def _rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """window 개 봉 최고값 (앞쪽 window-1 개와 NaN 이 낀 구간은 NaN, pandas rolling 과 동일)"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).max(axis=1)
+    return out
+
+def _rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).min(axis=1)
+    return out
+
+def ichimoku_arrays(df: pd.DataFrame):
+    """
+    일목균형표 계산 엔진 (NumPy 배열 기반).
+    매매 루프/스캔에서는 이 결과를 그대로 span_b_signal 에 넘기고,
+    JSON 리스트 변환은 HTTP 응답 직전에만 to_chart_data 로 함.
+
+    return: {
+        "dates": 봉 시각 (DatetimeIndex, 미래 26봉 미포함),
+        "open"/"high"/"low"/"close"/"volume": 봉 값 + 뒤쪽 NaN 26개,
+        "tenkan"/"kijun": 전환선/기준선 (봉 개수와 같은 길이),
+        "span_a"/"span_b": 앞쪽 NaN 26개 + 선행스팬 (26봉 앞으로 이동)
+    }
+    """
     if df.empty:
         return None
-    
+
     if isinstance(df.columns, pd.MultiIndex):
         df.columns = df.columns.get_level_values(0)
 
-    df.reset_index(inplace=True)
-
-    date_col = 'Datetime' if 'Datetime' in df.columns else 'Date'
-    if date_col not in df.columns:
+    if 'Datetime' in df.columns or 'Date' in df.columns:
+        dates = pd.DatetimeIndex(df['Datetime' if 'Datetime' in df.columns else 'Date'])
+    elif df.index.name in ('Datetime', 'Date'):
+        dates = pd.DatetimeIndex(df.index)
+    else:
         return None
-    
-    # 전환선, 기준선
-    high_9 = df['High'].rolling(window=9).max()
-    low_9 = df['Low'].rolling(window=9).min()
-    tenkan = (high_9 + low_9) / 2
-
-    high_26 = df['High'].rolling(window=26).max()
-    low_26 = df['Low'].rolling(window=26).min()
-    kijun = (high_26 + low_26) / 2
 
-    span_a_calc = (tenkan + kijun) / 2
-
-    high_52 = df['High'].rolling(window=52).max()
-    low_52 = df['Low'].rolling(window=52).min()
-    span_b_calc = (high_52 + low_52) / 2
-
-    last_date = df[date_col].iloc[-1]
-    future_dates = []
-    current_delta = conf['delta']
-
-    for i in range(1, 27):
-        future_dates.append(last_date + (current_delta * i))
-
-    full_dates = df[date_col].tolist() + future_dates
-    full_dates_str = [d.strftime('%Y-%m-%d %H:%M') for d in full_dates]
+    high = np.asarray(df['High'], dtype=np.float64)
+    low = np.asarray(df['Low'], dtype=np.float64)
 
-    pad_none = [None] * 26
+    # 전환선, 기준선
+    tenkan = (_rolling_max(high, 9) + _rolling_min(low, 9)) / 2
+    kijun = (_rolling_max(high, 26) + _rolling_min(low, 26)) / 2
 
-    final_open = clean_list(df['Open'].tolist()) + pad_none
-    final_high = clean_list(df['High'].tolist()) + pad_none
-    final_low = clean_list(df['Low'].tolist()) + pad_none
-    final_close = clean_list(df['Close'].tolist()) + pad_none
-    final_volume = clean_list(df['Volume'].tolist()) + pad_none
+    span_a_calc = (tenkan + kijun) / 2
+    span_b_calc = (_rolling_max(high, 52) + _rolling_min(low, 52)) / 2
+
+    pad_nan = np.full(ICHIMOKU_SHIFT, np.nan)
+
+    def bars(col):
+        return np.concatenate([np.asarray(df[col], dtype=np.float64), pad_nan])
+
+    return {
+        "dates": dates,
+        "open": bars('Open'),
+        "high": bars('High'),
+        "low": bars('Low'),
+        "close": bars('Close'),
+        "volume": bars('Volume'),
+        "tenkan": tenkan,
+        "kijun": kijun,
+        "span_a": np.concatenate([pad_nan, span_a_calc]),
+        "span_b": np.concatenate([pad_nan, span_b_calc]),
+    }
+
+def to_chart_data(arrays, conf):
+    """
+    ichimoku_arrays 결과 -> 차트용 JSON 딕셔너리 (NaN -> None, 날짜 문자열 + 미래 26봉 날짜)
+    """
+    if arrays is None:
+        return None
 
+    def clean_list(values):
+        out = values.astype(object)
+        out[np.isnan(values)] = None
+        return out.tolist()
 
-    span_a_list = span_a_calc.tolist()
-    span_b_list = span_b_calc.tolist()
-    final_span_a = pad_none + clean_list(span_a_list)
-    final_span_b = pad_none + clean_list(span_b_list)
+    dates = arrays["dates"]
+    future_dates = dates[-1] + conf['delta'] * np.arange(1, ICHIMOKU_SHIFT + 1)
+    full_dates_str = dates.append(pd.DatetimeIndex(future_dates)).strftime('%Y-%m-%d %H:%M').tolist()
 
     chart_data = {
                 "dates": full_dates_str,
-                "open": final_open,
-                "high": final_high,
-                "low": final_low,
-                "close": final_close,
-                "volume": final_volume,
-                "span_a": final_span_a,
-                "span_b": final_span_b
+                "open": clean_list(arrays["open"]),
+                "high": clean_list(arrays["high"]),
+                "low": clean_list(arrays["low"]),
+                "close": clean_list(arrays["close"]),
+                "volume": clean_list(arrays["volume"]),
+                "span_a": clean_list(arrays["span_a"]),
+                "span_b": clean_list(arrays["span_b"])
             }
     
     return chart_data
 
+def ichimoku(df: pd.DataFrame, conf):
+    """일목균형표 차트 데이터 (JSON 리스트 형태, /api/history 응답용)"""
+    return to_chart_data(ichimoku_arrays(df), conf)
+
+class _WindowExtreme:
+    """
+    최근 window 개 봉의 최고값(또는 최저값)을 모노토닉 덱으로 관리 (봉 1개 추가당 O(1) amortized).
+    덱에는 확정봉만 넣고, 진행 중인 봉(마지막 봉) 값은 조회할 때 합침
+    -> 마지막 봉이 계속 갱신돼도 덱을 되돌릴 필요가 없음.
+    """
+    def __init__(self, window: int, is_max: bool):
+        self.window = window
+        self.sign = 1.0 if is_max else -1.0
+        self.dq = deque()      # (봉 index, sign * 값), 값 내림차순
+        self.last_nan = -1     # 마지막 NaN 확정봉 index (window 안에 NaN 있으면 결과 NaN, pandas 와 동일)
+
+    def push(self, idx: int, value: float):
+        """확정봉 추가"""
+        if np.isnan(value):
+            self.last_nan = idx
+        else:
+            v = self.sign * value
+            while self.dq and self.dq[-1][1] <= v:
+                self.dq.pop()
+            self.dq.append((idx, v))
+
+        # 다음 봉(idx+1)의 window 에서 빠지는 확정봉 제거
+        while self.dq and self.dq[0][0] <= idx + 1 - self.window:
+            self.dq.popleft()
+
+    def value(self, idx: int, forming: float) -> float:
+        """idx 번째(진행 중) 봉까지의 window 최고/최저값"""
+        if idx + 1 < self.window or np.isnan(forming) or self.last_nan > idx - self.window:
+            return np.nan
+
+        v = self.sign * forming
+        if self.dq and self.dq[0][1] > v:
+            v = self.dq[0][1]
+        return self.sign * v
+
+class IchimokuStream:
+    """
+    종목별 증분 일목균형표.
+    봉 1개(새 봉 또는 진행 중인 마지막 봉 갱신)를 넣을 때마다 9/26/52 봉 고가/저가를
+    모노토닉 덱으로 O(1) amortized 갱신하고, arrays() 로 ichimoku_arrays 와 같은 형태의 배열을 돌려줌
+    (span_b_signal 에 그대로 사용).
+    """
+    def __init__(self, history: int = 300):
+        self.history = history
+        self.count = 0          # 지금까지 들어온 봉 수 (마지막 봉 index = count-1)
+        self.last_ts = None
+
+        self.windows = {
+            w: (_WindowExtreme(w, True), _WindowExtreme(w, False)) for w in (9, 26, 52)
+        }
+
+        # 확정봉 이력 (최근 history 개)
+        self.cols = ("dates", "open", "high", "low", "close", "volume", "tenkan", "kijun", "span_a", "span_b")
+        self.closed = {c: deque(maxlen=history) for c in self.cols}
+        self.forming = None     # 진행 중인 봉 {컬럼: 값}
+
+    def _calc(self, ts, o, h, l, c, v):
+        idx = self.count - 1
+
+        def mid(w):
+            hi, lo = self.windows[w]
+            return (hi.value(idx, h) + lo.value(idx, l)) / 2
+
+        tenkan = mid(9)
+        kijun = mid(26)
+        return {
+            "dates": ts, "open": o, "high": h, "low": l, "close": c, "volume": v,
+            "tenkan": tenkan,
+            "kijun": kijun,
+            "span_a": (tenkan + kijun) / 2,
+            "span_b": mid(52),
+        }
+
+    def update(self, ts, o, h, l, c, v):
+        """
+        봉 1개 반영. ts 가 마지막 봉과 같으면 진행 중인 봉 갱신, 더 나중이면 새 봉, 이전이면 무시.
+        return: 반영 여부
+        """
+        o, h, l, c, v = (float(x) for x in (o, h, l, c, v))
+
+        if self.last_ts is not None and ts < self.last_ts:
+            return False
+
+        if self.last_ts is None or ts > self.last_ts:
+            # 기존 진행 중인 봉 확정
+            if self.forming is not None:
+                idx = self.count - 1
+                for hi, lo in self.windows.values():
+                    hi.push(idx, self.forming["high"])
+                    lo.push(idx, self.forming["low"])
+                for col in self.cols:
+                    self.closed[col].append(self.forming[col])
+            self.count += 1
+            self.last_ts = ts
+
+        self.forming = self._calc(ts, o, h, l, c, v)
+        return True
+
+    def ingest_df(self, df: pd.DataFrame):
+        """
+        캔들 DataFrame 에서 마지막으로 본 봉 이후 것만 반영.
+        이미 본 구간과 겹치지 않으면(중간 봉 누락) 처음부터 다시 쌓음.
+        return: 반영한 봉 수
+        """
+        if df is None or len(df) == 0:
+            return 0
+
+        dates = pd.DatetimeIndex(df['Datetime'] if 'Datetime' in df.columns else df.index)
+        if self.last_ts is not None and dates[0] > self.last_ts:
+            self.__init__(self.history)
+
+        start = 0 if self.last_ts is None else int(dates.searchsorted(self.last_ts))
+        values = [np.asarray(df[col], dtype=np.float64)[start:] for col in ('Open', 'High', 'Low', 'Close', 'Volume')]
+
+        n = 0
+        for ts, o, h, l, c, v in zip(dates[start:], *values):
+            n += self.update(ts, o, h, l, c, v)
+        return n
+
+    def __len__(self):
+        return self.count
+
+    def arrays(self):
+        """ichimoku_arrays 와 같은 형태(선행스팬 앞 NaN 26개, 봉 값 뒤 NaN 26개)의 배열"""
+        if self.forming is None:
+            return None
+
+        def col(name):
+            return list(self.closed[name]) + [self.forming[name]]
+
+        pad_nan = np.full(ICHIMOKU_SHIFT, np.nan)
+
+        def bars(name):
+            return np.concatenate([col(name), pad_nan])
+
+        def span(name):
+            return np.concatenate([pad_nan, col(name)])
+
+        return {
+            "dates": pd.DatetimeIndex(list(self.closed["dates"]) + [self.forming["dates"]]),
+            "open": bars("open"),
+            "high": bars("high"),
+            "low": bars("low"),
+            "close": bars("close"),
+            "volume": bars("volume"),
+            "tenkan": np.asarray(col("tenkan")),
+            "kijun": np.asarray(col("kijun")),
+            "span_a": span("span_a"),
+            "span_b": span("span_b"),
+        }
+
 def span_b_signal(data, n, k):
     '''
     Docstring for span_b_signal
@@ -91,9 +278,10 @@ def span_b_signal(data, n, k):
     # print(data['span_b'][-n:])
     
     # 마지막 span_b 값 기준 이전 n개의 span_b 값이 오차범위 k% 내에 있으면 일단 통과
-    span_a_values = data['span_a']
-    span_b_values = data['span_b']
-    close_values = data['close']
+    # (리스트(None 포함) / ichimoku_arrays 배열(NaN) 둘 다 받음)
+    span_a_values = np.asarray(data['span_a'], dtype=np.float64)
+    span_b_values = np.asarray(data['span_b'], dtype=np.float64)
+    close_values = np.asarray(data['close'], dtype=np.float64)
 
     if len(span_b_values) < n or len(close_values) < 1:
         return False, None #"데이터 부족"
@@ -101,41 +289,42 @@ def span_b_signal(data, n, k):
     last_span_b = span_b_values[-1]
     last_close = close_values[-1-26]
 
-    if last_span_b is None or last_close is None:
+    if np.isnan(last_span_b) or np.isnan(last_close):
         return False, None # "최신 Span B 또는 종가 데이터 없음"
 
     # 마지막 n개의 span_b 값 추출 (None 값 제외)
-    recent_span_b_raw = [val for val in span_b_values[-n:] if val is not None]
-    recent_span_a_raw = [val for val in span_a_values[-n:] if val is not None]
-
+    recent_span_b_raw = span_b_values[-n:]
+    recent_span_b_raw = recent_span_b_raw[~np.isnan(recent_span_b_raw)]
+    recent_span_a_raw = span_a_values[-n:]
+    recent_span_a_raw = recent_span_a_raw[~np.isnan(recent_span_a_raw)]
 
-    # [디버깅용] recent_span_b_raw 출력
-    
-    if not recent_span_b_raw or not recent_span_a_raw:
+    if not len(recent_span_b_raw) or not len(recent_span_a_raw):
         return False, None # "최근 Span B 데이터 부족"
 
     # 마지막 유효한 span_b 값
-    current_span_b_val = recent_span_b_raw[-1]
-
-    # 오차 범위 내에 있는지 확인
-    is_flat = True
-    for val_a, val in zip(recent_span_a_raw, recent_span_b_raw):
-        if not (current_span_b_val * (1 - k/100) <= val <= current_span_b_val * (1 + k/100)) or val_a <= val:
-            is_flat = False
-            break
+    current_span_b_val = float(recent_span_b_raw[-1])
+    lower = current_span_b_val * (1 - k/100)
+    upper = current_span_b_val * (1 + k/100)
+
+    # 오차 범위 내에 있고, span_a 가 span_b 위에 있는지 확인 (zip 처럼 짧은 쪽 길이까지만 비교)
+    m = min(len(recent_span_a_raw), len(recent_span_b_raw))
+    vals_a = recent_span_a_raw[:m]
+    vals_b = recent_span_b_raw[:m]
+    is_flat = bool(np.all((lower <= vals_b) & (vals_b <= upper) & (vals_a > vals_b)))
     
     if is_flat:
         # 현재 종가가 Span B 위에 있는지 확인 (k% 오차범위 허용)
-        if last_close > current_span_b_val * (1 - k/100):
+        if last_close > lower:
 
             # 최근 n개의 봉의 저가가 모두 Span B 위에 있는지 확인
-            recent_lows = [val for val in close_values[-n-26:-26] if val is not None] # 종가 대신 저가 사용
+            recent_lows = close_values[-n-26:-26] # 종가 대신 저가 사용
+            recent_lows = recent_lows[~np.isnan(recent_lows)]
             # print(recent_lows)
 
-            if not recent_lows:
+            if not len(recent_lows):
                 return False, None # "최근 저가 데이터 부족"
 
-            is_above_span_b = all(low > current_span_b_val * (1 - k/100) for low in recent_lows)
+            is_above_span_b = bool(np.all(recent_lows > lower))
 
             if is_above_span_b:
                 return True, current_span_b_val
@@ -150,6 +339,97 @@ def span_b_signal(data, n, k):
         return False, None
         # "Span B Flat 조건 불충족"
 
+def span_b_signal_batch(span_a, span_b, close, n, k):
+    """
+    span_b_signal 의 여러 종목 일괄 버전.
+    span_a/span_b/close: (종목 수 x 봉 수) 2-D 배열, 각 행은 span_b_signal 의 data 와 같은 형태
+    (선행스팬 앞 NaN 26개, 종가 뒤 NaN 26개). 길이가 다른 종목은 앞쪽을 NaN 으로 채워 오른쪽 정렬.
+    return: (signals bool[종목 수], values float[종목 수], None 자리는 NaN)
+            각 행 결과는 span_b_signal(row) 와 동일
+    """
+    span_a = np.atleast_2d(np.asarray(span_a, dtype=np.float64))
+    span_b = np.atleast_2d(np.asarray(span_b, dtype=np.float64))
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+
+    rows = span_b.shape[0]
+    signals = np.zeros(rows, dtype=bool)
+    values = np.full(rows, np.nan)
+
+    if span_b.shape[1] < n or close.shape[1] < 1:
+        return signals, values #"데이터 부족"
+
+    last_span_b = span_b[:, -1]
+    last_close = close[:, -1-26]
+
+    def compact(window):
+        """행마다 NaN 을 빼고 앞으로 모음 (순서 유지) -> (값, 개수)"""
+        mask = ~np.isnan(window)
+        order = np.argsort(~mask, axis=1, kind="stable")
+        return np.take_along_axis(window, order, axis=1), mask.sum(axis=1)
+
+    recent_b, cnt_b = compact(span_b[:, -n:])
+    recent_a, cnt_a = compact(span_a[:, -n:])
+
+    # "최신 Span B 또는 종가 데이터 없음" / "최근 Span B 데이터 부족"
+    valid = ~np.isnan(last_span_b) & ~np.isnan(last_close) & (cnt_b > 0) & (cnt_a > 0)
+
+    # 마지막 유효한 span_b 값
+    current = np.take_along_axis(recent_b, np.maximum(cnt_b - 1, 0)[:, None], axis=1)[:, 0]
+    lower = current * (1 - k/100)
+    upper = current * (1 + k/100)
+
+    # 오차 범위 + span_a > span_b (zip 처럼 짧은 쪽 개수까지만 비교)
+    m = np.minimum(cnt_a, cnt_b)
+    in_zip = np.arange(recent_b.shape[1])[None, :] < m[:, None]
+    ok = (lower[:, None] <= recent_b) & (recent_b <= upper[:, None]) & (recent_a > recent_b)
+    is_flat = valid & np.all(ok | ~in_zip, axis=1)
+
+    # 현재 종가가 Span B 위 (k% 오차범위 허용)
+    above_close = is_flat & (last_close > lower)
+
+    # 최근 n개 봉 종가가 모두 Span B 위
+    recent_lows = close[:, -n-26:-26]
+    low_mask = ~np.isnan(recent_lows)
+    has_lows = low_mask.sum(axis=1) > 0
+    all_above = np.all((recent_lows > lower[:, None]) | ~low_mask, axis=1)
+
+    signals = above_close & has_lows & all_above
+    report = (is_flat & ~above_close) | (above_close & has_lows)
+    values[report] = current[report]
+    return signals, values
+
+def _stack_right_aligned(rows):
+    """길이가 다른 1-D 배열들을 앞쪽 NaN 채움으로 오른쪽 정렬한 2-D 배열로"""
+    width = max(len(r) for r in rows)
+    out = np.full((len(rows), width), np.nan)
+    for i, r in enumerate(rows):
+        if len(r):
+            out[i, width - len(r):] = np.asarray(r, dtype=np.float64)
+    return out
+
+def span_b_signal_many(datas, n, k):
+    """
+    종목별 data(ichimoku_arrays / IchimokuStream.arrays 결과) 리스트를 한 번에 판단.
+    return: [(signal, value or None), ...] (입력 순서, span_b_signal 과 같은 형태)
+    """
+    if not datas:
+        return []
+
+    signals, values = span_b_signal_batch(
+        _stack_right_aligned([d['span_a'] for d in datas]),
+        _stack_right_aligned([d['span_b'] for d in datas]),
+        _stack_right_aligned([d['close'] for d in datas]),
+        n, k,
+    )
+
+    results = []
+    for d, signal, value in zip(datas, signals, values):
+        if len(d['span_b']) < n:
+            results.append((False, None)) #"데이터 부족"
+        else:
+            results.append((bool(signal), None if np.isnan(value) else float(value)))
+    return results
+
 
 if __name__ == "__main__":
     import yfinance as yf